@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the shared RForge protocol helpers.
+
+Benchmarks:
+- crc: legacy bit-at-a-time CRC16 vs pure-Python 256-entry table vs shared engine
+- parser: legacy shift-on-resync bytearray parser vs FrameParser on noisy captures
+- signal: per-sample math.sin + struct.pack stream generation vs SignalEngine block render
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import struct
+import time
+from array import array
+from typing import Callable, Dict, List
+
+from rforge_protocol import CRC16_INIT, FrameParser, crc16_ccitt, crc16_update
+from rforge_signal import SignalEngine, parse_waveforms
+
+
+def crc16_bitwise(data: bytes, init: int = CRC16_INIT) -> int:
+    # Reference copy of the original per-bit implementation from the tools.
+    crc = init
+    for b in data:
+        crc ^= b << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def _make_crc16_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+_CRC16_TABLE = _make_crc16_table()
+
+
+def crc16_table(data: bytes, init: int = CRC16_INIT) -> int:
+    crc = init
+    table = _CRC16_TABLE
+    for b in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+
+def measure(fn: Callable[[], object], nbytes: int, min_time: float) -> float:
+    """Return bytes/sec of ``fn`` which processes ``nbytes`` per call."""
+    loops = 0
+    t0 = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn()
+        loops += 1
+        elapsed = time.perf_counter() - t0
+    return loops * nbytes / elapsed
+
+
+def bench_crc(args: argparse.Namespace) -> Dict[str, object]:
+    rng = random.Random(args.seed)
+    frame = bytes(rng.getrandbits(8) for _ in range(args.frame_bytes))
+    expected = crc16_bitwise(frame)
+    assert crc16_table(frame) == expected
+    assert crc16_ccitt(frame) == expected
+    view = memoryview(frame)
+    split = min(6, len(frame))
+    assert crc16_update(crc16_update(CRC16_INIT, view[:split]), view[split:]) == expected
+
+    results = {
+        "bitwise": measure(lambda: crc16_bitwise(frame), len(frame), args.min_time),
+        "table_py": measure(lambda: crc16_table(frame), len(frame), args.min_time),
+        "shared": measure(lambda: crc16_update(CRC16_INIT, view), len(frame), args.min_time),
+    }
+    base = results["bitwise"]
+    for name, bps in results.items():
+        print(f"[BENCH] crc {name:<9} {bps / 1e6:10.2f} MB/s  x{bps / base:8.1f}")
+    return {"frame_bytes": len(frame), "bytes_per_sec": results}
+
+
+def legacy_iter_frames(buffer: bytearray):
+    # Reference copy of the original del-on-resync parser (CRC engine swapped to the
+    # shared one so only the buffer handling is compared).
+    while True:
+        if len(buffer) < 10:
+            return
+        sof = buffer.find(b"\xAA\x55")
+        if sof < 0:
+            buffer.clear()
+            return
+        if sof > 0:
+            del buffer[:sof]
+            if len(buffer) < 10:
+                return
+        payload_len = struct.unpack_from("<H", buffer, 6)[0]
+        if payload_len > 1024:
+            del buffer[0]
+            continue
+        total = 8 + payload_len + 2
+        if len(buffer) < total:
+            return
+        expected = struct.unpack_from("<H", buffer, 8 + payload_len)[0]
+        actual = crc16_ccitt(bytes(buffer[2 : 8 + payload_len]))
+        if expected != actual:
+            del buffer[0]
+            continue
+        cmd = buffer[3]
+        seq = struct.unpack_from("<H", buffer, 4)[0]
+        payload = bytes(buffer[8 : 8 + payload_len])
+        del buffer[:total]
+        yield cmd, seq, payload
+
+
+def make_frame(cmd: int, seq: int, payload: bytes) -> bytes:
+    hdr = struct.pack("<2sBBHH", b"\xAA\x55", 1, cmd, seq, len(payload))
+    crc = crc16_update(crc16_update(CRC16_INIT, memoryview(hdr)[2:]), payload)
+    return hdr + payload + struct.pack("<H", crc)
+
+
+def make_noisy_capture(rng: random.Random, frames: int, noise: float) -> tuple[bytes, int]:
+    """Stream frames interleaved with garbage, SOF look-alikes and corrupted CRCs."""
+    out = bytearray()
+    good = 0
+    for seq in range(frames):
+        payload = struct.pack("<Q", seq * 500) + b"".join(struct.pack("<Hf", ch, rng.random()) for ch in range(16))
+        frame = bytearray(make_frame(0x20, seq & 0xFFFF, payload))
+        roll = rng.random()
+        if roll < noise * 0.4:
+            frame[rng.randrange(8, len(frame))] ^= 0x10
+        elif roll < noise * 0.7:
+            # SOF look-alike with a plausible length forces a full CRC attempt.
+            out.extend(b"\xAA\x55" + bytes([1, 0x20]) + struct.pack("<HH", 0, rng.randrange(0, 1025)))
+            good += 1
+        elif roll < noise:
+            # Noise storm: a burst of short SOF-dense garbage headers, each a failed resync.
+            for _ in range(rng.randrange(8, 64)):
+                out.extend(b"\xAA\x55" + bytes(rng.getrandbits(8) for _ in range(rng.randrange(2, 12))))
+            good += 1
+        else:
+            good += 1
+        out.extend(frame)
+    return bytes(out), good
+
+
+def run_legacy(capture: bytes, chunk: int) -> int:
+    buffer = bytearray()
+    count = 0
+    for i in range(0, len(capture), chunk):
+        buffer.extend(capture[i : i + chunk])
+        for _ in legacy_iter_frames(buffer):
+            count += 1
+    return count
+
+
+def run_parser(capture: bytes, chunk: int) -> int:
+    parser = FrameParser()
+    view = memoryview(capture)
+    count = 0
+    for i in range(0, len(capture), chunk):
+        parser.feed(view[i : i + chunk])
+        for _ in parser:
+            count += 1
+    return count
+
+
+def bench_parser(args: argparse.Namespace) -> Dict[str, object]:
+    rng = random.Random(args.seed)
+    rows = []
+    for scale in (1, 4, 16):
+        capture, good = make_noisy_capture(rng, args.frames * scale, args.noise)
+        row: Dict[str, object] = {"frames": args.frames * scale, "bytes": len(capture), "chunk": args.chunk}
+        for name, fn in (("legacy", run_legacy), ("parser", run_parser)):
+            t0 = time.perf_counter()
+            count = fn(capture, args.chunk)
+            elapsed = time.perf_counter() - t0
+            # Look-alike headers may swallow a following frame; both parsers must agree.
+            row[name] = {"frames_ok": count, "bytes_per_sec": len(capture) / elapsed}
+            print(
+                f"[BENCH] parser {name:<7} frames={args.frames * scale:7d} bytes={len(capture):9d} "
+                f"ok={count:7d}/{good:<7d} {len(capture) / elapsed / 1e6:8.2f} MB/s"
+            )
+        rows.append(row)
+    return {"noise": args.noise, "runs": rows}
+
+
+def legacy_block(channels: int, ticks: int, rate: float) -> bytes:
+    # Reference copy of the original per-tick, per-channel generator.
+    out = bytearray()
+    for i in range(ticks):
+        t = i / rate
+        for ch in range(channels):
+            base = math.sin(2 * math.pi * (0.8 + ch * 0.11) * t)
+            mod = 0.35 * math.sin(2 * math.pi * 0.07 * t + ch * 0.2)
+            out.extend(struct.pack("<f", 0.7 * base + mod + ch * 0.03))
+    return bytes(out)
+
+
+def bench_signal(args: argparse.Namespace) -> Dict[str, object]:
+    rows = []
+    rate = 2000.0
+    for channels in (4, 16, 64):
+        ticks = max(1, 1008 // (4 * channels))
+        engine = SignalEngine(parse_waveforms(args.waveform))
+        engine.configure(channels, rate)
+        buf = bytearray(4 * ticks * channels)
+        values = memoryview(buf).cast("f")
+        state = {"tick": 0}
+
+        def block():
+            engine.render(state["tick"], ticks, values)
+            state["tick"] += ticks
+
+        samples = ticks * channels
+        legacy = measure(lambda: legacy_block(channels, ticks, rate), samples, args.min_time)
+        engine_sps = measure(block, samples, args.min_time)
+        print(
+            f"[BENCH] signal ch={channels:3d} ticks/block={ticks:4d} legacy={legacy / 1e6:7.2f} Msps "
+            f"engine={engine_sps / 1e6:7.2f} Msps  x{engine_sps / legacy:6.1f}"
+        )
+        rows.append({"channels": channels, "ticks_per_block": ticks, "legacy_sps": legacy, "engine_sps": engine_sps})
+    # Sanity: the default "mix" table matches the legacy formula to float32 precision.
+    check = array("f", bytes(4 * 16))
+    engine = SignalEngine(parse_waveforms("mix"))
+    engine.configure(4, rate)
+    engine.render(0, 4, check)
+    ref = array("f", legacy_block(4, 4, rate))
+    assert max(abs(a - b) for a, b in zip(check, ref)) < 1e-3
+    return {"waveform": args.waveform, "rate_hz": rate, "runs": rows}
+
+
+BENCHES = {
+    "crc": bench_crc,
+    "parser": bench_parser,
+    "signal": bench_signal,
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="RForge protocol micro-benchmarks")
+    ap.add_argument("--bench", choices=["all", *BENCHES], default="all")
+    ap.add_argument("--frame-bytes", type=int, default=1032, help="bytes per checksummed frame (ver..payload)")
+    ap.add_argument("--min-time", type=float, default=0.5, help="seconds per measurement")
+    ap.add_argument("--frames", type=int, default=2000, help="base frame count for parser bench (x1, x4, x16)")
+    ap.add_argument("--noise", type=float, default=0.3, help="fraction of frames preceded by noise or corrupted")
+    ap.add_argument("--chunk", type=int, default=262144, help="bytes fed to the parser per read")
+    ap.add_argument("--waveform", default="mix", help="waveform spec for the signal bench")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--out", help="optional JSON report path")
+    args = ap.parse_args()
+
+    names = list(BENCHES) if args.bench == "all" else [args.bench]
+    report = {name: BENCHES[name](args) for name in names}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Columnar stream capture files for RForge STREAM_DATA samples.
+
+Features:
+- Fixed-size blocks of ``block_samples`` ticks: one ``uint64`` timestamp column (MCU ``ts_us``)
+  followed by one ``float32`` column per channel, all little-endian
+- Preallocated block buffers on the writer side and file space reserved ahead in chunks, so
+  recording minutes of data costs no per-sample Python objects
+- Header rewritten after every block, so an interrupted capture stays readable up to the last
+  full block
+- Block time index (first timestamp of every block) appended on close for O(log n) seeking
+- Reader backed by ``mmap``; columns come back as ``memoryview`` casts without copying
+
+Layout (all offsets in bytes):
+
+    header      CAPTURE_HEAD, then ``channels`` x uint16 channel ids, padded to 8
+    block[i]    at header_size + i * block_bytes:
+                  ts   uint64[block_samples]
+                  ch0  float32[block_samples] ... ch{C-1}
+    index       uint64[block_count] first ts of each block (index_offset, 0 if absent)
+
+The last block is stored full size; ``sample_count`` says how many ticks are valid. With
+NumPy the blocks open without parsing::
+
+    blk = np.dtype([("ts", "<u8", (B,)), ("ch", "<f4", (C, B))])
+    arr = np.memmap(path, blk, "r", offset=header_size, shape=(block_count,))
+"""
+
+from __future__ import annotations
+
+import bisect
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+CAPTURE_MAGIC = b"RFCAPCOL"
+CAPTURE_VERSION = 1
+# magic, version, channels, block_samples, header_size, sample_count, block_count, index_offset
+CAPTURE_HEAD = struct.Struct("<8sHHIIQQQ")
+DEFAULT_BLOCK_SAMPLES = 4096
+DEFAULT_PREALLOC_BLOCKS = 16
+
+_NAN = struct.unpack("<f", b"\x00\x00\xc0\x7f")[0]
+
+
+def _header_size(channels: int) -> int:
+    return (CAPTURE_HEAD.size + 2 * channels + 7) & ~7
+
+
+def _le_bytes(values: array) -> array:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class CaptureWriter:
+    """Append decoded stream ticks to a columnar capture file."""
+
+    def __init__(
+        self,
+        path: Path,
+        channels: Sequence[int],
+        block_samples: int = DEFAULT_BLOCK_SAMPLES,
+        prealloc_blocks: int = DEFAULT_PREALLOC_BLOCKS,
+    ):
+        if not channels:
+            raise ValueError("capture needs at least one channel")
+        if block_samples <= 0:
+            raise ValueError("block_samples must be positive")
+        self.path = Path(path)
+        self.channels = list(channels)
+        self.block_samples = block_samples
+        self.prealloc_blocks = max(1, prealloc_blocks)
+        self.header_size = _header_size(len(self.channels))
+        self.block_bytes = block_samples * (8 + 4 * len(self.channels))
+        self.sample_count = 0
+        self.block_count = 0
+        self._column = {ch: i for i, ch in enumerate(self.channels)}
+        self._fill = 0
+        self._ts = array("Q", bytes(8 * block_samples))
+        self._cols = [array("f", [_NAN]) * block_samples for _ in self.channels]
+        self._index = array("Q")
+        self._reserved = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "w+b")
+        self._write_header(0)
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._f.closed
+
+    def _write_header(self, index_offset: int):
+        head = CAPTURE_HEAD.pack(
+            CAPTURE_MAGIC,
+            CAPTURE_VERSION,
+            len(self.channels),
+            self.block_samples,
+            self.header_size,
+            self.sample_count,
+            self.block_count,
+            index_offset,
+        )
+        ids = _le_bytes(array("H", self.channels)).tobytes()
+        self._f.seek(0)
+        self._f.write(head + ids + bytes(self.header_size - len(head) - len(ids)))
+
+    # ------------------------------------------------------------------ append
+    def append(self, ts_us: int, period_us: int, channels: Sequence[int], ticks: int, values: array):
+        """Append ``ticks`` tick-major samples; tick ``k`` is stamped ``ts_us + k * period_us``.
+
+        Channels not present in the capture are ignored; capture channels missing from the
+        frame read as NaN.
+        """
+        nch = len(channels)
+        cols = [(self._column.get(ch, -1), i) for i, ch in enumerate(channels)]
+        done = 0
+        while done < ticks:
+            n = min(ticks - done, self.block_samples - self._fill)
+            pos = self._fill
+            ts0 = ts_us + done * period_us
+            if period_us:
+                self._ts[pos : pos + n] = array("Q", range(ts0, ts0 + n * period_us, period_us))
+            else:
+                self._ts[pos : pos + n] = array("Q", [ts0]) * n
+            if nch != len(self.channels) or any(c != i for c, i in cols):
+                for col in self._cols:
+                    col[pos : pos + n] = array("f", [_NAN]) * n
+            start = done * nch
+            stop = (done + n) * nch
+            for col, i in cols:
+                if col >= 0:
+                    # Strided slice turns the tick-major frame into this channel's column.
+                    self._cols[col][pos : pos + n] = values[start + i : stop : nch]
+            self._fill += n
+            self.sample_count += n
+            done += n
+            if self._fill == self.block_samples:
+                self._flush_block()
+
+    def _flush_block(self):
+        if self._fill == 0:
+            return
+        if self.block_count >= self._reserved:
+            self._reserved += self.prealloc_blocks
+            self._f.truncate(self.header_size + self._reserved * self.block_bytes)
+        self._index.append(self._ts[0])
+        self._f.seek(self.header_size + self.block_count * self.block_bytes)
+        self._f.write(_le_bytes(self._ts))
+        for col in self._cols:
+            self._f.write(_le_bytes(col))
+        self.block_count += 1
+        self._fill = 0
+        self._write_header(0)
+
+    def close(self):
+        if self._f.closed:
+            return
+        if self._fill:
+            # Pad the tail block so every block keeps the same size.
+            pos = self._fill
+            pad = self.block_samples - pos
+            self._ts[pos:] = array("Q", [self._ts[pos - 1]]) * pad
+            for col in self._cols:
+                col[pos:] = array("f", [_NAN]) * pad
+            self._flush_block()
+        index_offset = self.header_size + self.block_count * self.block_bytes
+        self._f.truncate(index_offset)
+        self._f.seek(index_offset)
+        self._f.write(_le_bytes(self._index))
+        self._write_header(index_offset if self.block_count else 0)
+        self._f.close()
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "channels": self.channels,
+            "samples": self.sample_count,
+            "blocks": self.block_count + (1 if self._fill else 0),
+            "block_samples": self.block_samples,
+        }
+
+
+class CaptureReader:
+    """Memory-mapped view of a capture file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        if len(self._mm) < CAPTURE_HEAD.size:
+            self.close()
+            raise ValueError(f"{path}: not a capture file")
+        (
+            magic,
+            version,
+            nch,
+            self.block_samples,
+            self.header_size,
+            self.sample_count,
+            self.block_count,
+            index_offset,
+        ) = CAPTURE_HEAD.unpack_from(self._mm, 0)
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            self.close()
+            raise ValueError(f"{path}: unsupported capture format")
+        ids = array("H")
+        ids.frombytes(self._mm[CAPTURE_HEAD.size : CAPTURE_HEAD.size + 2 * nch])
+        self.channels: List[int] = list(_le_bytes(ids))
+        self.block_bytes = self.block_samples * (8 + 4 * nch)
+        # An interrupted capture has no index yet; block first timestamps rebuild it.
+        if index_offset and index_offset + 8 * self.block_count <= len(self._mm):
+            self._index = list(self._cast(index_offset, 8 * self.block_count, "Q"))
+        else:
+            self._index = [self._cast(self._block_offset(b), 8, "Q")[0] for b in range(self.block_count)]
+        self.sample_count = min(self.sample_count, self.block_count * self.block_samples)
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.sample_count
+
+    def _cast(self, off: int, size: int, fmt: str) -> memoryview:
+        view = self._view[off : off + size].cast(fmt)
+        if sys.byteorder != "little":
+            swapped = array(fmt, view)
+            swapped.byteswap()
+            return memoryview(swapped)
+        return view
+
+    def _block_offset(self, block: int) -> int:
+        return self.header_size + block * self.block_bytes
+
+    def _block_len(self, block: int) -> int:
+        return min(self.block_samples, self.sample_count - block * self.block_samples)
+
+    def block(self, block: int) -> Tuple[memoryview, List[memoryview]]:
+        """Return ``(ts, columns)`` views of the valid ticks in ``block``."""
+        if not 0 <= block < self.block_count:
+            raise IndexError(block)
+        n = self._block_len(block)
+        off = self._block_offset(block)
+        B = self.block_samples
+        ts = self._cast(off, 8 * n, "Q")
+        col0 = off + 8 * B
+        cols = [self._cast(col0 + 4 * B * c, 4 * n, "f") for c in range(len(self.channels))]
+        return ts, cols
+
+    def read(self, start: int, count: int) -> Tuple[array, List[array]]:
+        """Copy ticks ``[start, start+count)`` into ``(ts, columns)`` arrays."""
+        end = min(self.sample_count, start + max(0, count))
+        ts = array("Q")
+        cols = [array("f") for _ in self.channels]
+        pos = max(0, start)
+        while pos < end:
+            b, off = divmod(pos, self.block_samples)
+            n = min(end - pos, self._block_len(b) - off)
+            bts, bcols = self.block(b)
+            ts.extend(bts[off : off + n])
+            for dst, src in zip(cols, bcols):
+                dst.extend(src[off : off + n])
+            pos += n
+        return ts, cols
+
+    def seek_time(self, ts_us: int) -> int:
+        """Index of the first tick with a timestamp ``>= ts_us`` (``len(self)`` if none)."""
+        b = bisect.bisect_right(self._index, ts_us) - 1
+        if b < 0:
+            return 0
+        ts, _cols = self.block(b)
+        i = bisect.bisect_left(ts, ts_us)
+        if i < len(ts):
+            return b * self.block_samples + i
+        return min(self.sample_count, (b + 1) * self.block_samples)
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # A caller still holds a column view; the mapping goes away with it.
+            pass
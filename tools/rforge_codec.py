@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Shared variable value codec for the RForge tools.
+
+Features:
+- ``DataType`` (the ``VarDesc.type`` byte) mapped once to a precompiled little-endian
+  ``struct.Struct`` and a matching ``array``/``memoryview`` typecode
+- Scalar pack/unpack with integer wraparound on pack (the simulator stores what a C cast would)
+- Array variables encoded and decoded in bulk: decoding is one slice and one
+  ``memoryview.cast`` (zero-copy on little-endian hosts), encoding one ``array`` conversion
+- ``codec_for`` accepts the type as sent in either var table format: the binary type byte
+  (``6`` / ``"6"``) or the text name (``"float32"``)
+"""
+
+from __future__ import annotations
+
+import struct
+import sys
+from array import array
+from enum import IntEnum
+from typing import Callable, Dict, Iterable, Sequence, Union
+
+
+class DataType(IntEnum):
+    Int8 = 0
+    UInt8 = 1
+    Int16 = 2
+    UInt16 = 3
+    Int32 = 4
+    UInt32 = 5
+    Float32 = 6
+    Float64 = 7
+
+
+def _typecode(signed: str, size: int) -> str:
+    # 'i'/'I' are 4 bytes on every supported platform, 'l' only on some.
+    for code in (signed, "i" if signed.islower() else "I", "l" if signed.islower() else "L"):
+        if array(code).itemsize == size:
+            return code
+    raise RuntimeError(f"no array typecode of {size} bytes")
+
+
+class DtypeCodec:
+    """Encode/decode one ``DataType``: scalars via ``struct``, arrays via ``array``/``memoryview``."""
+
+    def __init__(self, dtype: DataType, fmt: str, typecode: str):
+        self.dtype = dtype
+        self.struct = struct.Struct("<" + fmt)
+        self.size = self.struct.size
+        self.typecode = typecode
+        self.is_float = fmt in "fd"
+        # Integers are packed through the unsigned format so out-of-range values wrap.
+        self._mask = None if self.is_float else (1 << (8 * self.size)) - 1
+        self._pack_struct = self.struct if self.is_float else struct.Struct("<" + fmt.upper())
+        self._pack_code = typecode if self.is_float else typecode.upper()
+
+    def pack(self, value: float) -> bytes:
+        if self._mask is None:
+            return self._pack_struct.pack(float(value))
+        return self._pack_struct.pack(int(value) & self._mask)
+
+    def packer(self) -> Callable[[float], bytes]:
+        """Precompiled scalar ``pack``; use ``pack_array`` for per-element array values."""
+        pack = self._pack_struct.pack
+        mask = self._mask
+        if mask is None:
+            return pack
+        return lambda value: pack(int(value) & mask)
+
+    def unpack(self, raw, offset: int = 0) -> float:
+        return float(self.struct.unpack_from(raw, offset)[0])
+
+    def pack_array(self, values: Iterable[float]) -> bytes:
+        if self._mask is None:
+            out = array(self._pack_code, values)
+        else:
+            mask = self._mask
+            out = array(self._pack_code, (int(v) & mask for v in values))
+        if sys.byteorder != "little":
+            out.byteswap()
+        return out.tobytes()
+
+    def unpack_array(self, raw) -> Sequence[float]:
+        """Whole elements of ``raw`` as a typed sequence (a ``memoryview`` cast when possible)."""
+        view = memoryview(raw).cast("B")
+        n = len(view) // self.size
+        view = view[: n * self.size]
+        if sys.byteorder != "little":
+            out = array(self.typecode, view.tobytes())
+            out.byteswap()
+            return out
+        return view.cast(self.typecode)
+
+
+CODECS: Dict[DataType, DtypeCodec] = {
+    DataType.Int8: DtypeCodec(DataType.Int8, "b", "b"),
+    DataType.UInt8: DtypeCodec(DataType.UInt8, "B", "B"),
+    DataType.Int16: DtypeCodec(DataType.Int16, "h", _typecode("h", 2)),
+    DataType.UInt16: DtypeCodec(DataType.UInt16, "H", _typecode("H", 2)),
+    DataType.Int32: DtypeCodec(DataType.Int32, "i", _typecode("i", 4)),
+    DataType.UInt32: DtypeCodec(DataType.UInt32, "I", _typecode("I", 4)),
+    DataType.Float32: DtypeCodec(DataType.Float32, "f", "f"),
+    DataType.Float64: DtypeCodec(DataType.Float64, "d", "d"),
+}
+
+_BY_NAME = {dt.name.lower(): dt for dt in DataType}
+
+
+def codec_for(dtype: Union[DataType, int, str]) -> DtypeCodec:
+    """Codec for a ``DataType``, a type byte, or a type name as found in either var table format."""
+    if isinstance(dtype, str):
+        key = dtype.strip().lower()
+        if key in _BY_NAME:
+            return CODECS[_BY_NAME[key]]
+        dtype = int(key, 0)
+    return CODECS[DataType(dtype)]
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Deterministic fault injection for the simulator TX path.
+
+Features:
+- One seeded ``random.Random`` per engine, used only on the TX writer thread, so a given
+  profile, seed and frame sequence always corrupts the same frames in the same way
+- Fault kinds that match what real links do, not only single bit flips:
+  - drop: frame never reaches the wire
+  - flip: ``n`` random bit flips in the frame, header, or payload region
+  - insert / delete: ``n`` random bytes inserted into or removed from the frame
+  - garbage: an SOF-lookalike fake header with a plausible length, plus ``n`` junk bytes, sent
+    before the frame (the worst case for a resyncing parser)
+  - truncate: frame cut at a random point
+  - stall: the line goes quiet for ``ms`` before the frame
+  - outage: every frame inside the window ``at + k*every .. +dur`` seconds is lost
+- Gilbert-Elliott burst model per rule: ``p`` starts a burst, which then lasts ``burst``
+  frames on average (``burst=1`` is a plain per-frame probability)
+- Per-command targeting (``cmd=0x20+ack``); raw items (VOFA text, JustFloat, replayed bytes)
+  only match rules without ``cmd``
+
+Profile spec (``--fault-profile``): comma list of ``kind[:key=value...]`` rules, applied in
+order, e.g. ``drop:p=0.01:burst=4,flip:p=0.002:n=3:cmd=stream,outage:at=2:dur=0.3:every=10``.
+``@path.json`` loads a JSON list of ``{"kind": ..., key: value}`` objects instead.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import time
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+from rforge_protocol import CRC_SIZE, HEADER_SIZE, MAX_PAYLOAD, SOF
+
+FAULT_KINDS = ("drop", "flip", "insert", "delete", "garbage", "truncate", "stall", "outage")
+FAULT_REGIONS = ("frame", "header", "payload")
+
+# Command aliases accepted by ``cmd=``.
+_CMD_NAMES = {"ack": 0x02, "stream": 0x20}
+
+
+@dataclass(frozen=True)
+class FaultRule:
+    kind: str
+    p: float = 0.0
+    burst: float = 1.0
+    n: int = 1
+    ms: float = 0.0
+    at: float = 0.0
+    dur: float = 0.0
+    every: float = 0.0
+    region: str = "frame"
+    cmd: Optional[FrozenSet[int]] = field(default=None)
+
+
+def _parse_cmds(text) -> FrozenSet[int]:
+    items = text if isinstance(text, list) else str(text).split("+")
+    cmds = set()
+    for item in items:
+        key = str(item).strip().lower()
+        cmds.add(_CMD_NAMES[key] if key in _CMD_NAMES else int(key, 0))
+    return frozenset(cmds)
+
+
+def _make_rule(kind: str, params: Dict[str, object]) -> FaultRule:
+    kind = kind.strip().lower()
+    if kind not in FAULT_KINDS:
+        raise ValueError(f"unknown fault kind: {kind} (expected one of {', '.join(FAULT_KINDS)})")
+    types = {f.name: f.type for f in fields(FaultRule)}
+    kwargs: Dict[str, object] = {}
+    for key, value in params.items():
+        if key not in types or key == "kind":
+            raise ValueError(f"{kind}: unknown fault option {key!r}")
+        if key == "cmd":
+            kwargs[key] = _parse_cmds(value)
+        elif key == "region":
+            if value not in FAULT_REGIONS:
+                raise ValueError(f"{kind}: region must be one of {', '.join(FAULT_REGIONS)}")
+            kwargs[key] = value
+        elif key == "n":
+            kwargs[key] = max(1, int(value))
+        else:
+            kwargs[key] = float(value)
+    rule = FaultRule(kind, **kwargs)
+    if rule.burst < 1.0:
+        raise ValueError(f"{kind}: burst is a mean length in frames and must be >= 1")
+    if kind == "outage" and rule.dur <= 0:
+        raise ValueError("outage needs dur > 0")
+    return rule
+
+
+def parse_fault_profile(spec: str) -> List[FaultRule]:
+    """Parse an inline ``kind:key=value`` spec, or ``@file.json`` holding a list of rule objects."""
+    spec = spec.strip()
+    if spec.startswith("@"):
+        items = json.loads(Path(spec[1:]).read_text(encoding="utf-8"))
+        return [_make_rule(str(item.get("kind", "")), {k: v for k, v in item.items() if k != "kind"}) for item in items]
+    rules: List[FaultRule] = []
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if not parts[0]:
+            continue
+        params: Dict[str, object] = {}
+        for part in parts[1:]:
+            key, sep, value = part.partition("=")
+            if not sep:
+                raise ValueError(f"{parts[0]}: expected key=value, got {part!r}")
+            params[key.strip()] = value.strip()
+        rules.append(_make_rule(parts[0], params))
+    return rules
+
+
+class FaultEngine:
+    """Applies a fault profile to outgoing frames and counts what it did.
+
+    ``apply`` runs on the TX writer thread; a stall sleeps there, so it holds back this frame
+    and everything queued behind it, as a stuck line would.
+    """
+
+    def __init__(self, rules: Sequence[FaultRule], seed: int = 1, t0: Optional[float] = None):
+        self.rules = list(rules)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self._bad = [False] * len(self.rules)
+        self.events: Dict[str, int] = {kind: 0 for kind in FAULT_KINDS}
+        self.frames = 0
+        self.frames_hit = 0
+        self.frames_lost = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.intact_bytes = 0
+        self.stall_s = 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def _fires(self, i: int, rule: FaultRule, now: float) -> bool:
+        if rule.kind == "outage":
+            t = now - self.t0 - rule.at
+            if t < 0:
+                return False
+            if rule.every > 0:
+                t %= rule.every
+            return t < rule.dur
+        rng = self.rng
+        if not self._bad[i] and rng.random() >= rule.p:
+            return False
+        # Stay in the burst with probability 1 - 1/burst: geometric lengths with mean ``burst``.
+        self._bad[i] = rng.random() >= 1.0 / rule.burst
+        return True
+
+    def _span(self, rule: FaultRule, size: int):
+        if rule.region == "header":
+            return 0, min(size, HEADER_SIZE)
+        if rule.region == "payload":
+            lo = min(size, HEADER_SIZE)
+            return lo, max(lo, size - CRC_SIZE)
+        return 0, size
+
+    def _garbage(self, n: int) -> bytes:
+        rng = self.rng
+        fake = bytearray(SOF)
+        fake += bytes((1, rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        length = rng.randrange(MAX_PAYLOAD + 1)
+        fake += bytes((length & 0xFF, length >> 8))
+        fake += bytes(rng.randrange(256) for _ in range(n))
+        return bytes(fake)
+
+    def apply(self, data: bytes, cmd: Optional[int] = None) -> Optional[bytes]:
+        """Return ``data`` with the profile applied, or None when the frame is lost."""
+        size = len(data)
+        self.frames += 1
+        self.bytes_in += size
+        now = time.perf_counter()
+        out: Optional[bytearray] = None
+        rng = self.rng
+        for i, rule in enumerate(self.rules):
+            if rule.cmd is not None and cmd not in rule.cmd:
+                continue
+            if not self._fires(i, rule, now):
+                continue
+            kind = rule.kind
+            self.events[kind] += 1
+            if kind in ("drop", "outage"):
+                self.frames_hit += 1
+                self.frames_lost += 1
+                return None
+            if kind == "stall":
+                time.sleep(rule.ms / 1000.0)
+                self.stall_s += rule.ms / 1000.0
+                continue
+            if out is None:
+                out = bytearray(data)
+            if kind == "garbage":
+                out[0:0] = self._garbage(rule.n)
+                continue
+            lo, hi = self._span(rule, len(out))
+            if hi <= lo:
+                continue
+            if kind == "flip":
+                for _ in range(rule.n):
+                    bit = rng.randrange((hi - lo) * 8)
+                    out[lo + bit // 8] ^= 1 << (bit % 8)
+            elif kind == "insert":
+                at = rng.randrange(lo, hi + 1)
+                out[at:at] = bytes(rng.randrange(256) for _ in range(rule.n))
+            elif kind == "delete":
+                at = rng.randrange(lo, hi)
+                del out[at : at + rule.n]
+            elif kind == "truncate":
+                # Keep at least one byte; a frame already shrunk to that has nothing left to cut.
+                cut = max(1, lo)
+                if hi > cut:
+                    del out[rng.randrange(cut, hi) :]
+        if out is None:
+            self.intact_bytes += size
+            self.bytes_out += size
+            return data
+        self.frames_hit += 1
+        self.bytes_out += len(out)
+        return bytes(out)
+
+    def snapshot(self) -> dict:
+        return {
+            "seed": self.seed,
+            "frames": self.frames,
+            "frames_hit": self.frames_hit,
+            "frames_lost": self.frames_lost,
+            "events": {k: v for k, v in self.events.items() if v},
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            # Share of the bytes sent that belong to untouched frames.
+            "goodput": round(self.intact_bytes / self.bytes_out, 4) if self.bytes_out else 1.0,
+            "stall_s": round(self.stall_s, 3),
+        }
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Renesas CC-RX .map symbol index for the UART simulator.
+
+Features:
+- Streaming parse (line by line, bytes regexes) of every symbol: name, address, size,
+  section, kind (data/func/...) and scope (g/l)
+- Persistent JSON cache keyed by map path + mtime + size, so repeat starts skip parsing
+- bisect-based lookup of the symbol containing an address or overlapping a range
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+CACHE_VERSION = 1
+
+_SECTION_RE = re.compile(rb"^SECTION=(\S+)")
+_SYMBOL_RE = re.compile(rb"^\s+(_[A-Za-z0-9_$.@]+)\s*$")
+_ADDR_RE = re.compile(rb"^\s+([0-9A-Fa-f]{8})\s+([0-9A-Fa-f]+)\s+(\w+)\s*,(\w)")
+
+
+@dataclass
+class MapSymbol:
+    name: str
+    address: int
+    size: int
+    section: str
+    kind: str
+    scope: str
+
+    @property
+    def end(self) -> int:
+        return self.address + max(1, self.size)
+
+
+def iter_map_symbols(map_path: Path) -> Iterator[MapSymbol]:
+    """Yield symbols from a CC-RX map file without loading it into memory."""
+    section = ""
+    current: Optional[bytes] = None
+    with open(map_path, "rb") as f:
+        for line in f:
+            if not line[:1].isspace():
+                m = _SECTION_RE.match(line)
+                if m:
+                    section = m.group(1).decode("ascii", errors="ignore")
+                current = None
+                continue
+            m1 = _SYMBOL_RE.match(line)
+            if m1:
+                current = m1.group(1)
+                continue
+            if current is None:
+                continue
+            m2 = _ADDR_RE.match(line)
+            if not m2:
+                continue
+            yield MapSymbol(
+                name=current.decode("ascii", errors="ignore").lstrip("_"),
+                address=int(m2.group(1), 16),
+                size=int(m2.group(2), 16),
+                section=section,
+                kind=m2.group(3).decode("ascii", errors="ignore"),
+                scope=m2.group(4).decode("ascii", errors="ignore"),
+            )
+            current = None
+
+
+class SymbolIndex:
+    """Address-sorted symbol table with bisect lookups."""
+
+    def __init__(self, symbols: List[MapSymbol], presorted: bool = False):
+        self.symbols = symbols if presorted else sorted(symbols, key=lambda s: (s.address, -s.size))
+        self._addrs = [s.address for s in self.symbols]
+        # Running max of symbol ends: lookups walk back only while an earlier symbol can still cover.
+        self._max_end: List[int] = []
+        top = 0
+        for s in self.symbols:
+            top = max(top, s.end)
+            self._max_end.append(top)
+        self._by_name = {s.name: s for s in self.symbols}
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def by_name(self, name: str) -> Optional[MapSymbol]:
+        return self._by_name.get(name)
+
+    def lookup(self, address: int) -> Optional[Tuple[MapSymbol, int]]:
+        """Return ``(symbol, offset)`` for the symbol containing ``address``."""
+        i = bisect.bisect_right(self._addrs, address) - 1
+        while i >= 0 and self._max_end[i] > address:
+            sym = self.symbols[i]
+            if address < sym.end:
+                return sym, address - sym.address
+            i -= 1
+        return None
+
+    def overlapping(self, address: int, size: int) -> List[MapSymbol]:
+        end = address + max(1, size)
+        out = []
+        hit = self.lookup(address)
+        if hit is not None:
+            out.append(hit[0])
+        i = bisect.bisect_left(self._addrs, address + 1)
+        while i < len(self.symbols) and self._addrs[i] < end:
+            out.append(self.symbols[i])
+            i += 1
+        return out
+
+    @classmethod
+    def from_variables(cls, vars_) -> "SymbolIndex":
+        return cls([MapSymbol(v.name, v.address, v.size, "", "data", "g") for v in vars_])
+
+
+def _cache_path(map_path: Path, cache_dir: Path) -> Tuple[Path, dict]:
+    st = map_path.stat()
+    resolved = str(map_path.resolve())
+    key = {"version": CACHE_VERSION, "source": resolved, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    digest = hashlib.sha1(resolved.encode("utf-8")).hexdigest()[:16]
+    return cache_dir / f"{map_path.stem}-{digest}.json", key
+
+
+def load_symbol_index(map_path: Path, cache_dir: Optional[Path] = None) -> Tuple[SymbolIndex, bool]:
+    """Return ``(index, cache_hit)``; parses and refreshes the cache when it is stale."""
+    path = cache_key = None
+    if cache_dir is not None:
+        path, cache_key = _cache_path(map_path, cache_dir)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("key") == cache_key:
+                sections = data["sections"]
+                kinds = data["kinds"]
+                symbols = [
+                    MapSymbol(name, addr, size, sections[sec], kinds[kind], scope)
+                    for name, addr, size, sec, kind, scope in zip(
+                        data["names"], data["addrs"], data["sizes"], data["section_ids"], data["kind_ids"], data["scopes"]
+                    )
+                ]
+                return SymbolIndex(symbols, presorted=True), True
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            pass
+
+    index = SymbolIndex(list(iter_map_symbols(map_path)))
+    if path is not None:
+        sections: List[str] = []
+        kinds: List[str] = []
+        section_ids = {}
+        kind_ids = {}
+        for s in index.symbols:
+            if s.section not in section_ids:
+                section_ids[s.section] = len(sections)
+                sections.append(s.section)
+            if s.kind not in kind_ids:
+                kind_ids[s.kind] = len(kinds)
+                kinds.append(s.kind)
+        data = {
+            "key": cache_key,
+            "sections": sections,
+            "kinds": kinds,
+            "names": [s.name for s in index.symbols],
+            "addrs": [s.address for s in index.symbols],
+            "sizes": [s.size for s in index.symbols],
+            "section_ids": [section_ids[s.section] for s in index.symbols],
+            "kind_ids": [kind_ids[s.kind] for s in index.symbols],
+            "scopes": [s.scope for s in index.symbols],
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+            tmp.replace(path)
+        except OSError:
+            # A read-only cache location only costs the next start a re-parse.
+            pass
+    return index, False
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Sparse byte-addressable memory model for the UART simulator.
+
+Features:
+- Page-based storage: fixed-size ``bytearray`` pages allocated on first write
+- Optional RAM images memory-mapped copy-on-write (``mmap.ACCESS_COPY``): the file is never
+  modified and only touched pages cost memory
+- Zero-copy reads: a range inside one page or image is returned as a ``memoryview`` slice
+- Raw dumps of the mapped span back to a flat image file
+
+Images take precedence over pages where they overlap. Reads of unmapped bytes return zeros;
+``is_mapped`` tells the caller whether an address was ever backed.
+"""
+
+from __future__ import annotations
+
+import bisect
+import mmap
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+DEFAULT_PAGE_SIZE = 4096
+
+Buffer = Union[bytes, memoryview]
+
+
+class SparseMemory:
+    def __init__(self, page_size: int = DEFAULT_PAGE_SIZE):
+        if page_size <= 0 or page_size & (page_size - 1):
+            raise ValueError("page_size must be a power of two")
+        self.page_size = page_size
+        self._shift = page_size.bit_length() - 1
+        self._mask = page_size - 1
+        self._pages: Dict[int, bytearray] = {}
+        self._zero = memoryview(bytes(page_size))
+        # Images sorted by base: parallel lists keep bisect on plain ints.
+        self._img_bases: List[int] = []
+        self._img_ends: List[int] = []
+        self._img_views: List[memoryview] = []
+        self._img_maps: List[mmap.mmap] = []
+
+    # ------------------------------------------------------------------ images
+    def map_image(self, path: Path, base: int) -> int:
+        """Map ``path`` copy-on-write at ``base``; returns the image size in bytes."""
+        with open(path, "rb") as f:
+            size = f.seek(0, 2)
+            if size == 0:
+                return 0
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        i = bisect.bisect_right(self._img_bases, base)
+        self._img_bases.insert(i, base)
+        self._img_ends.insert(i, base + size)
+        self._img_views.insert(i, memoryview(mm))
+        self._img_maps.insert(i, mm)
+        return size
+
+    def _image_at(self, addr: int) -> int:
+        i = bisect.bisect_right(self._img_bases, addr) - 1
+        if i >= 0 and addr < self._img_ends[i]:
+            return i
+        return -1
+
+    # ------------------------------------------------------------------ access
+    def is_mapped(self, addr: int) -> bool:
+        return (addr >> self._shift) in self._pages or self._image_at(addr) >= 0
+
+    def read(self, addr: int, size: int) -> Buffer:
+        """Return ``size`` bytes at ``addr``; zero-copy when the range sits in one page/image.
+
+        Views alias live memory, so copy them before holding them across later writes.
+        """
+        if size <= 0:
+            return b""
+        end = addr + size
+        i = self._image_at(addr)
+        if i >= 0 and end <= self._img_ends[i]:
+            off = addr - self._img_bases[i]
+            return self._img_views[i][off : off + size]
+        off = addr & self._mask
+        if i < 0 and off + size <= self.page_size and not self._overlaps_image(addr, end):
+            page = self._pages.get(addr >> self._shift)
+            view = memoryview(page) if page is not None else self._zero
+            return view[off : off + size]
+        out = bytearray(size)
+        pos = addr
+        while pos < end:
+            n = self._chunk(pos, end)
+            out[pos - addr : pos - addr + n] = self._read_chunk(pos, n)
+            pos += n
+        return bytes(out)
+
+    def write(self, addr: int, data: Buffer):
+        view = memoryview(data).cast("B") if not isinstance(data, (bytes, bytearray)) else data
+        end = addr + len(view)
+        pos = addr
+        while pos < end:
+            n = self._chunk(pos, end)
+            src = view[pos - addr : pos - addr + n]
+            i = self._image_at(pos)
+            if i >= 0:
+                off = pos - self._img_bases[i]
+                self._img_views[i][off : off + n] = src
+            else:
+                page = self._pages.get(pos >> self._shift)
+                if page is None:
+                    page = bytearray(self.page_size)
+                    self._pages[pos >> self._shift] = page
+                off = pos & self._mask
+                page[off : off + n] = src
+            pos += n
+
+    def _overlaps_image(self, addr: int, end: int) -> bool:
+        i = bisect.bisect_left(self._img_bases, addr)
+        return i < len(self._img_bases) and self._img_bases[i] < end
+
+    def _chunk(self, pos: int, end: int) -> int:
+        """Length of the run from ``pos`` that stays within one image or one page."""
+        i = self._image_at(pos)
+        if i >= 0:
+            return min(end, self._img_ends[i]) - pos
+        stop = min(end, (pos | self._mask) + 1)
+        j = bisect.bisect_right(self._img_bases, pos)
+        if j < len(self._img_bases) and self._img_bases[j] < stop:
+            stop = self._img_bases[j]
+        return stop - pos
+
+    def _read_chunk(self, pos: int, n: int) -> Buffer:
+        i = self._image_at(pos)
+        if i >= 0:
+            off = pos - self._img_bases[i]
+            return self._img_views[i][off : off + n]
+        page = self._pages.get(pos >> self._shift)
+        off = pos & self._mask
+        return (memoryview(page) if page is not None else self._zero)[off : off + n]
+
+    # ------------------------------------------------------------------ images out
+    def spans(self) -> List[Tuple[int, int]]:
+        """Sorted, merged ``(start, end)`` ranges backed by pages or images."""
+        raw = [(p << self._shift, (p + 1) << self._shift) for p in self._pages]
+        raw.extend(zip(self._img_bases, self._img_ends))
+        raw.sort()
+        merged: List[Tuple[int, int]] = []
+        for start, end in raw:
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def dump(self, path: Path, start: int = -1, size: int = -1) -> Tuple[int, int]:
+        """Write ``[start, start+size)`` (default: the whole mapped span) as a flat image."""
+        spans = self.spans()
+        if start < 0:
+            if not spans:
+                start, size = 0, 0
+            else:
+                start, size = spans[0][0], spans[-1][1] - spans[0][0]
+        end = start + max(0, size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            pos = start
+            # Holes between spans are written as zeros without materialising pages.
+            while pos < end:
+                n = min(self._chunk(pos, end), 1 << 20)
+                f.write(self._read_chunk(pos, n))
+                pos += n
+        return start, end - start
+
+    def close(self):
+        for view in self._img_views:
+            view.release()
+        for mm in self._img_maps:
+            try:
+                mm.close()
+            except BufferError:
+                # A caller still holds a read view; the mapping goes away with it.
+                pass
+        self._img_bases.clear()
+        self._img_ends.clear()
+        self._img_views.clear()
+        self._img_maps.clear()
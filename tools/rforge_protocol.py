@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Shared RForge UART protocol helpers for the simulator and the e2e tester.
+
+Features:
+- Table-driven CRC16-CCITT (poly=0x1021, init=0xFFFF) with an incremental API
+- Zero-copy incremental frame parser with linear-time resync
+- Packed multi-sample STREAM_DATA codec
+- Multi-frame READ_MEM_BATCH trailer layout
+- Paged GET_VAR_TABLE layouts
+- SET_WATCH_LIST request layout and sparse STREAM_DATA frames for watch-list samples
+- VOFA+ JustFloat stream framing (float32 array + tail marker) with an incremental parser
+"""
+
+from __future__ import annotations
+
+import binascii
+import struct
+import sys
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+SOF = b"\xAA\x55"
+VERSION = 0x01
+HEADER_SIZE = 8
+CRC_SIZE = 2
+MAX_PAYLOAD = 1024
+CRC16_INIT = 0xFFFF
+
+# SET_STREAM_CONFIG flags.
+STREAM_FLAG_INCLUDE_TS = 0x0001
+STREAM_FLAG_PACKED = 0x0002
+
+# Packed STREAM_DATA header: [ts_us:u64][period_us:u32][tick_count:u16][mask_len:u8] + mask[mask_len].
+PACKED_STREAM_HEAD = struct.Struct("<QIHB")
+
+# Binary READ_MEM_BATCH replies split over several frames end each part with [part:u8][flags:u8]
+# after the items; single-frame replies carry no trailer (legacy layout).
+READMEM_TRAILER = struct.Struct("<BB")
+READMEM_FLAG_LAST = 0x01
+
+# GET_VAR_TABLE_INFO (0x13) reply: [format:u8][reserved:u8][total:u32][table_hash:u64].
+VAR_TABLE_FORMAT = 1
+VAR_TABLE_INFO = struct.Struct("<BBIQ")
+# GET_VAR_TABLE_PAGE (0x14) request [offset:u32][max_count:u16] and per-frame reply header
+# [table_hash:u64][total:u32][offset:u32][count:u16] followed by count binary VarDesc entries.
+VAR_TABLE_PAGE_REQ = struct.Struct("<IH")
+VAR_TABLE_PAGE_HEAD = struct.Struct("<QIIH")
+
+# SET_WATCH_LIST (0x15) request: [count:u8] + count x [addr:u32][divisor:u16][deadband:f32].
+WATCH_ITEM = struct.Struct("<IHf")
+WATCH_MAX_ITEMS = 64
+# Watch entry ``i`` is reported on this stream channel id + i.
+WATCH_CHANNEL_BASE = 0x8000
+# Sparse STREAM_DATA: a packed header with this mask_len, then [channel_id:u16][value:f32] pairs.
+# Its length (15 + 6n) can never match a legacy frame (8 + 6n), and real masks are <= 32 bytes.
+SPARSE_MASK_LEN = 0xFF
+_SPARSE_ITEM = struct.Struct("<Hf")
+
+
+# VOFA+ JustFloat: little-endian float32 per channel, then this tail (+inf as a float32).
+JUSTFLOAT_TAIL = b"\x00\x00\x80\x7f"
+
+
+def crc16_update(crc: int, data) -> int:
+    """Fold ``data`` into a running CRC16-CCITT value.
+
+    ``data`` may be any bytes-like object (``bytes``, ``bytearray``, ``memoryview``),
+    so a frame can be checksummed piecewise without concatenating header and payload.
+    ``binascii.crc_hqx`` is the same MSB-first 0x1021 CRC, driven by a 256-entry table in C.
+    """
+    return binascii.crc_hqx(data, crc)
+
+
+def crc16_ccitt(data, init: int = CRC16_INIT) -> int:
+    return binascii.crc_hqx(data, init)
+
+
+class FrameParser:
+    """Incremental RForge frame parser over a read-offset buffer.
+
+    Bytes are appended with ``feed`` and frames are pulled by iterating the parser.
+    Consumed data is skipped by advancing a read offset; the unread tail is only moved
+    to the front when the write side runs out of room, so resync after noise or a CRC
+    failure never shifts the whole buffer and total work stays linear in bytes received.
+
+    Payloads are yielded as ``memoryview`` slices of the internal buffer and are valid
+    until the next ``feed``; copy them with ``bytes()`` to keep them longer. Do not call
+    ``feed`` while a parse iteration is suspended.
+    """
+
+    def __init__(self, capacity: int = 64 * 1024, max_payload: int = MAX_PAYLOAD):
+        self.max_payload = max_payload
+        self._buf = bytearray(max(capacity, HEADER_SIZE + max_payload + CRC_SIZE))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self.frames = 0
+        self.crc_errors = 0
+        self.length_errors = 0
+        self.dropped_bytes = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
+
+    def feed(self, data) -> None:
+        n = len(data)
+        if n == 0:
+            return
+        if self._end + n > len(self._buf):
+            self._make_room(n)
+        # Same-size slice assignment never resizes, so outstanding payload views stay legal.
+        self._buf[self._end : self._end + n] = data
+        self._end += n
+
+    def _make_room(self, extra: int):
+        pending = self._end - self._start
+        tail = bytes(self._view[self._start : self._end])
+        if pending + extra > len(self._buf):
+            # Grow by allocating a new buffer; views into the old one remain valid.
+            self._buf = bytearray(max(len(self._buf) * 2, pending + extra))
+            self._view = memoryview(self._buf)
+        self._buf[0:pending] = tail
+        self._start = 0
+        self._end = pending
+
+    def __iter__(self):
+        buf = self._buf
+        view = self._view
+        find = buf.find
+        pos = self._start
+        end = self._end
+        min_frame = HEADER_SIZE + CRC_SIZE
+        max_payload = self.max_payload
+        while end - pos >= min_frame:
+            # Resync on SOF to tolerate line noise / framing errors.
+            sof = find(SOF, pos, end)
+            if sof < 0:
+                # Keep a trailing 0xAA: it may be the first half of the next SOF.
+                sof = end - 1 if buf[end - 1] == 0xAA else end
+                self.dropped_bytes += sof - pos
+                pos = sof
+                break
+            if sof != pos:
+                self.dropped_bytes += sof - pos
+                pos = sof
+                if end - pos < min_frame:
+                    break
+            n = buf[pos + 6] | (buf[pos + 7] << 8)
+            if n > max_payload:
+                self.length_errors += 1
+                self.dropped_bytes += 1
+                pos += 1
+                continue
+            total = min_frame + n
+            if end - pos < total:
+                break
+            crc_at = pos + HEADER_SIZE + n
+            if crc16_update(CRC16_INIT, view[pos + 2 : crc_at]) != buf[crc_at] | (buf[crc_at + 1] << 8):
+                # Drop one byte and rescan from the failed position.
+                self.crc_errors += 1
+                self.dropped_bytes += 1
+                pos += 1
+                continue
+            cmd = buf[pos + 3]
+            seq = buf[pos + 4] | (buf[pos + 5] << 8)
+            payload = view[pos + HEADER_SIZE : crc_at]
+            pos += total
+            # Commit before yielding so a consumer may stop early without losing frames.
+            self._start = pos
+            self.frames += 1
+            yield cmd, seq, payload
+        if pos >= self._end:
+            self._start = 0
+            self._end = 0
+        else:
+            self._start = pos
+
+
+def channel_mask(channels: Sequence[int]) -> bytes:
+    """Little-endian channel bitmap: bit ``i`` of byte ``i // 8`` marks channel ``i``."""
+    if not channels:
+        return b""
+    mask = bytearray(max(channels) // 8 + 1)
+    for ch in channels:
+        mask[ch >> 3] |= 1 << (ch & 7)
+    return bytes(mask)
+
+
+def mask_channels(mask) -> List[int]:
+    return [i * 8 + bit for i, b in enumerate(mask) for bit in range(8) if b & (1 << bit)]
+
+
+def packed_stream_max_ticks(channel_count: int, mask_len: int, max_payload: int = MAX_PAYLOAD) -> int:
+    head = PACKED_STREAM_HEAD.size + mask_len
+    return max(1, (max_payload - head) // (4 * max(1, channel_count)))
+
+
+def encode_packed_stream(ts_us: int, period_us: int, mask: bytes, ticks: int, values: array) -> bytes:
+    """Build a packed STREAM_DATA payload from tick-major float32 ``values``."""
+    head = PACKED_STREAM_HEAD.pack(ts_us, period_us, ticks, len(mask))
+    if sys.byteorder != "little":
+        values = array("f", values)
+        values.byteswap()
+    return head + mask + values.tobytes()
+
+
+def decode_packed_stream(payload) -> Optional[Tuple[int, int, List[int], int, array]]:
+    """Return ``(ts_us, period_us, channels, tick_count, values)`` or None if malformed.
+
+    ``values`` is a flat tick-major float32 array of ``tick_count * len(channels)`` items.
+    """
+    if len(payload) < PACKED_STREAM_HEAD.size:
+        return None
+    ts_us, period_us, ticks, mask_len = PACKED_STREAM_HEAD.unpack_from(payload, 0)
+    if mask_len == SPARSE_MASK_LEN:
+        return None
+    off = PACKED_STREAM_HEAD.size + mask_len
+    if len(payload) < off:
+        return None
+    channels = mask_channels(payload[PACKED_STREAM_HEAD.size : off])
+    if len(payload) - off != 4 * ticks * len(channels):
+        return None
+    values = array("f")
+    values.frombytes(payload[off:])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return ts_us, period_us, channels, ticks, values
+
+
+def encode_watch_list(items: Sequence[Tuple[int, int, float]]) -> bytes:
+    """SET_WATCH_LIST payload from ``(addr, divisor, deadband)`` entries; empty clears the list."""
+    return bytes((len(items),)) + b"".join(WATCH_ITEM.pack(a, d, b) for a, d, b in items)
+
+
+def decode_watch_list(payload) -> Optional[List[Tuple[int, int, float]]]:
+    if len(payload) < 1:
+        return None
+    count = payload[0]
+    if count > WATCH_MAX_ITEMS or len(payload) != 1 + count * WATCH_ITEM.size:
+        return None
+    return [WATCH_ITEM.unpack_from(payload, 1 + i * WATCH_ITEM.size) for i in range(count)]
+
+
+def is_sparse_stream(payload) -> bool:
+    return len(payload) >= PACKED_STREAM_HEAD.size and payload[PACKED_STREAM_HEAD.size - 1] == SPARSE_MASK_LEN
+
+
+def encode_sparse_stream(ts_us: int, pairs: Sequence[Tuple[int, float]]) -> bytes:
+    """One-tick STREAM_DATA payload carrying only the listed ``(channel_id, value)`` pairs."""
+    out = bytearray(PACKED_STREAM_HEAD.size + _SPARSE_ITEM.size * len(pairs))
+    PACKED_STREAM_HEAD.pack_into(out, 0, ts_us, 0, 1, SPARSE_MASK_LEN)
+    off = PACKED_STREAM_HEAD.size
+    for ch, value in pairs:
+        _SPARSE_ITEM.pack_into(out, off, ch, value)
+        off += _SPARSE_ITEM.size
+    return bytes(out)
+
+
+def decode_sparse_stream(payload) -> Optional[Tuple[int, List[Tuple[int, float]]]]:
+    """Return ``(ts_us, [(channel_id, value), ...])`` of a sparse STREAM_DATA payload, or None."""
+    if not is_sparse_stream(payload):
+        return None
+    body = len(payload) - PACKED_STREAM_HEAD.size
+    if body % _SPARSE_ITEM.size:
+        return None
+    ts_us = PACKED_STREAM_HEAD.unpack_from(payload, 0)[0]
+    pairs = [
+        _SPARSE_ITEM.unpack_from(payload, PACKED_STREAM_HEAD.size + i * _SPARSE_ITEM.size)
+        for i in range(body // _SPARSE_ITEM.size)
+    ]
+    return ts_us, pairs
+
+
+class JustFloatParser:
+    """Incremental VOFA+ JustFloat splitter over a read-offset buffer.
+
+    With ``channels=0`` the channel count is learned from the spacing of the first two tail
+    markers. After that every frame must end in ``JUSTFLOAT_TAIL`` exactly ``4 * channels``
+    bytes after it starts; a frame that does not is counted in ``misaligned`` and the parser
+    resyncs after the next tail. Payloads are yielded as ``memoryview`` slices valid until the
+    next ``feed``, as with ``FrameParser``.
+    """
+
+    def __init__(self, channels: int = 0, max_channels: int = 256, capacity: int = 64 * 1024):
+        self.channels = channels
+        self.max_channels = max_channels
+        self._buf = bytearray(max(capacity, 4 * max_channels + 8))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self.frames = 0
+        self.misaligned = 0
+        self.dropped_bytes = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def feed(self, data) -> None:
+        n = len(data)
+        if n == 0:
+            return
+        if self._end + n > len(self._buf):
+            pending = self._end - self._start
+            tail = bytes(self._view[self._start : self._end])
+            if pending + n > len(self._buf):
+                self._buf = bytearray(max(len(self._buf) * 2, pending + n))
+                self._view = memoryview(self._buf)
+            self._buf[0:pending] = tail
+            self._start = 0
+            self._end = pending
+        self._buf[self._end : self._end + n] = data
+        self._end += n
+
+    def _resync(self, pos: int, end: int) -> int:
+        """Skip to just after the next tail marker; returns the new position."""
+        tail = self._buf.find(JUSTFLOAT_TAIL, pos, end)
+        if tail < 0:
+            # Keep the last three bytes: they may begin the next tail marker.
+            keep = max(pos, end - 3)
+            self.dropped_bytes += keep - pos
+            return -keep - 1
+        self.dropped_bytes += tail + 4 - pos
+        return tail + 4
+
+    def __iter__(self):
+        buf = self._buf
+        view = self._view
+        pos = self._start
+        end = self._end
+        while True:
+            if self.channels == 0:
+                first = buf.find(JUSTFLOAT_TAIL, pos, end)
+                second = buf.find(JUSTFLOAT_TAIL, first + 4, end) if first >= 0 else -1
+                if second < 0:
+                    break
+                gap = second - first - 4
+                if gap > 0 and gap % 4 == 0 and gap // 4 <= self.max_channels:
+                    self.channels = gap // 4
+                self.dropped_bytes += first + 4 - pos
+                pos = first + 4
+                continue
+            data_end = pos + 4 * self.channels
+            if data_end + 4 > end:
+                break
+            if buf[data_end : data_end + 4] != JUSTFLOAT_TAIL:
+                self.misaligned += 1
+                nxt = self._resync(pos + 1, end)
+                if nxt < 0:
+                    pos = -nxt - 1
+                    break
+                pos = nxt
+                continue
+            payload = view[pos:data_end]
+            pos = data_end + 4
+            self._start = pos
+            self.frames += 1
+            yield payload
+        if pos >= self._end:
+            self._start = 0
+            self._end = 0
+        else:
+            self._start = pos
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Replay sources for the UART simulator's ``--replay`` mode.
+
+Features:
+- Raw byte captures (what the MCU sent, as logged on the wire) memory-mapped and indexed once
+  into ``(t_us, end_offset)`` events; STREAM_DATA ``ts_us`` gives the timing, or the line rate
+  when the capture has no stream frames
+- Decoded columnar captures (``rforge_capture``) exposed through the ``SignalEngine`` interface,
+  so the normal stream encoders (per-tick, packed, VOFA, JustFloat) send recorded samples
+- Nothing is re-read or copied per loop: both sources keep views into the mapping
+
+Both sources expose ``count`` events with ``t_us(i)`` timestamps relative to the first event;
+the simulator schedules them and loops.
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+from array import array
+from pathlib import Path
+from typing import List, Union
+
+from rforge_capture import CAPTURE_MAGIC, CaptureReader
+from rforge_protocol import CRC_SIZE, HEADER_SIZE, FrameParser
+
+CMD_STREAM_DATA = 0x20
+_INDEX_CHUNK = 1 << 16
+
+
+class RawReplay:
+    """Memory-mapped raw byte capture split into timed events at frame boundaries.
+
+    Each event is the bytes from the end of the previous event up to the end of one frame,
+    so noise and partial frames in the capture are replayed exactly as recorded.
+    """
+
+    def __init__(self, path: Path, baud: int, bits_per_byte: int = 10):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        self.size = len(self._mm)
+        self._ends = array("Q")
+        self._ts = array("q")
+        self.stream_frames = 0
+        self._index(max(1.0, baud / max(1, bits_per_byte)))
+        self.count = len(self._ends)
+
+    def _index(self, byte_rate: float):
+        parser = FrameParser()
+        framed = 0
+        stamps: List[int] = []
+        for pos in range(0, self.size, _INDEX_CHUNK):
+            parser.feed(self._view[pos : pos + _INDEX_CHUNK])
+            for cmd, _seq, payload in parser:
+                framed += HEADER_SIZE + len(payload) + CRC_SIZE
+                self._ends.append(framed + parser.dropped_bytes)
+                if cmd == CMD_STREAM_DATA and len(payload) >= 8:
+                    stamps.append(struct.unpack_from("<Q", payload, 0)[0])
+                    self.stream_frames += 1
+                else:
+                    stamps.append(-1)
+        if not self._ends or self._ends[-1] < self.size:
+            # Trailing bytes that never completed a frame go out as one last event.
+            self._ends.append(self.size)
+            stamps.append(-1)
+        if self.stream_frames == 0:
+            # No timestamps at all: space events by their time on the wire.
+            self._ts = array("q", (int(end * 1e6 / byte_rate) for end in self._ends))
+            return
+        # Untimed events (ACKs, noise) inherit the previous stream stamp; leading ones the first.
+        first = next(t for t in stamps if t >= 0)
+        last = first
+        ts = array("q")
+        for t in stamps:
+            if t >= 0:
+                # A stamp that runs backwards (MCU reset) is held, keeping time monotonic.
+                last = max(last, t)
+            ts.append(last - first)
+        self._ts = ts
+
+    def t_us(self, i: int) -> int:
+        return self._ts[i]
+
+    @property
+    def span_us(self) -> int:
+        return self._ts[-1] if self.count else 0
+
+    def event(self, i: int) -> memoryview:
+        start = self._ends[i - 1] if i else 0
+        return self._view[start : self._ends[i]]
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # A queued event still references the mapping; it goes away with the last view.
+            pass
+
+
+class CaptureSignal:
+    """``SignalEngine`` stand-in that renders recorded samples from a columnar capture.
+
+    Tick ``k`` is capture sample ``k % count``. Channels beyond the capture read as zero.
+    """
+
+    def __init__(self, reader: CaptureReader):
+        self.reader = reader
+        self.count = len(reader)
+        self.channel_count = len(reader.channels)
+        self._block = reader.block_samples
+        self._blocks = [reader.block(b) for b in range(reader.block_count)]
+
+    def configure(self, channel_count: int, rate: float):
+        self.channel_count = channel_count
+
+    def t_us(self, i: int) -> int:
+        b, off = divmod(i, self._block)
+        return self._blocks[b][0][off] - self._blocks[0][0][0]
+
+    @property
+    def span_us(self) -> int:
+        return self.t_us(self.count - 1) if self.count else 0
+
+    def nominal_hz(self) -> float:
+        span = self.span_us
+        return (self.count - 1) * 1e6 / span if span > 0 else 1000.0
+
+    def render(self, start_tick: int, ticks: int, out) -> None:
+        """Fill ``out`` (tick-major float32, ``ticks * channel_count`` items) from ``start_tick``."""
+        nch = self.channel_count
+        have = min(nch, len(self.reader.channels))
+        done = 0
+        while done < ticks:
+            b, off = divmod((start_tick + done) % self.count, self._block)
+            _ts, cols = self._blocks[b]
+            n = min(ticks - done, len(cols[0]) - off)
+            for ch in range(have):
+                out[done * nch + ch : (done + n) * nch : nch] = cols[ch][off : off + n]
+            for ch in range(have, nch):
+                out[done * nch + ch : (done + n) * nch : nch] = array("f", bytes(4 * n))
+            done += n
+
+    def tick_values(self, tick: int) -> List[float]:
+        b, off = divmod(tick % self.count, self._block)
+        cols = self._blocks[b][1]
+        have = min(self.channel_count, len(cols))
+        return [cols[ch][off] for ch in range(have)] + [0.0] * (self.channel_count - have)
+
+    def close(self):
+        self._blocks = []
+        self.reader.close()
+
+
+def open_replay(path: Path, baud: int) -> Union[RawReplay, CaptureSignal]:
+    """Open ``path`` as a decoded capture when it carries the capture magic, else as raw bytes."""
+    with open(path, "rb") as f:
+        magic = f.read(len(CAPTURE_MAGIC))
+    if magic == CAPTURE_MAGIC:
+        return CaptureSignal(CaptureReader(path))
+    return RawReplay(path, baud)
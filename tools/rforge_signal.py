@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Block-based waveform engine for the UART simulator stream.
+
+Each channel's waveform is precomputed once per (channel, sample rate) as one cycle of
+float32 samples indexed by tick number. Tables are capped at ``MAX_TABLE_LEN`` samples so a
+rate change (which happens on the stream thread) rebuilds them in milliseconds; only the
+current rate's tables are kept. Rendering a block of ticks x channels is then a
+wrapped slice of that table per channel, written with one strided slice assignment into a
+tick-major float32 buffer (``array('f')`` or a ``memoryview`` cast to ``'f'``), so the
+per-sample cost stays in C instead of Python-level ``math.sin`` calls.
+
+Waveform spec (``--waveform``): comma list of ``kind[:freq[:amp[:offset]]]`` entries, cycled
+across channels. Kinds:
+- mix: the legacy composite sine (0.7*sin + slow 0.35*sin modulation + per-channel offset)
+- sine, square: periodic at ``freq`` Hz
+- chirp: linear sweep from ``freq`` to ``20*freq`` over one second, repeating
+- noise: seeded gaussian noise with sigma ``amp``
+- step: four-level staircase repeating at ``freq`` Hz
+"""
+
+from __future__ import annotations
+
+import math
+import operator
+import random
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+WAVE_KINDS = ("mix", "sine", "square", "chirp", "noise", "step")
+# Longer cycles (very low frequencies at high rates) are shortened to this, raising the frequency.
+MAX_TABLE_LEN = 1 << 15
+NOISE_TABLE_LEN = 1 << 14
+
+_DEFAULT_FREQ = {"mix": 0.0, "sine": 1.0, "square": 2.0, "chirp": 1.0, "noise": 0.0, "step": 0.5}
+
+
+@dataclass(frozen=True)
+class ChannelWave:
+    kind: str = "mix"
+    freq: float = 0.0
+    amp: float = 1.0
+    offset: float = 0.0
+
+
+def parse_waveforms(spec: str) -> List[ChannelWave]:
+    waves: List[ChannelWave] = []
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if not parts[0]:
+            continue
+        kind = parts[0].lower()
+        if kind not in WAVE_KINDS:
+            raise ValueError(f"unknown waveform kind: {kind} (expected one of {', '.join(WAVE_KINDS)})")
+        nums = [float(p) for p in parts[1:4]]
+        freq = nums[0] if len(nums) > 0 else _DEFAULT_FREQ[kind]
+        amp = nums[1] if len(nums) > 1 else 1.0
+        offset = nums[2] if len(nums) > 2 else 0.0
+        waves.append(ChannelWave(kind, freq, amp, offset))
+    return waves or [ChannelWave()]
+
+
+def _cycle_len(rate: float, freq: float) -> int:
+    if freq <= 0:
+        return MAX_TABLE_LEN
+    return max(2, min(MAX_TABLE_LEN, int(round(rate / freq))))
+
+
+def build_table(wave: ChannelWave, ch: int, rate: float, seed: int = 0) -> array:
+    """One repeating cycle of ``wave`` sampled at ``rate`` Hz for channel ``ch``."""
+    two_pi = 2 * math.pi
+    sin = math.sin
+    kind = wave.kind
+    amp = wave.amp
+    off = wave.offset
+    if kind == "mix":
+        n1 = _cycle_len(rate, 0.8 + ch * 0.11)
+        # Round the slow modulation to a whole number of base cycles so the sum repeats exactly.
+        n2 = max(n1, min(MAX_TABLE_LEN // n1 * n1, int(round(rate / 0.07 / n1)) * n1))
+        ph = ch * 0.2
+        dc = amp * ch * 0.03 + off
+        # One base cycle repeated in C, plus the modulation: n1 + n2 sines instead of 2 * n2.
+        a1, w1 = 0.7 * amp, two_pi / n1
+        a2, w2 = 0.35 * amp, two_pi / n2
+        base = array("f", [a1 * sin(w1 * i) for i in range(n1)]) * (n2 // n1)
+        vals = map(operator.add, base, [a2 * sin(w2 * i + ph) + dc for i in range(n2)])
+    elif kind == "sine":
+        n = _cycle_len(rate, wave.freq)
+        w = two_pi / n
+        vals = [amp * sin(w * i) + off for i in range(n)]
+    elif kind == "square":
+        n = _cycle_len(rate, wave.freq)
+        half = n // 2
+        vals = [off + amp] * half + [off - amp] * (n - half)
+    elif kind == "chirp":
+        n = max(2, min(MAX_TABLE_LEN, int(round(rate))))
+        f0 = max(wave.freq, 1e-3)
+        k = (19 * f0) / n  # Hz gained per tick over one second
+        vals = [amp * sin(two_pi * (f0 * i + 0.5 * k * i * i) / rate) + off for i in range(n)]
+    elif kind == "noise":
+        rng = random.Random(seed * 7919 + ch)
+        vals = [rng.gauss(off, amp) for _ in range(NOISE_TABLE_LEN)]
+    elif kind == "step":
+        n = max(4, _cycle_len(rate, wave.freq))
+        vals = [off + amp * ((4 * i // n) * 2 / 3 - 1) for i in range(n)]
+    else:
+        raise ValueError(f"unknown waveform kind: {kind}")
+    return array("f", vals)
+
+
+class SignalEngine:
+    """Renders blocks of ticks x channels from cached per-channel cycle tables."""
+
+    def __init__(self, waves: Sequence[ChannelWave], seed: int = 0):
+        self.waves = list(waves) or [ChannelWave()]
+        self.seed = seed
+        self.channel_count = 0
+        self.rate = 0.0
+        self._tables: List[array] = []
+        self._cache: Dict[Tuple[ChannelWave, int, float], array] = {}
+
+    def configure(self, channel_count: int, rate: float):
+        if channel_count == self.channel_count and rate == self.rate:
+            return
+        if rate != self.rate:
+            # Rate changes are rare and tables are per rate: keep only the new rate's.
+            self._cache = {key: table for key, table in self._cache.items() if key[2] == rate}
+        tables = []
+        for ch in range(channel_count):
+            wave = self.waves[ch % len(self.waves)]
+            key = (wave, ch, rate)
+            table = self._cache.get(key)
+            if table is None:
+                table = build_table(wave, ch, rate, self.seed)
+                self._cache[key] = table
+            tables.append(table)
+        self._tables = tables
+        self.channel_count = channel_count
+        self.rate = rate
+
+    def render(self, start_tick: int, ticks: int, out) -> None:
+        """Fill ``out`` (tick-major float32, ``ticks * channel_count`` items) from ``start_tick``."""
+        nch = self.channel_count
+        for ch, table in enumerate(self._tables):
+            n = len(table)
+            i = start_tick % n
+            if i + ticks <= n:
+                out[ch::nch] = table[i : i + ticks]
+                continue
+            seg = table[i:]
+            while len(seg) < ticks:
+                seg += table[: ticks - len(seg)]
+            out[ch::nch] = seg
+
+    def tick_values(self, tick: int) -> List[float]:
+        return [table[tick % len(table)] for table in self._tables]
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Constant-memory statistics shared by the simulator, tester and benchmark tools.
+
+``LogHistogram`` buckets positive values on a geometric grid (default ~4% wide buckets),
+so recording is O(1), memory is bounded regardless of sample count, and percentiles are
+accurate to one bucket width. ``SeqGapCounter`` counts frames lost between 16-bit wrapping
+sequence numbers, and ``StreamStats`` combines both into loss, gap and jitter figures for a
+frame stream. ``LinkHealth`` measures parser resync after corruption and goodput.
+``StageTimer`` keeps one histogram per named hot-path stage.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional, Sequence
+
+
+class LogHistogram:
+    def __init__(self, min_value: float = 1e-6, max_value: float = 1e3, buckets_per_octave: int = 16):
+        self.min_value = min_value
+        self.buckets_per_octave = buckets_per_octave
+        self._scale = buckets_per_octave / math.log(2.0)
+        self._size = int(math.log(max_value / min_value) * self._scale) + 2
+        self._counts = [0] * self._size
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        idx = int(math.log(value / self.min_value) * self._scale) + 1
+        return idx if idx < self._size else self._size - 1
+
+    def record(self, value: float):
+        self._counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogHistogram"):
+        for i, c in enumerate(other._counts):
+            self._counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def reset(self):
+        self._counts = [0] * self._size
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _bucket_value(self, idx: int) -> float:
+        if idx == 0:
+            return self.min_value
+        # Geometric midpoint of the bucket.
+        return self.min_value * math.exp((idx - 0.5) / self._scale)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = max(1, int(math.ceil(p / 100.0 * self.count)))
+        seen = 0
+        for idx, c in enumerate(self._counts):
+            seen += c
+            if seen >= rank:
+                value = self._bucket_value(idx)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self, points: Sequence[float] = (50, 95, 99), scale: float = 1.0) -> Dict[str, Optional[float]]:
+        """Percentiles, mean and extremes, each multiplied by ``scale`` (e.g. 1e3 for s -> ms)."""
+        out: Dict[str, Optional[float]] = {"count": self.count}
+        mean = self.total / self.count if self.count else None
+        out["mean"] = mean * scale if mean is not None else None
+        for p in points:
+            v = self.percentile(p)
+            out[f"p{p:g}"] = v * scale if v is not None else None
+        out["min"] = self.min * scale if self.min is not None else None
+        out["max"] = self.max * scale if self.max is not None else None
+        return out
+
+
+class SeqGapCounter:
+    """Count frames lost between 16-bit wrapping sequence numbers.
+
+    A step of more than half the sequence space is taken as a late or duplicate frame rather
+    than 65k losses.
+    """
+
+    def __init__(self, bits: int = 16):
+        self._mask = (1 << bits) - 1
+        self._half = 1 << (bits - 1)
+        self.last: Optional[int] = None
+        self.lost = 0
+        self.reordered = 0
+        self.runs = LogHistogram(1.0, 65536.0, 4)
+
+    def note(self, seq: int) -> int:
+        """Record ``seq``; returns the frames lost just before it (0 if none or out of order)."""
+        last = self.last
+        if last is None:
+            self.last = seq
+            return 0
+        gap = (seq - last - 1) & self._mask
+        if gap >= self._half:
+            self.reordered += 1
+            return 0
+        self.last = seq
+        if gap:
+            self.lost += gap
+            self.runs.record(gap)
+        return gap
+
+    def reset(self):
+        self.last = None
+        self.lost = 0
+        self.reordered = 0
+        self.runs.reset()
+
+
+class StreamStats:
+    """Loss, inter-frame gap and jitter of a frame stream in O(1) memory.
+
+    Gaps are recorded only between frames with consecutive sequence numbers, on both host
+    arrival time and the MCU ``ts_us`` clock. Jitter is the absolute deviation of each gap from
+    the nominal time the previous frame covered (``span_us``). Frames that share the sequence
+    space without being stream ticks (ACKs, replies, watch frames) go to ``skip``, so they are
+    neither counted as lost nor measured as gaps.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.other = 0
+        self.seq = SeqGapCounter()
+        self.host_gap = LogHistogram(1e-7, 10.0)
+        self.mcu_gap = LogHistogram(1e-7, 10.0)
+        self.host_jitter = LogHistogram(1e-7, 10.0)
+        self.mcu_jitter = LogHistogram(1e-7, 10.0)
+        self._last_host: Optional[float] = None
+        self._last_ts_us = 0
+        self._last_span_us = 0.0
+
+    def record(self, seq: int, t_host: float, ts_us: int, span_us: float):
+        self.frames += 1
+        lost = self.seq.note(seq)
+        if self._last_host is not None and lost == 0 and self.seq.last == seq:
+            nominal = self._last_span_us / 1e6
+            host_gap = t_host - self._last_host
+            mcu_gap = max(0.0, (ts_us - self._last_ts_us) / 1e6)
+            self.host_gap.record(host_gap)
+            self.mcu_gap.record(mcu_gap)
+            if nominal > 0:
+                self.host_jitter.record(abs(host_gap - nominal))
+                self.mcu_jitter.record(abs(mcu_gap - nominal))
+        if self.seq.last == seq:
+            self._last_host = t_host
+            self._last_ts_us = ts_us
+            self._last_span_us = span_us
+
+    def skip(self, seq: int):
+        """Note a received frame in the same sequence space that is not part of the stream."""
+        self.other += 1
+        if self.seq.note(seq):
+            # Frames were lost next to it, so the next stream gap would span them.
+            self._last_host = None
+
+    def summary(self) -> Dict[str, object]:
+        total = self.frames + self.other + self.seq.lost
+        return {
+            "frames": self.frames,
+            "other_frames": self.other,
+            "lost": self.seq.lost,
+            "reordered": self.seq.reordered,
+            "loss_ratio": self.seq.lost / total if total else 0.0,
+            "loss_runs": self.seq.runs.summary(),
+            "host_gap_ms": self.host_gap.summary(scale=1e3),
+            "mcu_gap_ms": self.mcu_gap.summary(scale=1e3),
+            "host_jitter_ms": self.host_jitter.summary(scale=1e3),
+            "mcu_jitter_ms": self.mcu_jitter.summary(scale=1e3),
+        }
+
+
+class LinkHealth:
+    """Parser recovery and goodput of a received byte stream.
+
+    Feed it the parser's running ``dropped_bytes`` count: ``frame`` after each good frame and
+    ``end_read`` after each read. A disruption starts at the first read that discarded bytes
+    and ends at the next good frame; its duration (read granularity) and the bytes skipped are
+    recorded. Goodput is the share of received bytes that belonged to good frames.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.frame_bytes = 0
+        self.resyncs = 0
+        self.resync_s = LogHistogram(1e-7, 100.0)
+        self.resync_bytes = LogHistogram(1.0, float(1 << 24), 4)
+        self._dropped = 0
+        self._since: Optional[float] = None
+
+    def read(self, size: int):
+        self.bytes += size
+
+    def frame(self, now: float, size: int, dropped: int):
+        self.frame_bytes += size
+        if dropped != self._dropped:
+            self.resyncs += 1
+            self.resync_s.record(now - self._since if self._since is not None else 0.0)
+            self.resync_bytes.record(dropped - self._dropped)
+            self._dropped = dropped
+            self._since = None
+
+    def end_read(self, now: float, dropped: int):
+        if dropped != self._dropped and self._since is None:
+            self._since = now
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "bytes": self.bytes,
+            "frame_bytes": self.frame_bytes,
+            "goodput": round(self.frame_bytes / self.bytes, 4) if self.bytes else 1.0,
+            "resyncs": self.resyncs,
+            "resync_ms": self.resync_s.summary(scale=1e3),
+            "resync_bytes": self.resync_bytes.summary(),
+        }
+
+
+class StageTimer:
+    """Per-stage duration histograms (seconds) for hot-path instrumentation.
+
+    Each stage should be recorded from one thread only. ``snapshot`` swaps in fresh
+    histograms, so every report covers one interval; a sample racing the swap lands in the
+    previous interval at worst.
+    """
+
+    def __init__(self):
+        self._hists: Dict[str, LogHistogram] = {}
+
+    def record(self, stage: str, seconds: float):
+        hist = self._hists.get(stage)
+        if hist is None:
+            hist = self._hists.setdefault(stage, LogHistogram(1e-8, 10.0))
+        hist.record(seconds)
+
+    def snapshot(self, interval_s: float) -> Dict[str, Dict[str, Optional[float]]]:
+        """Per-stage microsecond percentiles plus ``load``: time spent / ``interval_s``."""
+        out: Dict[str, Dict[str, Optional[float]]] = {}
+        for stage in sorted(self._hists):
+            hist = self._hists[stage]
+            self._hists[stage] = LogHistogram(1e-8, 10.0)
+            summary = hist.summary(scale=1e6)
+            summary["load"] = hist.total / interval_s if interval_s > 0 else None
+            out[stage] = summary
+        return out
@@ -0,0 +1,753 @@
+#!/usr/bin/env python3
+"""
+Byte transports shared by the UART simulator and the e2e tester.
+
+Backends:
+- serial: pyserial port (COM8, /dev/ttyUSB0), the only one that needs a driver
+- pty: POSIX pseudo-terminal pair; the device side creates it, the host opens the peer path
+- tcp: local socket; the device side listens, the host connects
+- memory: in-process pipe pair from ``memory_pair()`` for single-process runs
+
+Every backend exposes the same ``read(size)`` / ``write(data)`` / ``close()`` surface as
+``serial.Serial``: ``read`` returns ``b""`` after the read timeout, ``write`` raises
+``TransportTimeout`` when the peer does not drain within the write timeout.
+
+``PacedTransport`` wraps any backend so transmitted bytes leave at UART line rate through a
+bounded TX FIFO, which makes pty/tcp/memory links saturate like a real port.
+
+``TxWriter`` puts a single coalescing writer thread with bounded control/stream priority
+lanes in front of any backend, so producers on several threads never touch the port directly.
+"""
+
+from __future__ import annotations
+
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from rforge_stats import LogHistogram, StageTimer
+
+TRANSPORT_KINDS = ("serial", "pty", "tcp", "memory")
+TX_POLICIES = ("block", "drop-oldest", "drop-newest")
+LANE_CONTROL = 0
+LANE_STREAM = 1
+DEFAULT_TCP_ADDR = "127.0.0.1:5760"
+# Default per-write timeout; serial links scale it up to cover one full batch (see serial_write_budget).
+WRITE_TIMEOUT = 0.05
+
+
+class TransportError(Exception):
+    pass
+
+
+class TransportTimeout(TransportError):
+    pass
+
+
+class Transport:
+    name = "transport"
+
+    def read(self, size: int) -> bytes:
+        raise NotImplementedError
+
+    def write(self, data) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SerialTransport(Transport):
+    def __init__(self, port: str, baud: int, timeout: float, write_timeout: Optional[float]):
+        import serial
+
+        self._serial_mod = serial
+        self._port = serial.Serial(port, baud, timeout=timeout, write_timeout=write_timeout)
+        self.name = port
+
+    def read(self, size: int) -> bytes:
+        try:
+            return self._port.read(size)
+        except self._serial_mod.SerialException as ex:
+            raise TransportError(str(ex)) from ex
+
+    def write(self, data) -> int:
+        try:
+            return self._port.write(data)
+        except self._serial_mod.SerialTimeoutException as ex:
+            raise TransportTimeout(str(ex)) from ex
+        except self._serial_mod.SerialException as ex:
+            raise TransportError(str(ex)) from ex
+
+    def close(self):
+        self._port.close()
+
+
+class _FdTransport(Transport):
+    def __init__(self, fd: int, name: str, timeout: float, write_timeout: Optional[float]):
+        os.set_blocking(fd, False)
+        self._fd = fd
+        self.name = name
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+
+    def read(self, size: int) -> bytes:
+        ready, _, _ = select.select([self._fd], [], [], self.timeout)
+        if not ready:
+            return b""
+        try:
+            return os.read(self._fd, size)
+        except BlockingIOError:
+            return b""
+        except OSError as ex:
+            raise TransportError(str(ex)) from ex
+
+    def write(self, data) -> int:
+        view = memoryview(data)
+        total = len(view)
+        sent = 0
+        deadline = None
+        while sent < total:
+            try:
+                sent += os.write(self._fd, view[sent:])
+                continue
+            except BlockingIOError:
+                pass
+            except OSError as ex:
+                raise TransportError(str(ex)) from ex
+            now = time.perf_counter()
+            if deadline is None:
+                deadline = now + (self.write_timeout if self.write_timeout is not None else 1e9)
+            if now >= deadline:
+                raise TransportTimeout(f"write timeout after {sent}/{total} bytes")
+            select.select([], [self._fd], [], deadline - now)
+        return total
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PtyTransport(_FdTransport):
+    """Device side of a pty pair. The host opens ``peer_path`` (or the ``link`` symlink)."""
+
+    def __init__(self, link: Optional[str], timeout: float, write_timeout: Optional[float]):
+        import pty
+        import tty
+
+        master, slave = pty.openpty()
+        tty.setraw(slave)
+        # Keep our own slave handle open so the master never sees EIO between host sessions.
+        self._slave = slave
+        self.peer_path = os.ttyname(slave)
+        self._link = None
+        if link:
+            if os.path.islink(link):
+                os.unlink(link)
+            os.symlink(self.peer_path, link)
+            self._link = link
+        super().__init__(master, self.peer_path, timeout, write_timeout)
+
+    def close(self):
+        super().close()
+        os.close(self._slave)
+        if self._link and os.path.islink(self._link):
+            os.unlink(self._link)
+
+
+class PtyPeerTransport(_FdTransport):
+    """Host side of a pty pair created by ``PtyTransport``."""
+
+    def __init__(self, path: str, timeout: float, write_timeout: Optional[float]):
+        import tty
+
+        fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(fd)
+        super().__init__(fd, path, timeout, write_timeout)
+
+
+def parse_tcp_addr(text: Optional[str]) -> Tuple[str, int]:
+    host, _, port = (text or DEFAULT_TCP_ADDR).rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class TcpTransport(Transport):
+    """Local TCP link. The listening side accepts one host at a time and re-accepts on disconnect."""
+
+    def __init__(
+        self,
+        addr: Optional[str],
+        listen: bool,
+        timeout: float,
+        write_timeout: Optional[float],
+        connect_timeout: float = 5.0,
+    ):
+        host, port = parse_tcp_addr(addr)
+        self.host = host
+        self.port = port
+        self.name = f"tcp://{host}:{port}"
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self._listener: Optional[socket.socket] = None
+        self._sock: Optional[socket.socket] = None
+        if listen:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind((host, port))
+            self._listener.listen(1)
+            # Port 0 asks the OS for a free port; report the one actually bound.
+            self.port = self._listener.getsockname()[1]
+            self.name = f"tcp://{host}:{self.port}"
+            return
+        deadline = time.perf_counter() + connect_timeout
+        while True:
+            try:
+                self._attach(socket.create_connection((host, port), timeout=connect_timeout))
+                return
+            except OSError as ex:
+                if time.perf_counter() >= deadline:
+                    raise TransportError(f"connect {self.name} failed: {ex}") from ex
+                time.sleep(0.05)
+
+    def _attach(self, sock: socket.socket):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Reads are gated by select(); the socket timeout only bounds sendall().
+        sock.settimeout(self.write_timeout)
+        self._sock = sock
+
+    def _drop(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+        if self._listener is None:
+            raise TransportError(f"{self.name} closed by peer")
+
+    def read(self, size: int) -> bytes:
+        sock = self._sock
+        if sock is None:
+            if self._listener is None:
+                raise TransportError(f"{self.name} is closed")
+            ready, _, _ = select.select([self._listener], [], [], self.timeout)
+            if ready:
+                conn, _addr = self._listener.accept()
+                self._attach(conn)
+            return b""
+        ready, _, _ = select.select([sock], [], [], self.timeout)
+        if not ready:
+            return b""
+        try:
+            data = sock.recv(size)
+        except OSError:
+            data = b""
+        if not data:
+            self._drop()
+        return data
+
+    def write(self, data) -> int:
+        sock = self._sock
+        if sock is None:
+            # Nobody attached: like an unconnected UART line, bytes are simply lost.
+            return len(data)
+        try:
+            sock.sendall(data)
+        except socket.timeout as ex:
+            raise TransportTimeout(f"{self.name} write timeout") from ex
+        except OSError as ex:
+            self._drop()
+            raise TransportError(str(ex)) from ex
+        return len(data)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+
+class _ByteChannel:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.closed = False
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+
+    def put(self, data, timeout: Optional[float]) -> int:
+        view = memoryview(data)
+        sent = 0
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while sent < len(view):
+                if self.closed:
+                    return len(view)
+                room = self.capacity - len(self._buf)
+                if room > 0:
+                    chunk = view[sent : sent + room]
+                    self._buf.extend(chunk)
+                    sent += len(chunk)
+                    self._cond.notify_all()
+                    continue
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    raise TransportTimeout(f"write timeout after {sent}/{len(view)} bytes")
+                self._cond.wait(remaining)
+        return sent
+
+    def get(self, size: int, timeout: float) -> bytes:
+        with self._cond:
+            if not self._buf and not self.closed:
+                self._cond.wait(timeout)
+            data = bytes(self._buf[:size])
+            del self._buf[:size]
+            if data:
+                self._cond.notify_all()
+            return data
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class MemoryTransport(Transport):
+    def __init__(self, rx: _ByteChannel, tx: _ByteChannel, name: str, timeout: float, write_timeout: Optional[float]):
+        self._rx = rx
+        self._tx = tx
+        self.name = name
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+
+    def read(self, size: int) -> bytes:
+        return self._rx.get(size, self.timeout)
+
+    def write(self, data) -> int:
+        return self._tx.put(data, self.write_timeout)
+
+    def close(self):
+        self._rx.close()
+        self._tx.close()
+
+
+def memory_pair(
+    capacity: int = 1 << 20,
+    timeout: float = 0.01,
+    write_timeout: Optional[float] = WRITE_TIMEOUT,
+) -> Tuple[MemoryTransport, MemoryTransport]:
+    """Return ``(host, device)`` endpoints of an in-process full-duplex byte pipe."""
+    to_device = _ByteChannel(capacity)
+    to_host = _ByteChannel(capacity)
+    host = MemoryTransport(to_host, to_device, "memory:host", timeout, write_timeout)
+    device = MemoryTransport(to_device, to_host, "memory:device", timeout, write_timeout)
+    return host, device
+
+
+class PacedTransport(Transport):
+    """Transmit through an emulated TX FIFO drained at UART line rate.
+
+    ``write`` queues the whole buffer in a FIFO of ``fifo_bytes`` (the MCU's DMA/TX buffer)
+    and returns as soon as it fits. A drain thread forwards the bytes to ``inner`` at
+    ``baud / bits_per_byte`` bytes per second, in ``quantum_s`` slices delivered when their
+    last byte would have left the wire; FIFO room is freed at that point too. A write that
+    does not fit waits for room (a stall); if no room frees up for ``write_timeout`` the rest
+    is discarded and ``TransportTimeout`` is raised (a FIFO overflow). Reads pass straight
+    through.
+    """
+
+    def __init__(
+        self,
+        inner: Transport,
+        baud: int,
+        fifo_bytes: int = 2048,
+        bits_per_byte: int = 10,
+        write_timeout: Optional[float] = WRITE_TIMEOUT,
+        quantum_s: float = 0.001,
+    ):
+        self.inner = inner
+        self.name = inner.name
+        self.baud = baud
+        self.byte_rate = max(1.0, baud / max(1, bits_per_byte))
+        self.fifo_bytes = max(1, fifo_bytes)
+        self.write_timeout = write_timeout
+        self.quantum = max(1, int(self.byte_rate * quantum_s))
+        self._fifo = bytearray()
+        self._cond = threading.Condition()
+        self._running = True
+        self.bytes_out = 0
+        self.busy_s = 0.0
+        self.stalls = 0
+        self.overflows = 0
+        self.overflow_bytes = 0
+        self.max_fill = 0
+        self.stall_time = LogHistogram()
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._drain, name="uart-line", daemon=True)
+        self._thread.start()
+
+    @property
+    def fill(self) -> int:
+        return len(self._fifo)
+
+    def wait_below(self, level: int, timeout: float) -> bool:
+        """Wait up to ``timeout`` until at most ``level`` bytes are queued; True if they are."""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._fifo) <= level or not self._running, timeout)
+
+    def read(self, size: int) -> bytes:
+        return self.inner.read(size)
+
+    def write(self, data) -> int:
+        view = memoryview(data)
+        total = len(view)
+        sent = 0
+        t0 = None
+        deadline = None
+        with self._cond:
+            while sent < total:
+                if not self._running:
+                    raise TransportError(f"{self.name} is closed")
+                room = self.fifo_bytes - len(self._fifo)
+                # Whole writes or nothing while they fit the FIFO; larger writes stream through
+                # it, taking room as the line frees it instead of waiting for an empty FIFO.
+                need = total - sent if total <= self.fifo_bytes else 1
+                if room >= need:
+                    chunk = view[sent : sent + room]
+                    self._fifo.extend(chunk)
+                    sent += len(chunk)
+                    if len(self._fifo) > self.max_fill:
+                        self.max_fill = len(self._fifo)
+                    self._cond.notify_all()
+                    # Progress restarts the overflow timer; only a line that stops draining overflows.
+                    deadline = None
+                    continue
+                now = time.perf_counter()
+                if t0 is None:
+                    t0 = now
+                    self.stalls += 1
+                if deadline is None and self.write_timeout is not None:
+                    deadline = now + self.write_timeout
+                if deadline is not None and now >= deadline:
+                    self.overflows += 1
+                    self.overflow_bytes += total - sent
+                    self.stall_time.record(now - t0)
+                    raise TransportTimeout(f"tx fifo overflow after {sent}/{total} bytes")
+                self._cond.wait(None if deadline is None else deadline - now)
+        if t0 is not None:
+            self.stall_time.record(time.perf_counter() - t0)
+        return total
+
+    def _drain(self):
+        line_free = time.perf_counter()
+        while True:
+            with self._cond:
+                while self._running and not self._fifo:
+                    self._cond.wait(0.1)
+                if not self._running:
+                    return
+                data = bytes(self._fifo[: self.quantum])
+            now = time.perf_counter()
+            # The line keeps its own clock: back-to-back slices leave with no idle gap.
+            start = max(now, line_free)
+            line_free = start + len(data) / self.byte_rate
+            self.busy_s += line_free - start
+            delay = line_free - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.inner.write(data)
+            except TransportError:
+                # The far end is gone or stalled; the bytes are lost on the line as on a real UART.
+                pass
+            with self._cond:
+                del self._fifo[: len(data)]
+                self.bytes_out += len(data)
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "baud": self.baud,
+            "byte_rate": self.byte_rate,
+            "fifo_bytes": self.fifo_bytes,
+            "fill": self.fill,
+            "max_fill": self.max_fill,
+            "bytes_out": self.bytes_out,
+            "utilization": self.busy_s / elapsed if elapsed > 0 else 0.0,
+            "stalls": self.stalls,
+            "overflows": self.overflows,
+            "overflow_bytes": self.overflow_bytes,
+            "stall_ms": self.stall_time.summary(scale=1e3),
+        }
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+        self.inner.close()
+
+
+def line_bytes(baud: int, seconds: float, bits_per_byte: int = 10) -> int:
+    """Bytes a UART at ``baud`` puts on the wire in ``seconds``."""
+    return int(baud / max(1, bits_per_byte) * seconds)
+
+
+def line_time(baud: int, nbytes: int, bits_per_byte: int = 10) -> float:
+    """Seconds ``nbytes`` take on the wire at ``baud``."""
+    return nbytes * max(1, bits_per_byte) / max(1, baud)
+
+
+def serial_write_budget(baud: int, max_batch: int, min_batch: int, bits_per_byte: int = 10) -> Tuple[int, float]:
+    """Batch cap and write timeout for a UART: a batch fits in half of ``WRITE_TIMEOUT`` of line
+    time (but never below ``min_batch``, one whole frame), and the timeout covers twice its line time."""
+    batch = min(max_batch, max(min_batch, line_bytes(baud, WRITE_TIMEOUT / 2, bits_per_byte)))
+    return batch, max(WRITE_TIMEOUT, 2 * line_time(baud, batch, bits_per_byte))
+
+
+def open_transport(
+    kind: str,
+    port: Optional[str],
+    baud: int,
+    device: bool,
+    timeout: float = 0.01,
+    write_timeout: Optional[float] = WRITE_TIMEOUT,
+) -> Transport:
+    """Open one end of a link. ``device`` selects the simulator side (pty creator / tcp listener)."""
+    if kind == "serial":
+        if not port:
+            raise TransportError("serial transport requires --port")
+        return SerialTransport(port, baud, timeout, write_timeout)
+    if kind == "pty":
+        if device:
+            return PtyTransport(port, timeout, write_timeout)
+        if not port:
+            raise TransportError("pty transport requires --port <peer path>")
+        return PtyPeerTransport(port, timeout, write_timeout)
+    if kind == "tcp":
+        return TcpTransport(port, device, timeout, write_timeout)
+    if kind == "memory":
+        raise TransportError("memory transport is in-process only; use memory_pair()")
+    raise TransportError(f"unknown transport: {kind}")
+
+
+class TxWriter:
+    """Single writer thread that drains bounded per-lane frame queues in coalesced writes.
+
+    Producers call ``submit(item, size, lane)``; the writer pops as many queued items as
+    fit in ``max_batch`` bytes, control lane first, turns each into bytes with ``finalize``
+    (on the writer thread, so per-frame state such as sequence numbers is only touched
+    there, in wire order) and issues one ``transport.write`` for the whole batch.
+
+    When the stream lane is full, ``policy`` decides: ``block`` waits up to
+    ``block_timeout`` for room, ``drop-oldest`` evicts the oldest queued item,
+    ``drop-newest`` rejects the new one. A full control lane waits without a timeout for
+    the writer to make room rather than dropping replies; only a stopped writer rejects
+    them, counted in ``control_drops``. Nothing is dropped silently; every
+    outcome and the per-lane submit-to-written latency is reported by ``snapshot()``.
+    With ``stages`` set, every ``transport.write`` call is timed as the ``write`` stage.
+
+    A write cannot be preempted, so a reply queued while a batch is on the wire waits for all
+    of it. ``stream_batch`` caps the stream-lane bytes taken per write (at least one item),
+    so on a line-rate link the control lane is checked again every few ms of line time. If
+    the transport buffers writes itself (``PacedTransport.wait_below``), the next batch is
+    only taken once that buffer is down to ``stream_batch`` bytes, so stream data cannot pile
+    up there ahead of a reply either.
+    An exception from ``finalize`` loses only that item: it is counted in ``finalize_errors``,
+    the first one is printed, and the writer carries on.
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        max_items: int = 256,
+        max_batch: int = 16384,
+        policy: str = "block",
+        block_timeout: Optional[float] = 0.05,
+        finalize: Optional[Callable[[Any], Optional[bytes]]] = None,
+        control_items: int = 64,
+        stages: Optional[StageTimer] = None,
+        stream_batch: Optional[int] = None,
+    ):
+        if policy not in TX_POLICIES:
+            raise ValueError(f"unknown tx policy: {policy}")
+        self.transport = transport
+        self.max_items = max(1, max_items)
+        self.max_batch = max(1, max_batch)
+        self.stream_batch = self.max_batch if stream_batch is None else max(1, min(stream_batch, self.max_batch))
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.finalize = finalize or (lambda item: item)
+        self.stages = stages
+        self._lanes = (deque(), deque())
+        self._capacity = (max(1, control_items), self.max_items)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.writes = 0
+        self.write_errors = 0
+        self.frames_lost = 0
+        self.finalize_errors = 0
+        self.finalize_error: Optional[str] = None
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.block_timeouts = 0
+        self.control_drops = 0
+        self.max_depth = 0
+        self.lane_latency = (LogHistogram(), LogHistogram())
+
+    @property
+    def depth(self) -> int:
+        return len(self._lanes[LANE_CONTROL]) + len(self._lanes[LANE_STREAM])
+
+    def lane_depth(self, lane: int) -> int:
+        return len(self._lanes[lane])
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="tx-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, item: Any, size: int, lane: int = LANE_STREAM) -> bool:
+        """Queue ``item`` (about ``size`` bytes on the wire). Returns False if it was dropped."""
+        with self._cond:
+            queue = self._lanes[lane]
+            capacity = self._capacity[lane]
+            if len(queue) >= capacity:
+                if lane == LANE_STREAM and self.policy == "drop-oldest":
+                    queue.popleft()
+                    self.dropped_oldest += 1
+                elif lane == LANE_STREAM and self.policy == "drop-newest":
+                    self.dropped_newest += 1
+                    return False
+                elif lane == LANE_CONTROL:
+                    self._cond.wait_for(lambda: len(queue) < capacity or not self._running)
+                    if len(queue) >= capacity:
+                        self.control_drops += 1
+                        return False
+                elif not self._cond.wait_for(lambda: len(queue) < capacity, self.block_timeout):
+                    self.block_timeouts += 1
+                    return False
+            queue.append((item, size, lane, time.perf_counter()))
+            self.submitted += 1
+            depth = self.depth
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._cond.notify_all()
+        return True
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._lanes[LANE_CONTROL] and not self._lanes[LANE_STREAM]:
+                if not self._running:
+                    return None
+                self._cond.wait(0.1)
+            batch = []
+            size = 0
+            control, stream = self._lanes
+            while control and (not batch or size + control[0][1] <= self.max_batch):
+                entry = control.popleft()
+                batch.append(entry)
+                size += entry[1]
+            limit = min(self.max_batch, size + self.stream_batch)
+            while stream and (not batch or size + stream[0][1] <= limit):
+                entry = stream.popleft()
+                batch.append(entry)
+                size += entry[1]
+            # Wake producers blocked on a full queue.
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        wait_below = getattr(self.transport, "wait_below", None)
+        if self.stream_batch >= self.max_batch:
+            wait_below = None
+        while True:
+            if wait_below is not None:
+                wait_below(self.stream_batch, 0.1)
+            batch = self._take_batch()
+            if batch is None:
+                return
+            chunks = []
+            sent = []
+            for entry in batch:
+                try:
+                    data = self.finalize(entry[0])
+                except Exception as ex:
+                    self.finalize_errors += 1
+                    self.frames_lost += 1
+                    if self.finalize_error is None:
+                        self.finalize_error = repr(ex)
+                        print(f"[TX] finalize failed, item dropped: {ex!r}", file=sys.stderr)
+                    continue
+                if data:
+                    chunks.append(data)
+                    sent.append(entry)
+            if not chunks:
+                continue
+            data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+            stages = self.stages
+            t0 = time.perf_counter() if stages is not None else 0.0
+            try:
+                self.transport.write(data)
+            except TransportError:
+                # Backpressure is expected at high stream rates; keep the writer alive.
+                self.write_errors += 1
+                self.frames_lost += len(chunks)
+                if stages is not None:
+                    stages.record("write", time.perf_counter() - t0)
+                continue
+            done = time.perf_counter()
+            if stages is not None:
+                stages.record("write", done - t0)
+            for entry in sent:
+                self.lane_latency[entry[2]].record(done - entry[3])
+            self.writes += 1
+            self.frames_out += len(chunks)
+            self.bytes_out += len(data)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "depth": self.depth,
+            "control_depth": self.lane_depth(LANE_CONTROL),
+            "stream_depth": self.lane_depth(LANE_STREAM),
+            "max_depth": self.max_depth,
+            "capacity": self.max_items,
+            "max_batch": self.max_batch,
+            "stream_batch": self.stream_batch,
+            "submitted": self.submitted,
+            "frames_out": self.frames_out,
+            "bytes_out": self.bytes_out,
+            "writes": self.writes,
+            "coalesce_ratio": self.frames_out / self.writes if self.writes else 0.0,
+            "write_errors": self.write_errors,
+            "frames_lost": self.frames_lost,
+            "finalize_errors": self.finalize_errors,
+            "finalize_error": self.finalize_error,
+            "dropped_oldest": self.dropped_oldest,
+            "dropped_newest": self.dropped_newest,
+            "block_timeouts": self.block_timeouts,
+            "control_drops": self.control_drops,
+            "control_latency_ms": self.lane_latency[LANE_CONTROL].summary(scale=1e3),
+            "stream_latency_ms": self.lane_latency[LANE_STREAM].summary(scale=1e3),
+        }
@@ -0,0 +1,138 @@
+"""FrameDispatcher queueing and matching, and pipelined requests over it."""
+
+import struct
+import threading
+import time
+
+from rforge_protocol import FrameParser
+from rforge_transport import memory_pair
+from uart_e2e_tester import FrameDispatcher, build_frame, run_pipeline, wait_ack
+
+CMD_ACK = 0x02
+
+
+def ack(seq: int, for_cmd: int, for_seq: int, status: int = 0) -> bytes:
+    return build_frame(CMD_ACK, seq, struct.pack("<BBH", status, for_cmd, for_seq))
+
+
+def wait_for(pred, timeout: float = 2.0) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not pred() and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    return pred()
+
+
+def test_full_queue_drops_the_oldest_frame():
+    host, device = memory_pair()
+    with FrameDispatcher(host, max_queue=3) as io:
+        device.write(b"".join(ack(s, 0x01, s) for s in range(1, 6)))
+        assert wait_for(lambda: io.frames.get(CMD_ACK) == 5)
+        assert io.overflow == 2
+        assert [io.wait(CMD_ACK, 0.1)[1] for _ in range(3)] == [3, 4, 5]
+        assert io.wait(CMD_ACK, 0.01) is None
+        assert io.stats()["overflow"] == 2
+
+
+def test_wait_with_match_leaves_other_frames_queued():
+    host, device = memory_pair()
+    with FrameDispatcher(host) as io:
+        device.write(ack(1, 0x01, 7) + ack(2, 0x01, 9))
+        assert wait_for(lambda: io.frames.get(CMD_ACK) == 2)
+        assert wait_ack(io, 9, 0.1)[1] == 2
+        assert wait_ack(io, 8, 0.05) is None
+        # A waiter wakes as soon as a matching frame arrives, not at its deadline.
+        threading.Timer(0.05, device.write, (ack(3, 0x01, 8),)).start()
+        t0 = time.perf_counter()
+        assert wait_ack(io, 8, 2.0)[1] == 3
+        assert time.perf_counter() - t0 < 1.0
+        assert wait_ack(io, 7, 0.1)[1] == 1
+
+
+def test_handler_frames_bypass_the_queue_and_seq_sink():
+    host, device = memory_pair()
+    seen = []
+    sunk = []
+    with FrameDispatcher(host) as io:
+        io.subscribe(0x20, lambda seq, payload, t: seen.append((seq, bytes(payload))))
+        io.seq_sink = sunk.append
+        device.write(build_frame(0x20, 1, b"s1") + ack(2, 0x01, 1) + build_frame(0x20, 3, b"s2"))
+        assert wait_for(lambda: len(seen) == 2 and sunk)
+        assert seen == [(1, b"s1"), (3, b"s2")]
+        assert sunk == [2]
+        assert io.wait(0x20, 0.01) is None
+        assert io.stats()["seq_lost"] == 0
+
+
+class OutOfOrderDevice:
+    """Answers each read's requests in reverse order.
+
+    The first request carrying a ``busy_once`` payload gets BUSY, one carrying a ``drop_once``
+    payload gets no reply at all.
+    """
+
+    def __init__(self, link, busy_once=(), drop_once=()):
+        self.link = link
+        self.busy_once = set(busy_once)
+        self.drop_once = set(drop_once)
+        self.received = []
+        self.answered = {}
+        self.running = True
+        self.seq = 1
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        parser = FrameParser()
+        while self.running:
+            data = self.link.read(4096)
+            if not data:
+                continue
+            parser.feed(data)
+            replies = []
+            for cmd, seq, payload in parser:
+                payload = bytes(payload)
+                self.received.append(payload)
+                status = 0
+                if payload in self.drop_once:
+                    self.drop_once.discard(payload)
+                    continue
+                if payload in self.busy_once:
+                    self.busy_once.discard(payload)
+                    status = 3
+                else:
+                    self.answered[seq] = payload
+                replies.append(ack(self.seq, cmd, seq, status))
+                self.seq += 1
+            self.link.write(b"".join(reversed(replies)))
+
+    def stop(self):
+        self.running = False
+        self.thread.join(1.0)
+
+
+def test_pipelined_replies_are_matched_to_their_requests():
+    host, device = memory_pair()
+    requests = [(0x01, bytes((i,))) for i in range(10)]
+    dev = OutOfOrderDevice(device, busy_once=[b"\x02"], drop_once=[b"\x05"])
+    try:
+        with FrameDispatcher(host) as io:
+            result, next_seq = run_pipeline(io, requests, window=4, timeout_s=0.2, retries=2, seq=100)
+    finally:
+        dev.stop()
+    assert result["completed"] == 10 and result["failed"] == 0
+    assert result["busy"] == 1 and result["retries"] == 2
+    # Ten requests plus two resends, each under a fresh seq.
+    assert next_seq == 112
+    # Only the BUSY and the unanswered request went out twice: replies were matched by seq,
+    # not by arrival order.
+    counts = {p: dev.received.count(p) for p in set(dev.received)}
+    assert counts == {p: 2 if p in (b"\x02", b"\x05") else 1 for _c, p in requests}
+    assert sorted(dev.answered.values()) == [p for _c, p in requests]
+
+
+def test_pipeline_gives_up_after_retries():
+    host, _device = memory_pair()
+    with FrameDispatcher(host) as io:
+        result, _ = run_pipeline(io, [(0x01, b"")] * 2, window=2, timeout_s=0.05, retries=1, seq=1)
+    assert result["completed"] == 0 and result["failed"] == 2
+    assert result["retries"] == 2
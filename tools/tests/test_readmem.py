@@ -0,0 +1,94 @@
+"""READ_MEM_BATCH: request coalescing, multi-frame encoding and the tester's reassembly."""
+
+import struct
+
+import pytest
+
+import uart_mcu_sim
+from rforge_protocol import MAX_PAYLOAD, READMEM_FLAG_LAST, READMEM_TRAILER
+from rforge_transport import memory_pair
+from uart_e2e_tester import decode_readmem, decode_readmem_binary_part, readmem_part_is_last
+from uart_mcu_sim import coalesce_reads, encode_readmem_binary
+
+
+def test_coalesce_groups_only_abutting_runs():
+    reqs = [(0x100, 4), (0x104, 4), (0x108, 2), (0x200, 4), (0x204, 0), (0x204, 4)]
+    assert coalesce_reads(reqs) == [
+        (0x100, 10, [(0x100, 4), (0x104, 4), (0x108, 2)]),
+        (0x200, 4, [(0x200, 4)]),
+        (0x204, 0, [(0x204, 0)]),
+        (0x204, 4, [(0x204, 4)]),
+    ]
+
+
+def test_small_reply_keeps_legacy_single_frame_layout():
+    parts = encode_readmem_binary([(0x10, b"abcd"), (0x14, b"ef")])
+    assert len(parts) == 1
+    assert parts[0] == struct.pack("<HIH", 2, 0x10, 4) + b"abcd" + struct.pack("<IH", 0x14, 2) + b"ef"
+    assert readmem_part_is_last(parts[0])
+
+
+def test_items_do_not_straddle_frames():
+    items = [(0x1000 + 0x400 * i, bytes([i]) * 300) for i in range(10)]
+    parts = encode_readmem_binary(items)
+    assert len(parts) > 1
+    for i, part in enumerate(parts):
+        assert len(part) <= MAX_PAYLOAD
+        values, trailer = decode_readmem_binary_part(part)
+        assert trailer == (i, READMEM_FLAG_LAST if i == len(parts) - 1 else 0)
+        assert all(len(raw) == 300 for raw in values.values())
+    values, fmt, frames = decode_readmem(parts)
+    assert (fmt, frames) == ("binary", len(parts))
+    assert values == dict(items)
+
+
+@pytest.mark.parametrize("with_requests", [True, False])
+def test_oversized_item_is_rejoined(with_requests):
+    big = bytes(range(256)) * 12
+    items = [(0x2000, b"head"), (0x2004, big), (0x2004 + len(big), b"tail")]
+    parts = encode_readmem_binary(items)
+    assert len(parts) == 4
+    requests = [(addr, len(raw)) for addr, raw in items] if with_requests else None
+    values, _fmt, _frames = decode_readmem(parts, requests)
+    assert values == dict(items)
+
+
+def test_abutting_requests_stay_separate():
+    items = [(0x3000 + 4 * i, struct.pack("<f", i)) for i in range(4)]
+    values, _fmt, _frames = decode_readmem(encode_readmem_binary(items), [(a, 4) for a, _ in items])
+    assert values == dict(items)
+
+
+def test_max_frames_caps_the_reply():
+    items = [(0x1000 * i, b"x" * 1000) for i in range(10)]
+    parts = encode_readmem_binary(items, max_frames=3)
+    assert len(parts) == 3
+    assert READMEM_TRAILER.unpack_from(parts[-1], len(parts[-1]) - READMEM_TRAILER.size)[1] == READMEM_FLAG_LAST
+
+
+@pytest.fixture
+def sim():
+    _host, device = memory_pair()
+    return uart_mcu_sim.UartMcuSim(uart_mcu_sim.parse_args(["--transport", "memory", "--quiet"]), transport=device)
+
+
+def flatten(items):
+    return [(addr, bytes(raw)) for addr, raw in items]
+
+
+def test_coalescing_does_not_change_the_reply(sim):
+    adc = next(v for v in sim.vars if v.array_size > 1)
+    page_end = (adc.address | 0xFFF) + 1
+    cases = [
+        [(v.address, 4) for v in sim.vars[:4]],
+        [(adc.address, adc.size), (adc.address + adc.size, 8)],
+        # A run that crosses from a backed page into unbacked memory.
+        [(page_end - 4, 4), (page_end, 8), (page_end + 8, 4)],
+        # A run that starts unbacked and then reaches a symbol.
+        [(0x10000000 - 4, 4), (0x10000000, 4)],
+    ]
+    sim.var_gens.clear()  # freeze values so both reads see the same bytes
+    for reqs in cases:
+        one_by_one = [item for req in reqs for item in flatten(sim.read_items([req]))]
+        assert flatten(sim.read_items(reqs)) == one_by_one
+    assert [addr for addr, _raw in sim.read_items(cases[2])] == [page_end - 4]
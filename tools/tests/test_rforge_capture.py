@@ -0,0 +1,69 @@
+"""Columnar capture write/read round trips."""
+
+import math
+from array import array
+
+import pytest
+
+from rforge_capture import CAPTURE_HEAD, CaptureReader, CaptureWriter
+
+
+def frame_values(start: int, ticks: int, channels):
+    """Tick-major values where each sample encodes its tick and channel."""
+    return array("f", [(start + t) + ch / 100 for t in range(ticks) for ch in channels])
+
+
+def test_round_trip_across_blocks(tmp_path):
+    path = tmp_path / "cap.rfcap"
+    channels = [0, 3, 7]
+    with CaptureWriter(path, channels, block_samples=16, prealloc_blocks=2) as writer:
+        tick = 0
+        for ticks in (5, 20, 1, 13):
+            writer.append(1000 + tick * 10, 10, channels, ticks, frame_values(tick, ticks, channels))
+            tick += ticks
+    with CaptureReader(path) as reader:
+        assert len(reader) == 39 and reader.channels == channels
+        assert reader.block_count == 3
+        ts, cols = reader.read(0, 100)
+        assert list(ts) == [1000 + 10 * t for t in range(39)]
+        for c, ch in enumerate(channels):
+            assert list(cols[c]) == pytest.approx([t + ch / 100 for t in range(39)])
+        # Ticks in the padded tail block past sample_count are not exposed.
+        bts, _ = reader.block(2)
+        assert len(bts) == 39 - 32
+        assert reader.seek_time(1000) == 0
+        assert reader.seek_time(1205) == 21
+        assert reader.seek_time(10**9) == 39
+        del bts, ts, cols
+
+
+def test_missing_and_extra_channels(tmp_path):
+    path = tmp_path / "cap.rfcap"
+    with CaptureWriter(path, [1, 2], block_samples=8) as writer:
+        writer.append(0, 1, [1, 2], 2, frame_values(0, 2, [1, 2]))
+        # Channel 2 missing, channel 9 not in the capture.
+        writer.append(2, 1, [9, 1], 2, frame_values(2, 2, [9, 1]))
+    with CaptureReader(path) as reader:
+        _ts, (c1, c2) = reader.read(0, 4)
+        assert list(c1) == pytest.approx([0.01, 1.01, 2.01, 3.01])
+        assert not math.isnan(c2[1]) and math.isnan(c2[2]) and math.isnan(c2[3])
+        del _ts, c1, c2
+
+
+def test_interrupted_capture_stays_readable(tmp_path):
+    path = tmp_path / "cap.rfcap"
+    writer = CaptureWriter(path, [0], block_samples=4)
+    writer.append(0, 5, [0], 10, frame_values(0, 10, [0]))
+    # No close(): the header covers the two full blocks and there is no index yet.
+    writer._f.flush()
+    with CaptureReader(path) as reader:
+        assert len(reader) == 8
+        assert reader.seek_time(22) == 5
+    writer.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "junk.bin"
+    path.write_bytes(b"x" * CAPTURE_HEAD.size)
+    with pytest.raises(ValueError):
+        CaptureReader(path)
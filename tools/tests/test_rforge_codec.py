@@ -0,0 +1,48 @@
+"""DtypeCodec scalar/array round trips and type lookup."""
+
+import struct
+
+import pytest
+
+from rforge_codec import CODECS, DataType, codec_for
+
+
+@pytest.mark.parametrize("dtype", list(DataType))
+def test_array_round_trip_keeps_distinct_elements(dtype):
+    codec = CODECS[dtype]
+    values = [1, 2, 3, 100, 7] if not codec.is_float else [0.5, -1.25, 3.0, 1e3, 7.75]
+    raw = codec.pack_array(values)
+    assert len(raw) == codec.size * len(values)
+    assert list(codec.unpack_array(raw)) == values
+    assert raw == b"".join(codec.pack(v) for v in values)
+
+
+def test_integers_wrap_like_a_c_cast():
+    assert CODECS[DataType.UInt8].pack(256 + 5) == b"\x05"
+    assert CODECS[DataType.Int8].pack(-1) == b"\xff"
+    assert CODECS[DataType.UInt16].pack_array([-1, 65536]) == b"\xff\xff\x00\x00"
+    assert CODECS[DataType.Int16].unpack(b"\xff\xff") == -1.0
+    assert CODECS[DataType.UInt32].packer()(-2) == struct.pack("<I", 0xFFFFFFFE)
+
+
+def test_unpack_array_ignores_trailing_partial_element():
+    codec = CODECS[DataType.UInt16]
+    assert list(codec.unpack_array(b"\x01\x00\x02\x00\x03")) == [1, 2]
+
+
+def test_unpack_offset():
+    codec = CODECS[DataType.Float32]
+    raw = b"xx" + struct.pack("<f", 2.5)
+    assert codec.unpack(raw, 2) == 2.5
+
+
+@pytest.mark.parametrize("key", [6, "6", "0x6", "float32", " Float32 ", DataType.Float32])
+def test_codec_for_accepts_both_table_formats(key):
+    assert codec_for(key) is CODECS[DataType.Float32]
+
+
+def test_codec_for_rejects_unknown():
+    with pytest.raises(ValueError):
+        codec_for(42)
+    with pytest.raises(ValueError):
+        codec_for("complex64")
@@ -0,0 +1,85 @@
+import itertools
+import struct
+
+import pytest
+
+from rforge_faults import FAULT_KINDS, FaultEngine, FaultRule, parse_fault_profile
+from rforge_protocol import FrameParser, crc16_ccitt
+
+ACK_FRAME = bytes.fromhex("aa55010201000400000101000000")
+
+
+def frames(count):
+    for i in range(count):
+        body = struct.pack("<BBHH", 1, 0x20, i & 0xFFFF, 4) + bytes((i & 0xFF, 1, 2, 3))
+        yield b"\xAA\x55" + body + struct.pack("<H", crc16_ccitt(body))
+
+
+def digest(engine, count=2000):
+    return [engine.apply(f, 0x20) for f in frames(count)]
+
+
+def test_same_seed_same_faults():
+    rules = parse_fault_profile("drop:p=0.05:burst=3,flip:p=0.05:n=2,garbage:p=0.02:n=4,insert:p=0.02,delete:p=0.02")
+    assert digest(FaultEngine(rules, seed=7)) == digest(FaultEngine(rules, seed=7))
+    assert digest(FaultEngine(rules, seed=7)) != digest(FaultEngine(rules, seed=8))
+
+
+@pytest.mark.parametrize("region", ["frame", "header", "payload"])
+@pytest.mark.parametrize("size", [0, 1, 2, 9, 14])
+def test_every_kind_at_p1_on_tiny_frames(size, region):
+    data = ACK_FRAME[:size]
+    kinds = [k for k in FAULT_KINDS if k not in ("drop", "outage", "stall")]
+    for order in itertools.permutations(kinds, 3):
+        rules = [FaultRule(kind, p=1.0, n=size + 1, region=region) for kind in order]
+        engine = FaultEngine(rules, seed=3)
+        for _ in range(20):
+            out = engine.apply(data, 0x02)
+            assert out is not None
+
+
+def test_delete_then_truncate_down_to_one_byte():
+    engine = FaultEngine(parse_fault_profile("delete:p=1:n=13,truncate:p=1"), seed=3)
+    assert len(engine.apply(ACK_FRAME, 0x02)) == 1
+
+
+def test_drop_outage_and_targeting():
+    engine = FaultEngine(parse_fault_profile("drop:p=1:cmd=stream,outage:at=0:dur=1000"), seed=1)
+    assert engine.apply(ACK_FRAME, 0x20) is None
+    assert engine.apply(ACK_FRAME, 0x02) is None
+    snap = engine.snapshot()
+    assert snap["events"] == {"drop": 1, "outage": 1}
+    assert snap["frames_lost"] == 2
+
+
+def test_burst_mean_length():
+    engine = FaultEngine([FaultRule("drop", p=0.01, burst=8.0)], seed=5)
+    lost = [engine.apply(ACK_FRAME) is None for _ in range(200_000)]
+    runs = [len(list(g)) for k, g in itertools.groupby(lost) if k]
+    assert 6.0 < sum(runs) / len(runs) < 10.0
+
+
+def test_garbage_resyncs_parser():
+    engine = FaultEngine(parse_fault_profile("garbage:p=0.2:n=8"), seed=2)
+    parser = FrameParser()
+    sent = list(frames(500))
+    got = []
+    for f in sent:
+        parser.feed(engine.apply(f, 0x20))
+        got.extend(seq for _cmd, seq, _p in parser)
+    # A fake header may swallow a few real frames while the parser waits for its length.
+    assert len(got) > 400
+    assert parser.dropped_bytes > 0
+
+
+@pytest.mark.parametrize("spec", ["bogus:p=1", "drop:x=1", "drop:p", "drop:burst=0.5", "outage:at=1", "flip:region=crc"])
+def test_bad_profiles_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_fault_profile(spec)
+
+
+def test_json_profile(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text('[{"kind": "drop", "p": 0.1, "burst": 2, "cmd": ["stream", "0x02"]}]')
+    (rule,) = parse_fault_profile(f"@{path}")
+    assert rule.kind == "drop" and rule.burst == 2.0 and rule.cmd == frozenset({0x20, 0x02})
@@ -0,0 +1,83 @@
+"""CC-RX map parsing, SymbolIndex lookups and the JSON symbol cache."""
+
+import os
+
+from rforge_mapfile import SymbolIndex, iter_map_symbols, load_symbol_index
+
+SAMPLE_MAP = """\
+*** Mapping List ***
+
+SECTION=B
+FILE=main.obj
+                                  00001000  0000101f        20
+  _g_buffer
+                                  00001000        10   data ,g         0
+  _g_speed
+                                  00001010         4   data ,g         0
+  _s_state
+                                  00001014         c   data ,l         0
+SECTION=P
+FILE=main.obj
+  _main
+                                  fff80000        40   func ,g         0
+"""
+
+
+def write_map(path, text=SAMPLE_MAP):
+    path.write_bytes(text.encode("ascii"))
+    return path
+
+
+def test_parse_sample_map(tmp_path):
+    symbols = list(iter_map_symbols(write_map(tmp_path / "app.map")))
+    assert [(s.name, s.address, s.size, s.section, s.kind, s.scope) for s in symbols] == [
+        ("g_buffer", 0x1000, 0x10, "B", "data", "g"),
+        ("g_speed", 0x1010, 4, "B", "data", "g"),
+        ("s_state", 0x1014, 0xC, "B", "data", "l"),
+        ("main", 0xFFF80000, 0x40, "P", "func", "g"),
+    ]
+
+
+def test_lookup_and_overlapping(tmp_path):
+    index = SymbolIndex(list(iter_map_symbols(write_map(tmp_path / "app.map"))))
+    assert len(index) == 4
+    sym, off = index.lookup(0x1012)
+    assert (sym.name, off) == ("g_speed", 2)
+    assert index.lookup(0x1020) is None
+    assert [s.name for s in index.overlapping(0x100E, 8)] == ["g_buffer", "g_speed", "s_state"]
+    assert index.by_name("main").address == 0xFFF80000
+
+
+def test_cache_hit_and_invalidation(tmp_path):
+    map_path = write_map(tmp_path / "app.map")
+    cache = tmp_path / "cache"
+    first, hit = load_symbol_index(map_path, cache)
+    assert not hit and len(list(cache.iterdir())) == 1
+    again, hit = load_symbol_index(map_path, cache)
+    assert hit
+    assert again.symbols == first.symbols
+
+    # Same size, new mtime: re-parsed.
+    st = map_path.stat()
+    os.utime(map_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    _, hit = load_symbol_index(map_path, cache)
+    assert not hit
+    assert load_symbol_index(map_path, cache)[1]
+
+    # New size (mtime pinned back): re-parsed, and the new symbol shows up.
+    st = map_path.stat()
+    write_map(map_path, SAMPLE_MAP.replace("_s_state", "_s_state_v2"))
+    os.utime(map_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    index, hit = load_symbol_index(map_path, cache)
+    assert not hit
+    assert index.by_name("s_state_v2") is not None
+
+
+def test_unreadable_cache_falls_back_to_parsing(tmp_path):
+    map_path = write_map(tmp_path / "app.map")
+    cache = tmp_path / "cache"
+    load_symbol_index(map_path, cache)
+    next(cache.iterdir()).write_text("{not json", encoding="utf-8")
+    index, hit = load_symbol_index(map_path, cache)
+    assert not hit and len(index) == 4
+    assert load_symbol_index(map_path, None)[1] is False
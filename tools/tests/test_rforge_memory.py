@@ -0,0 +1,70 @@
+"""SparseMemory pages, mapped images and dumps."""
+
+import pytest
+
+from rforge_memory import SparseMemory
+
+
+def test_write_read_round_trip_and_zero_fill():
+    mem = SparseMemory(page_size=64)
+    assert bytes(mem.read(0x1000, 4)) == bytes(4)
+    assert not mem.is_mapped(0x1000)
+    mem.write(0x1004, b"\x01\x02\x03\x04")
+    assert bytes(mem.read(0x1004, 4)) == b"\x01\x02\x03\x04"
+    assert bytes(mem.read(0x1002, 8)) == b"\x00\x00\x01\x02\x03\x04\x00\x00"
+    # The whole page is backed once touched, nothing beyond it.
+    assert mem.is_mapped(0x1000) and mem.is_mapped(0x103F)
+    assert not mem.is_mapped(0x1040)
+    assert mem.read(0x1000, 0) == b""
+    with pytest.raises(ValueError):
+        SparseMemory(page_size=100)
+
+
+def test_access_across_a_page_boundary():
+    mem = SparseMemory(page_size=64)
+    data = bytes(range(16))
+    mem.write(0x38, data)
+    assert bytes(mem.read(0x38, 16)) == data
+    assert mem.is_mapped(0x3F) and mem.is_mapped(0x40)
+    # A read inside one page is a zero-copy view; one across pages is a copy.
+    assert isinstance(mem.read(0x38, 8), memoryview)
+    assert isinstance(mem.read(0x3C, 8), bytes)
+    assert mem.spans() == [(0x00, 0x80)]
+
+
+def test_image_is_copy_on_write_and_overrides_pages(tmp_path):
+    image = tmp_path / "ram.bin"
+    image.write_bytes(bytes(range(32)))
+    mem = SparseMemory(page_size=64)
+    mem.write(0x100, b"\xff" * 48)
+    assert mem.map_image(image, 0x110) == 32
+    assert bytes(mem.read(0x110, 4)) == b"\x00\x01\x02\x03"
+    # Page bytes show either side of the image; the image wins inside it.
+    assert bytes(mem.read(0x10E, 4)) == b"\xff\xff\x00\x01"
+    mem.write(0x112, b"\xaa\xbb")
+    assert bytes(mem.read(0x110, 4)) == b"\x00\x01\xaa\xbb"
+    mem.close()
+    assert image.read_bytes() == bytes(range(32))
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    assert mem.map_image(empty, 0) == 0
+
+
+def test_dump_writes_the_mapped_span_with_holes_as_zeros(tmp_path):
+    image = tmp_path / "ram.bin"
+    image.write_bytes(b"\x11" * 16)
+    mem = SparseMemory(page_size=64)
+    mem.write(0x40, b"\x22\x22")
+    mem.map_image(image, 0x100)
+    out = tmp_path / "out" / "dump.bin"
+    assert mem.dump(out) == (0x40, 0xD0)
+    raw = out.read_bytes()
+    assert raw[:2] == b"\x22\x22"
+    assert raw[2 : 0xC0] == bytes(0xBE)
+    assert raw[0xC0:] == b"\x11" * 16
+    # An explicit window; the dump reads without allocating pages.
+    assert mem.dump(out, 0x1000, 8) == (0x1000, 8)
+    assert out.read_bytes() == bytes(8)
+    assert not mem.is_mapped(0x1000)
+    mem.close()
+    assert SparseMemory().dump(tmp_path / "none.bin") == (0, 0)
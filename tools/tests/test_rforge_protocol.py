@@ -0,0 +1,185 @@
+"""FrameParser framing and resync, the STREAM_DATA payload codecs and JustFloat framing."""
+
+import random
+import struct
+from array import array
+
+import pytest
+
+import uart_mcu_sim
+from rforge_protocol import (
+    CRC_SIZE,
+    HEADER_SIZE,
+    JUSTFLOAT_TAIL,
+    MAX_PAYLOAD,
+    PACKED_STREAM_HEAD,
+    SOF,
+    FrameParser,
+    JustFloatParser,
+    channel_mask,
+    crc16_ccitt,
+    decode_packed_stream,
+    encode_packed_stream,
+    mask_channels,
+    packed_stream_max_ticks,
+)
+from rforge_transport import memory_pair
+
+
+def frame(cmd: int, seq: int, payload: bytes) -> bytes:
+    body = struct.pack("<BBHH", 1, cmd, seq, len(payload)) + payload
+    return SOF + body + struct.pack("<H", crc16_ccitt(body))
+
+
+def parse(parser, data):
+    parser.feed(data)
+    return [(cmd, seq, bytes(payload)) for cmd, seq, payload in parser]
+
+
+def test_frames_split_at_every_byte():
+    frames = [frame(0x20, i, bytes(range(i, i + 3 * i))) for i in range(8)]
+    stream = b"".join(frames)
+    parser = FrameParser()
+    got = []
+    for i in range(len(stream)):
+        got += parse(parser, stream[i : i + 1])
+    assert got == [(0x20, i, bytes(range(i, i + 3 * i))) for i in range(8)]
+    assert parser.dropped_bytes == 0 and len(parser) == 0
+
+
+def test_noise_and_crc_errors_resync_to_next_frame():
+    good = frame(0x02, 7, b"ok")
+    bad = bytearray(frame(0x20, 8, b"corrupt"))
+    bad[-1] ^= 0xFF
+    noise = b"\x00\xaa\x13\xaa"
+    parser = FrameParser()
+    assert parse(parser, noise + bytes(bad) + good) == [(0x02, 7, b"ok")]
+    assert parser.crc_errors == 1
+    assert parser.dropped_bytes == len(noise) + len(bad)
+
+
+def test_fake_header_with_huge_length_is_skipped():
+    fake = SOF + struct.pack("<BBHH", 1, 0x20, 0, MAX_PAYLOAD + 1)
+    good = frame(0x01, 1, b"")
+    parser = FrameParser()
+    assert parse(parser, fake + good) == [(0x01, 1, b"")]
+    assert parser.length_errors == 1
+
+
+def test_fake_header_with_plausible_length_costs_only_its_bytes():
+    # A SOF look-alike claiming 20 bytes waits for them, fails CRC, then the real frames parse.
+    fake = SOF + struct.pack("<BBHH", 1, 0x20, 0, 20)
+    frames = [frame(0x20, i, b"x" * 4) for i in range(5)]
+    parser = FrameParser()
+    got = parse(parser, fake + b"".join(frames))
+    assert [seq for _cmd, seq, _p in got] == list(range(5))
+    assert parser.dropped_bytes == len(fake)
+
+
+def test_trailing_sof_half_is_kept():
+    parser = FrameParser()
+    good = frame(0x01, 3, b"abc")
+    assert parse(parser, b"\x11" * 20 + good[:1]) == []
+    assert len(parser) == 1
+    assert parse(parser, good[1:]) == [(0x01, 3, b"abc")]
+
+
+def test_random_garbage_loses_only_overlapping_frames():
+    rng = random.Random(5)
+    stream = bytearray()
+    for i in range(300):
+        if rng.random() < 0.3:
+            stream += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 40)))
+        stream += frame(0x20, i, bytes(rng.randrange(256) for _ in range(rng.randrange(0, 64))))
+    parser = FrameParser(capacity=256)
+    got = []
+    for i in range(0, len(stream), 97):
+        got += parse(parser, stream[i : i + 97])
+    seqs = [seq for _cmd, seq, _p in got]
+    assert seqs == sorted(seqs)
+    assert len(seqs) >= 290
+
+
+def test_buffer_grows_for_large_feeds_and_views_stay_valid():
+    frames = [frame(0x20, i, bytes([i % 256]) * MAX_PAYLOAD) for i in range(100)]
+    parser = FrameParser(capacity=HEADER_SIZE + CRC_SIZE)
+    parser.feed(b"".join(frames))
+    views = [payload for _cmd, _seq, payload in parser]
+    assert len(views) == 100
+    assert all(bytes(v) == bytes([i % 256]) * MAX_PAYLOAD for i, v in enumerate(views))
+    assert parser.frames == 100
+
+
+@pytest.mark.parametrize("channels", [[0], [0, 1, 2, 3], [1, 9, 31], list(range(64))])
+def test_channel_mask_round_trip(channels):
+    mask = channel_mask(channels)
+    assert len(mask) == max(channels) // 8 + 1
+    assert mask_channels(mask) == channels
+
+
+def test_packed_stream_round_trip_fills_a_frame():
+    channels = [0, 2, 5]
+    mask = channel_mask(channels)
+    ticks = packed_stream_max_ticks(len(channels), len(mask))
+    values = array("f", [t + ch / 8 for t in range(ticks) for ch in channels])
+    payload = encode_packed_stream(123456789, 500, mask, ticks, values)
+    assert len(payload) <= MAX_PAYLOAD
+    assert len(payload) + 4 * len(channels) > MAX_PAYLOAD
+    assert decode_packed_stream(payload) == (123456789, 500, channels, ticks, values)
+
+
+def test_packed_stream_rejects_malformed():
+    mask = channel_mask([0, 1])
+    payload = encode_packed_stream(1, 2, mask, 3, array("f", range(6)))
+    assert decode_packed_stream(payload[:-1]) is None
+    assert decode_packed_stream(payload[: PACKED_STREAM_HEAD.size - 1]) is None
+    # Header claims a mask longer than the payload.
+    assert decode_packed_stream(PACKED_STREAM_HEAD.pack(1, 2, 0, 40)) is None
+
+
+def justfloat_frames(channels: int, ticks: int):
+    """JustFloat frames as the simulator encodes them."""
+    _host, device = memory_pair()
+    args = uart_mcu_sim.parse_args(
+        ["--transport", "memory", "--quiet", "--protocol", "justfloat", "--channels", str(channels)]
+    )
+    sim = uart_mcu_sim.UartMcuSim(args, transport=device)
+    frames = []
+    sim.tx.submit = lambda data, size, lane: frames.append(data)
+    for tick in range(ticks):
+        sim.send_stream_justfloat(tick)
+    return frames
+
+
+def justfloat_parse(parser, data):
+    parser.feed(data)
+    return [list(payload.cast("f")) for payload in parser]
+
+
+def test_justfloat_round_trip_learns_channels():
+    frames = justfloat_frames(5, 20)
+    assert all(len(f) == 5 * 4 + 4 and f.endswith(JUSTFLOAT_TAIL) for f in frames)
+    expected = [list(array("f", f[:-4])) for f in frames]
+    parser = JustFloatParser()
+    out = []
+    # Byte-at-a-time feeds must split the same way as one big feed.
+    for b in b"".join(frames):
+        out += justfloat_parse(parser, bytes((b,)))
+    assert parser.channels == 5
+    # The first frame only anchors the tail spacing.
+    assert out == expected[1:]
+    assert parser.misaligned == 0
+
+
+def test_justfloat_resyncs_after_a_corrupted_tail():
+    frames = justfloat_frames(4, 10)
+    expected = [list(array("f", f[:-4])) for f in frames]
+    parser = JustFloatParser(channels=4)
+    data = bytearray(b"".join(frames))
+    bad = 3 * len(frames[0]) + 4 * 4 + 2
+    data[bad] ^= 0xFF
+    out = justfloat_parse(parser, bytes(data))
+    assert parser.misaligned == 1
+    # Resync skips to the tail after the damaged one: frames 3 and 4 are lost, the rest intact.
+    assert out == expected[:3] + expected[5:]
+    assert parser.dropped_bytes == 2 * len(frames[0]) - 1
@@ -0,0 +1,121 @@
+"""Replay sources and the simulator's replay timing."""
+
+import struct
+import threading
+import time
+from array import array
+
+import pytest
+
+import uart_mcu_sim
+from rforge_capture import CaptureWriter
+from rforge_replay import CMD_STREAM_DATA, CaptureSignal, RawReplay, open_replay
+from rforge_transport import memory_pair
+from uart_e2e_tester import build_frame
+
+FRAME_US = 20_000
+
+
+def raw_capture(path, frames: int = 6, noise: bytes = b""):
+    """Stream frames stamped every ``FRAME_US`` with an ACK after the second one."""
+    out = bytearray()
+    for i in range(frames):
+        out += build_frame(CMD_STREAM_DATA, i, struct.pack("<Q", 5_000_000 + i * FRAME_US) + bytes(8))
+        if i == 1:
+            out += noise + build_frame(0x02, 100, b"\x00\x01\x00\x00")
+    path.write_bytes(bytes(out))
+    return bytes(out)
+
+
+def test_raw_capture_events_and_timing(tmp_path):
+    data = raw_capture(tmp_path / "raw.bin", noise=b"\x13\x37")
+    replay = RawReplay(tmp_path / "raw.bin", 2_000_000)
+    try:
+        assert replay.count == 7 and replay.stream_frames == 6
+        events = [bytes(replay.event(i)) for i in range(replay.count)]
+        assert b"".join(events) == data
+        # The ACK event carries the noise before it and inherits the previous stamp.
+        assert events[2].startswith(b"\x13\x37")
+        assert [replay.t_us(i) for i in range(replay.count)] == [0, 20000, 20000, 40000, 60000, 80000, 100000]
+        assert replay.span_us == 5 * FRAME_US
+    finally:
+        replay.close()
+
+
+def test_untimed_capture_is_spaced_by_line_rate(tmp_path):
+    frame = build_frame(0x02, 1, b"\x00\x01\x00\x00")
+    (tmp_path / "acks.bin").write_bytes(frame * 3 + b"\xaa")
+    replay = open_replay(tmp_path / "acks.bin", 100_000)
+    try:
+        assert isinstance(replay, RawReplay)
+        # 10 KB/s: each 14-byte frame is 1.4 ms; the stray trailing byte is its own event.
+        assert replay.count == 4
+        assert [replay.t_us(i) for i in range(4)] == [1400, 2800, 4200, 4300]
+    finally:
+        replay.close()
+
+
+def test_decoded_capture_replays_through_the_signal_interface(tmp_path):
+    path = tmp_path / "cap.rfcap"
+    with CaptureWriter(path, [0, 1], block_samples=4) as writer:
+        writer.append(1000, 500, [0, 1], 6, array("f", [t + ch / 10 for t in range(6) for ch in (0, 1)]))
+    src = open_replay(path, 2_000_000)
+    try:
+        assert isinstance(src, CaptureSignal)
+        assert src.count == 6 and src.nominal_hz() == pytest.approx(2000.0)
+        # The simulator renders into a float32 view of its frame buffer.
+        buf = bytearray(4 * 3 * 3)
+        src.configure(3, 0)
+        with memoryview(buf).cast("f") as out:
+            src.render(5, 3, out)
+            # Ticks wrap at the end of the capture; the missing third channel reads zero.
+            assert out.tolist() == pytest.approx([5, 5.1, 0, 0, 0.1, 0, 1, 1.1, 0])
+    finally:
+        src.close()
+
+
+def run_replay(path, speed: float, loops: int):
+    """Run the simulator's replay worker; returns ``[(t, bytes)]`` per event sent."""
+    _host, device = memory_pair()
+    args = uart_mcu_sim.parse_args(
+        [
+            "--transport", "memory", "--quiet", "--auto-stream",
+            "--replay", str(path), "--replay-speed", str(speed), "--replay-loops", str(loops),
+        ]
+    )
+    sim = uart_mcu_sim.UartMcuSim(args, transport=device)
+    sent = []
+    sim.tx.submit = lambda data, size, lane: sent.append((time.perf_counter(), data)) or True
+    worker = threading.Thread(target=sim.replay_worker, daemon=True)
+    worker.start()
+    worker.join(5.0)
+    sim.running = False
+    sim.replay.close()
+    assert not worker.is_alive()
+    return sent, sim
+
+
+def test_replay_original_timing(tmp_path):
+    raw_capture(tmp_path / "raw.bin")
+    sent, _ = run_replay(tmp_path / "raw.bin", 1, 1)
+    assert len(sent) == 7
+    # Events keep their recorded spacing: the last one goes out ~100 ms after the first.
+    span = sent[-1][0] - sent[0][0]
+    assert 0.09 <= span < 0.3
+    assert sent[3][0] - sent[1][0] >= 0.015
+
+
+def test_replay_speed_multiplier(tmp_path):
+    raw_capture(tmp_path / "raw.bin")
+    sent, _ = run_replay(tmp_path / "raw.bin", 10, 1)
+    span = sent[-1][0] - sent[0][0]
+    assert 0.009 <= span < 0.05
+
+
+def test_replay_as_fast_as_possible_and_looping(tmp_path):
+    data = raw_capture(tmp_path / "raw.bin")
+    sent, sim = run_replay(tmp_path / "raw.bin", 0, 3)
+    assert sent[-1][0] - sent[0][0] < 0.05
+    # Each loop resends the capture byte for byte.
+    assert b"".join(d for _t, d in sent) == data * 3
+    assert sim.replay_loops == 3 and sim.replay_events == 21
@@ -0,0 +1,52 @@
+"""Waveform tables and block rendering."""
+
+import math
+import time
+from array import array
+
+from rforge_signal import MAX_TABLE_LEN, ChannelWave, SignalEngine, build_table, parse_waveforms
+
+
+def test_tables_are_capped_and_repeat_cleanly():
+    for kind in ("mix", "sine", "square", "chirp", "noise", "step"):
+        for rate in (100.0, 1000.0, 20000.0):
+            table = build_table(ChannelWave(kind, 0.05), 3, rate)
+            assert 2 <= len(table) <= MAX_TABLE_LEN
+
+
+def test_sine_table_is_one_cycle():
+    table = build_table(ChannelWave("sine", 10.0, 2.0, 1.0), 0, 1000.0)
+    assert len(table) == 100
+    assert math.isclose(table[25], 3.0, abs_tol=1e-6)
+    assert math.isclose(table[75], -1.0, abs_tol=1e-6)
+
+
+def test_mix_matches_the_closed_form():
+    rate = 1000.0
+    table = build_table(ChannelWave(), 2, rate)
+    n1 = round(rate / (0.8 + 2 * 0.11))
+    n2 = len(table)
+    assert n2 % n1 == 0
+    for i in (0, 17, n2 // 3, n2 - 1):
+        want = 0.7 * math.sin(2 * math.pi * i / n1) + 0.35 * math.sin(2 * math.pi * i / n2 + 0.4) + 0.06
+        assert math.isclose(table[i], want, abs_tol=1e-5)
+
+
+def test_render_wraps_and_matches_tick_values():
+    engine = SignalEngine(parse_waveforms("sine:100,square:50"))
+    engine.configure(3, 1000.0)
+    ticks = 40
+    out = array("f", bytes(4 * ticks * 3))
+    engine.render(985, ticks, out)
+    for t in range(ticks):
+        assert list(out[t * 3 : t * 3 + 3]) == engine.tick_values(985 + t)
+
+
+def test_configure_is_fast_and_keeps_only_current_rate():
+    engine = SignalEngine(parse_waveforms("mix"))
+    t0 = time.perf_counter()
+    engine.configure(64, 20000.0)
+    assert time.perf_counter() - t0 < 1.5
+    engine.configure(8, 1000.0)
+    assert len(engine._cache) == 8
+    assert all(key[2] == 1000.0 for key in engine._cache)
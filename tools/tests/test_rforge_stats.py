@@ -0,0 +1,93 @@
+"""LogHistogram, SeqGapCounter, StreamStats and LinkHealth."""
+
+import math
+import random
+
+from rforge_stats import LinkHealth, LogHistogram, SeqGapCounter, StreamStats
+
+
+def test_histogram_percentiles_within_one_bucket():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(-7, 1.5) for _ in range(20000)]
+    hist = LogHistogram()
+    for v in values:
+        hist.record(v)
+    ordered = sorted(values)
+    width = 2 ** (1 / 16)
+    for p in (50, 95, 99):
+        exact = ordered[math.ceil(p / 100 * len(ordered)) - 1]
+        assert exact / width <= hist.percentile(p) <= exact * width
+    summary = hist.summary(scale=1e3)
+    assert summary["count"] == len(values)
+    assert math.isclose(summary["max"], max(values) * 1e3)
+    assert math.isclose(summary["mean"], sum(values) / len(values) * 1e3)
+
+
+def test_histogram_merge_and_empty():
+    a, b = LogHistogram(), LogHistogram()
+    assert a.percentile(50) is None and a.summary()["p95"] is None
+    for v in (1e-3, 2e-3):
+        a.record(v)
+    b.record(5e-3)
+    a.merge(b)
+    assert a.count == 3 and a.max == 5e-3 and a.min == 1e-3
+    # Values past the grid land in the last bucket; the exact extreme is still kept.
+    a.record(1e9)
+    assert a.max == 1e9 and a.percentile(100) < 1e9
+
+
+def test_seq_gaps_wrap_and_reorder():
+    seq = SeqGapCounter()
+    for s in (65533, 65534, 1, 2, 5):
+        seq.note(s)
+    # 65535 and 0 are missing across the wrap, then 3 and 4.
+    assert seq.lost == 4
+    assert seq.runs.count == 2
+    assert seq.note(3) == 0
+    assert seq.reordered == 1 and seq.last == 5
+
+
+def test_stream_stats_skip_keeps_shared_seq_space_lossless():
+    stats = StreamStats()
+    t = 0.0
+    seq = 0
+    for i in range(100):
+        stats.record(seq, t, int(t * 1e6), 1000.0)
+        seq += 1
+        t += 1e-3
+        if i % 10 == 0:
+            # An ACK takes the next seq between two stream frames.
+            stats.skip(seq)
+            seq += 1
+    summary = stats.summary()
+    assert summary["lost"] == 0 and summary["loss_ratio"] == 0.0
+    assert summary["frames"] == 100 and summary["other_frames"] == 10
+    # Gaps across a skipped frame are still measured: all 99 of them.
+    assert summary["host_gap_ms"]["count"] == 99
+    assert summary["host_jitter_ms"]["max"] < 1e-6
+
+
+def test_stream_stats_loss_breaks_gap_run():
+    stats = StreamStats()
+    stats.record(0, 0.0, 0, 1000.0)
+    stats.skip(2)
+    stats.record(3, 0.003, 3000, 1000.0)
+    summary = stats.summary()
+    assert summary["lost"] == 1
+    assert summary["host_gap_ms"]["count"] == 0
+
+
+def test_link_health_resync_and_goodput():
+    health = LinkHealth()
+    health.read(100)
+    health.frame(0.0, 100, 0)
+    health.end_read(0.0, 0)
+    health.read(60)
+    health.end_read(1.0, 50)
+    health.read(40)
+    health.frame(1.5, 10, 50)
+    summary = health.summary()
+    assert summary["resyncs"] == 1
+    assert summary["goodput"] == round(110 / 200, 4)
+    assert math.isclose(summary["resync_ms"]["max"], 500.0)
+    assert summary["resync_bytes"]["max"] == 50
@@ -0,0 +1,203 @@
+"""TxWriter and PacedTransport behaviour over in-memory pipes."""
+
+import threading
+import time
+
+import pytest
+
+from rforge_transport import (
+    LANE_CONTROL,
+    WRITE_TIMEOUT,
+    PacedTransport,
+    Transport,
+    TransportTimeout,
+    TxWriter,
+    line_time,
+    memory_pair,
+    serial_write_budget,
+)
+
+
+def drain(transport, want: int, timeout: float = 2.0) -> bytes:
+    out = bytearray()
+    deadline = time.perf_counter() + timeout
+    while len(out) < want and time.perf_counter() < deadline:
+        out += transport.read(4096)
+    return bytes(out)
+
+
+def test_finalize_error_drops_only_that_item(capsys):
+    host, device = memory_pair()
+
+    def finalize(item):
+        if item == b"bad":
+            raise ValueError("boom")
+        return item
+
+    writer = TxWriter(device, finalize=finalize)
+    writer.start()
+    try:
+        for item in (b"one", b"bad", b"two", b"bad", b"three"):
+            writer.submit(item, len(item))
+        assert drain(host, 11) == b"onetwothree"
+    finally:
+        writer.stop()
+    snap = writer.snapshot()
+    assert snap["finalize_errors"] == 2
+    assert snap["frames_lost"] == 2
+    assert snap["frames_out"] == 3
+    assert "boom" in snap["finalize_error"]
+    # Logged once, not per failure.
+    assert capsys.readouterr().err.count("finalize failed") == 1
+
+
+def test_control_lane_goes_first():
+    host, device = memory_pair()
+    writer = TxWriter(device)
+    writer.submit(b"s1", 2)
+    writer.submit(b"c1", 2, LANE_CONTROL)
+    writer.start()
+    try:
+        assert drain(host, 4) == b"c1s1"
+    finally:
+        writer.stop()
+
+
+def test_full_control_lane_waits_for_the_writer():
+    host, device = memory_pair()
+    writer = TxWriter(device, control_items=1, block_timeout=0.0)
+    writer._running = True
+    assert writer.submit(b"a", 1, LANE_CONTROL)
+    # No writer thread drains yet: the second reply must wait, not time out.
+    threading.Timer(0.2, writer.start).start()
+    t0 = time.perf_counter()
+    assert writer.submit(b"b", 1, LANE_CONTROL)
+    assert time.perf_counter() - t0 >= 0.15
+    try:
+        assert drain(host, 2) == b"ab"
+    finally:
+        writer.stop()
+    assert writer.block_timeouts == 0 and writer.control_drops == 0
+
+
+def test_stopped_writer_rejects_control_items():
+    _, device = memory_pair()
+    writer = TxWriter(device, control_items=1)
+    assert writer.submit(b"a", 1, LANE_CONTROL)
+    assert not writer.submit(b"b", 1, LANE_CONTROL)
+    assert writer.snapshot()["control_drops"] == 1
+
+
+class GatedTransport:
+    """Records each write; the first one blocks until ``gate`` is set."""
+
+    def __init__(self):
+        self.writes = []
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+
+    def write(self, data):
+        self.entered.set()
+        self.gate.wait(2.0)
+        self.writes.append(bytes(data))
+        return len(data)
+
+
+def test_stream_batch_lets_a_reply_in_between_chunks():
+    line = GatedTransport()
+    writer = TxWriter(line, max_batch=64, stream_batch=4)
+    for item in (b"s1", b"s2", b"s3", b"s4"):
+        writer.submit(item, 2)
+    writer.start()
+    try:
+        assert line.entered.wait(2.0)
+        # The first chunk is on the wire; the reply goes ahead of the rest.
+        writer.submit(b"c1", 2, LANE_CONTROL)
+        line.gate.set()
+        deadline = time.perf_counter() + 2.0
+        while sum(map(len, line.writes)) < 10 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    finally:
+        writer.stop()
+    assert line.writes[0] == b"s1s2"
+    assert line.writes[1].startswith(b"c1")
+    assert b"".join(line.writes) == b"s1s2c1s3s4"
+    assert writer.snapshot()["stream_batch"] == 4
+
+
+def test_serial_batch_fits_the_write_timeout():
+    # 921600 baud: 16 KB would take ~178 ms; the batch is cut to half the timeout instead.
+    batch, timeout = serial_write_budget(921600, 16384, 1034)
+    assert batch == 2304 and timeout == WRITE_TIMEOUT
+    assert line_time(921600, batch) <= timeout / 2
+    # 115200 baud: one whole frame is longer than the default timeout, so the timeout grows.
+    batch, timeout = serial_write_budget(115200, 16384, 1034)
+    assert batch == 1034
+    assert timeout >= 2 * line_time(115200, 1034) > WRITE_TIMEOUT
+    # A smaller configured batch is kept as is.
+    assert serial_write_budget(2000000, 512, 1034)[0] == 512
+
+
+def test_paced_line_runs_at_line_rate():
+    host, device = memory_pair()
+    # 100 kbaud 8N1 = 10 KB/s: 2000 bytes take 200 ms on the wire.
+    line = PacedTransport(device, 100_000, fifo_bytes=4096)
+    try:
+        t0 = time.perf_counter()
+        assert line.write(bytes(2000)) == 2000
+        assert time.perf_counter() - t0 < 0.05
+        assert len(drain(host, 2000)) == 2000
+        elapsed = time.perf_counter() - t0
+        assert 0.18 <= elapsed < 0.5
+        snap = line.snapshot()
+        assert snap["bytes_out"] == 2000 and snap["stalls"] == 0
+        assert line.wait_below(0, 0.1)
+    finally:
+        line.close()
+
+
+def test_full_fifo_stalls_the_writer_until_room_frees():
+    host, device = memory_pair()
+    line = PacedTransport(device, 100_000, fifo_bytes=500)
+    try:
+        t0 = time.perf_counter()
+        # Twice the FIFO: the second half waits ~50 ms for the line to drain.
+        assert line.write(bytes(1000)) == 1000
+        assert time.perf_counter() - t0 >= 0.04
+        assert len(drain(host, 1000)) == 1000
+        snap = line.snapshot()
+        assert snap["stalls"] == 1 and snap["overflows"] == 0
+        assert snap["max_fill"] <= 500
+    finally:
+        line.close()
+
+
+class StuckTransport(Transport):
+    """A far end that accepts nothing until ``release`` is set."""
+
+    name = "stuck"
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def write(self, data) -> int:
+        self.release.wait(2.0)
+        return len(data)
+
+
+def test_fifo_overflow_times_out():
+    inner = StuckTransport()
+    line = PacedTransport(inner, 100_000, fifo_bytes=100, write_timeout=0.05)
+    try:
+        assert line.write(bytes(100)) == 100
+        t0 = time.perf_counter()
+        with pytest.raises(TransportTimeout):
+            line.write(bytes(50))
+        assert time.perf_counter() - t0 >= 0.04
+        snap = line.snapshot()
+        assert snap["stalls"] == 1
+        assert snap["overflows"] == 1 and snap["overflow_bytes"] == 50
+        assert not line.wait_below(0, 0.01)
+    finally:
+        inner.release.set()
+        line.close()
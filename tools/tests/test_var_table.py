@@ -0,0 +1,69 @@
+"""Paged var table encoding (simulator) against the tester's decoder, and the table hash."""
+
+from rforge_codec import DataType
+from rforge_protocol import MAX_PAYLOAD
+from uart_e2e_tester import decode_var_table, decode_var_table_page
+from uart_mcu_sim import (
+    Variable,
+    encode_var_desc,
+    encode_var_table_binary,
+    encode_var_table_pages,
+    var_table_hash,
+)
+
+
+def make_vars(count: int):
+    return [
+        Variable(f"g_var_{i:04d}_with_a_long_name", 0x20000000 + 4 * i, DataType(i % 8), 1.0, "unit", 0.0, 8)
+        for i in range(count)
+    ]
+
+
+def test_pages_cover_the_table_in_order():
+    vars_ = make_vars(200)
+    entries = [encode_var_desc(v) for v in vars_]
+    table_hash = var_table_hash(entries)
+    pages = encode_var_table_pages(entries, table_hash, 0, 0xFFFF)
+    assert len(pages) > 1
+    got = []
+    for payload in pages:
+        assert len(payload) <= MAX_PAYLOAD
+        page_hash, total, offset, items = decode_var_table_page(payload)
+        assert (page_hash, total, offset) == (table_hash, len(vars_), len(got))
+        got.extend(items)
+    assert [item["name"] for item in got] == [v.name for v in vars_]
+    assert [item["address"] for item in got] == [f"0x{v.address:08X}" for v in vars_]
+    assert [int(item["type"]) for item in got] == [int(v.dtype) for v in vars_]
+    assert [item["array_size"] for item in got] == [v.array_size for v in vars_]
+
+
+def test_page_window_and_past_the_end():
+    entries = [encode_var_desc(v) for v in make_vars(30)]
+    pages = encode_var_table_pages(entries, 1, 10, 5)
+    assert len(pages) == 1
+    _hash, total, offset, items = decode_var_table_page(pages[0])
+    assert (total, offset, len(items)) == (30, 10, 5)
+    # Asking past the end answers with one empty page rather than nothing.
+    _hash, total, offset, items = decode_var_table_page(encode_var_table_pages(entries, 1, 99, 5)[0])
+    assert (total, offset, items) == (30, 30, [])
+
+
+def test_hash_tracks_content_and_order():
+    entries = [encode_var_desc(v) for v in make_vars(5)]
+    h = var_table_hash(entries)
+    assert h == var_table_hash(list(entries))
+    assert h != var_table_hash(entries[::-1])
+    assert h != var_table_hash(entries[:-1])
+    changed = make_vars(5)
+    changed[2].address += 4
+    assert h != var_table_hash([encode_var_desc(v) for v in changed])
+
+
+def test_legacy_single_frame_table_truncates():
+    vars_ = make_vars(200)
+    payload = encode_var_table_binary(vars_)
+    assert len(payload) <= MAX_PAYLOAD
+    items, fmt = decode_var_table(payload)
+    assert fmt == "binary"
+    assert 0 < len(items) < len(vars_)
+    assert items[0]["name"] == vars_[0].name
@@ -0,0 +1,99 @@
+"""Watch-list and sparse STREAM_DATA codecs, and the simulator's watch scheduling."""
+
+import struct
+import threading
+
+import pytest
+
+import uart_mcu_sim
+from rforge_protocol import (
+    PACKED_STREAM_HEAD,
+    WATCH_CHANNEL_BASE,
+    WATCH_ITEM,
+    WATCH_MAX_ITEMS,
+    decode_packed_stream,
+    decode_sparse_stream,
+    decode_watch_list,
+    encode_sparse_stream,
+    encode_watch_list,
+    is_sparse_stream,
+)
+from rforge_transport import memory_pair
+
+
+def test_watch_list_round_trip_and_limits():
+    items = [(0x20001000, 1, 0.0), (0x20001004, 4, 0.5)]
+    assert decode_watch_list(encode_watch_list(items)) == items
+    assert decode_watch_list(encode_watch_list([])) == []
+    assert decode_watch_list(b"") is None
+    assert decode_watch_list(encode_watch_list(items)[:-1]) is None
+    too_many = bytes((WATCH_MAX_ITEMS + 1,)) + WATCH_ITEM.pack(0, 1, 0.0) * (WATCH_MAX_ITEMS + 1)
+    assert decode_watch_list(too_many) is None
+
+
+def test_sparse_stream_round_trip():
+    pairs = [(WATCH_CHANNEL_BASE, 1.5), (WATCH_CHANNEL_BASE + 3, -2.0)]
+    payload = encode_sparse_stream(987654, pairs)
+    assert is_sparse_stream(payload)
+    assert decode_sparse_stream(payload) == (987654, pairs)
+    # Packed decoders must not mistake it for a dense frame.
+    assert decode_packed_stream(payload) is None
+    assert decode_sparse_stream(payload[:-1]) is None
+    dense = PACKED_STREAM_HEAD.pack(1, 1, 1, 1) + b"\x01" + struct.pack("<f", 1.0)
+    assert not is_sparse_stream(dense) and decode_sparse_stream(dense) is None
+
+
+@pytest.fixture
+def sim():
+    _host, device = memory_pair()
+    sim = uart_mcu_sim.UartMcuSim(uart_mcu_sim.parse_args(["--transport", "memory", "--quiet"]), transport=device)
+    sent = []
+    sim.send_rforge = lambda cmd, payload: sent.append((cmd, bytes(payload)))
+    sim.sent = sent
+    return sim
+
+
+def test_build_watch_validates_entries(sim):
+    speed = sim.vars[0].address
+    adc = next(v for v in sim.vars if v.array_size > 1)
+    ok = sim.build_watch(encode_watch_list([(speed, 1, 0.0), (adc.address + 2, 2, 0.0)]))
+    assert [(w.address, w.divisor) for w in ok] == [(speed, 1), (adc.address + 2, 2)]
+    assert sim.build_watch(encode_watch_list([(speed, 0, 0.0)])) is None
+    assert sim.build_watch(encode_watch_list([(0x10, 1, 0.0)])) is None
+    # The last element of an array is fine, one past it is not.
+    assert sim.build_watch(encode_watch_list([(adc.address + adc.size - 2, 1, 0.0)])) is not None
+    assert sim.build_watch(encode_watch_list([(adc.address + adc.size - 1, 1, 0.0)])) is None
+
+
+def test_send_watch_divisors_and_deadband(sim):
+    a, b, c = (v.address for v in sim.vars[:3])
+    sim.watch = sim.build_watch(encode_watch_list([(a, 1, 0.0), (b, 4, 0.0), (c, 1, 1e30)]))
+    for tick in range(8):
+        sim.send_watch(tick, 0.0)
+    counts = {}
+    for _cmd, payload in sim.sent:
+        _ts, pairs = decode_sparse_stream(payload)
+        for ch, _value in pairs:
+            counts[ch - WATCH_CHANNEL_BASE] = counts.get(ch - WATCH_CHANNEL_BASE, 0) + 1
+    assert counts == {0: 8, 1: 2, 2: 1}
+    assert sim.watch_suppressed == 7
+
+
+def test_host_write_is_not_lost_to_a_concurrent_refresh(sim):
+    v = sim.vars[0]
+    size = uart_mcu_sim.dtype_size(v.dtype)
+    written = b"\x5a" * size
+    gen = sim.var_gens[v.address]
+    writer = threading.Thread(target=sim.write_mem, args=(v.address, written))
+
+    def racing_gen(t):
+        # WRITE_MEM arrives on the RX thread while the watch refresh is mid-update.
+        writer.start()
+        writer.join(0.1)
+        return gen(t)
+
+    sim.var_gens[v.address] = racing_gen
+    sim.refresh_vars(v.address, size)
+    writer.join(2.0)
+    assert sim.mem.read(v.address, size) == written
+    assert v.address not in sim.var_gens
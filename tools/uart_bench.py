@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+RenesasForge UART end-to-end benchmark runner.
+
+Runs the benchmarks.md test matrix (.agents/skills/rx-uart-mvp/references/benchmarks.md)
+against an in-process UartMcuSim over a local link and reports:
+- sustained stream payload throughput
+- command RTT percentiles
+- stream frame-gap and jitter percentiles (host arrival and MCU timestamp)
+- dropped frames (sequence gaps plus frames the simulator's TX queue dropped before they got a
+  seq) and simulator write stalls
+with pass/fail against the targets and an optional comparison to a stored baseline.
+RTTs, gaps and losses are kept in the same ``rforge_stats`` histograms and counters as the
+e2e tester, so both tools report the same numbers for the same link.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shlex
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import uart_mcu_sim
+from rforge_protocol import PACKED_STREAM_HEAD, STREAM_FLAG_PACKED, FrameParser
+from rforge_stats import LogHistogram, StreamStats
+from rforge_transport import PtyPeerTransport, PtyTransport, TcpTransport, Transport, memory_pair
+from uart_e2e_tester import build_frame, decode_stream, parse_ack, readmem_part_is_last
+
+CMD_PING = 0x01
+CMD_ACK = 0x02
+CMD_STREAM_START = 0x03
+CMD_STREAM_STOP = 0x04
+CMD_SET_STREAM_CONFIG = 0x05
+CMD_READ_MEM_BATCH = 0x11
+CMD_STREAM_DATA = 0x20
+
+# Targets from benchmarks.md.
+TARGET_THROUGHPUT_KBPS = 180.0
+TARGET_RTT_MS = 10.0
+TARGET_GAP_FACTOR = 2.0
+# Packed frames exist to carry fewer bytes per sample, so --packed runs are judged on delivering
+# the offered sample rate rather than on the per-tick payload target.
+TARGET_PACKED_DELIVERY = 0.98
+# TxWriter counters for frames rejected before they were numbered, so seq gaps cannot show them.
+TX_DROP_KEYS = ("dropped_oldest", "dropped_newest", "block_timeouts", "control_drops")
+
+
+@dataclass
+class Scenario:
+    name: str
+    channels: int
+    stream_hz: int
+    probe_cmd: int
+    probe_hz: float
+
+
+SCENARIOS = {
+    "4ch_10khz": Scenario("4ch_10khz", 4, 10000, CMD_PING, 5.0),
+    "16ch_2khz": Scenario("16ch_2khz", 16, 2000, CMD_PING, 5.0),
+    "mixed_readmem": Scenario("mixed_readmem", 16, 2000, CMD_READ_MEM_BATCH, 20.0),
+}
+
+
+def open_bench_link(kind: str, timeout: float = 0.005) -> Tuple[Transport, Transport]:
+    """Return ``(host, device)`` ends of a local link for one in-process run."""
+    if kind == "memory":
+        return memory_pair(timeout=timeout, write_timeout=0.05)
+    if kind == "pty":
+        device = PtyTransport(None, timeout, 0.05)
+        return PtyPeerTransport(device.peer_path, timeout, None), device
+    if kind == "tcp":
+        device = TcpTransport("127.0.0.1:0", True, timeout, 0.05)
+        return TcpTransport(f"127.0.0.1:{device.port}", False, timeout, None), device
+    raise ValueError(f"unsupported bench link: {kind}")
+
+
+class HostConsumer:
+    """Background reader that parses frames and records stream/command timing.
+
+    Every frame's seq goes to ``stream``: STREAM_DATA as a stream frame, everything else
+    (ACKs, READ_MEM_BATCH replies) via ``skip``, since the simulator numbers them all from one
+    counter.
+    """
+
+    def __init__(self, link: Transport, packed: bool, tick_us: float):
+        self.link = link
+        self.packed = packed
+        self.tick_us = tick_us
+        self.parser = FrameParser()
+        self.running = True
+        self.lock = threading.Lock()
+        self.recording = False
+        self.pending: Dict[int, float] = {}
+        self.pending_readmem: deque = deque()
+        self.rtt = LogHistogram(1e-7, 100.0)
+        self.busy_replies = 0
+        self.timeouts = 0
+        self.stream_frames = 0
+        self.stream_payload_bytes = 0
+        self.stream_samples = 0
+        self.stream_ticks = 0
+        self.stream = StreamStats()
+        self.t_first: Optional[float] = None
+        self.t_last: Optional[float] = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join(timeout=1.0)
+
+    def begin_recording(self):
+        with self.lock:
+            self.recording = True
+            self.stream = StreamStats()
+
+    def end_recording(self):
+        with self.lock:
+            self.recording = False
+
+    def note_sent(self, cmd: int, seq: int):
+        now = time.perf_counter()
+        with self.lock:
+            if cmd == CMD_READ_MEM_BATCH:
+                self.pending_readmem.append((seq, now))
+            else:
+                self.pending[seq] = now
+
+    def expire(self, max_age_s: float):
+        cutoff = time.perf_counter() - max_age_s
+        with self.lock:
+            stale = [s for s, t in self.pending.items() if t < cutoff]
+            for s in stale:
+                del self.pending[s]
+            while self.pending_readmem and self.pending_readmem[0][1] < cutoff:
+                self.pending_readmem.popleft()
+                stale.append(-1)
+            self.timeouts += len(stale)
+
+    def _run(self):
+        while self.running:
+            data = self.link.read(65536)
+            if not data:
+                continue
+            self.parser.feed(data)
+            now = time.perf_counter()
+            with self.lock:
+                for cmd, seq, payload in self.parser:
+                    self._on_frame(now, cmd, seq, payload)
+
+    def _on_frame(self, now: float, cmd: int, seq: int, payload):
+        if cmd == CMD_STREAM_DATA:
+            decoded = decode_stream(payload, self.packed) if self.recording else None
+            if decoded is None:
+                if self.recording:
+                    self.stream.skip(seq)
+                return
+            ticks = decoded[0]
+            if self.packed:
+                ts_us, period_us = PACKED_STREAM_HEAD.unpack_from(payload, 0)[:2]
+            else:
+                ts_us, period_us = struct.unpack_from("<Q", payload, 0)[0], 0
+            self.stream.record(seq, now, ts_us, ticks * period_us if period_us else self.tick_us)
+            if self.t_first is None:
+                self.t_first = now
+            self.t_last = now
+            self.stream_frames += 1
+            self.stream_payload_bytes += len(payload)
+            self.stream_ticks += ticks
+            self.stream_samples += ticks * decoded[1]
+            return
+        if self.recording:
+            # Replies take their seq from the same simulator counter as stream frames.
+            self.stream.skip(seq)
+        if cmd == CMD_ACK:
+            ack = parse_ack(bytes(payload))
+            if ack is None:
+                return
+            busy = ack["status"] == 3
+            if busy:
+                self.busy_replies += 1
+            if ack["for_cmd"] == CMD_READ_MEM_BATCH:
+                # A read only gets an ACK when it is refused; retire it without an RTT sample.
+                for i, (pending_seq, _sent) in enumerate(self.pending_readmem):
+                    if pending_seq == ack["for_seq"]:
+                        del self.pending_readmem[i]
+                        break
+                return
+            sent = self.pending.pop(ack["for_seq"], None)
+            if sent is not None and not busy:
+                self.rtt.record(now - sent)
+        elif cmd == CMD_READ_MEM_BATCH:
+            # Responses carry no for_seq; the simulator answers in order. Multi-frame replies
+            # complete on their last part.
+            if self.pending_readmem and readmem_part_is_last(bytes(payload)):
+                self.rtt.record(now - self.pending_readmem.popleft()[1])
+
+
+def run_scenario(sc: Scenario, args: argparse.Namespace) -> Dict[str, object]:
+    host, device = open_bench_link(args.link)
+    sim_args = uart_mcu_sim.parse_args(
+        [
+            "--transport", args.link,
+            "--baud", str(args.baud),
+            "--channels", str(sc.channels),
+            "--stream-hz", str(sc.stream_hz),
+            "--readmem-format", "binary",
+            "--quiet",
+            *shlex.split(args.sim_args),
+        ]
+    )
+    sim = uart_mcu_sim.UartMcuSim(sim_args, transport=device)
+    sim_thread = threading.Thread(target=sim.run, daemon=True)
+    sim_thread.start()
+    consumer = HostConsumer(host, args.packed, 1e6 / sc.stream_hz)
+    consumer.start()
+
+    seq = 1
+
+    def send(cmd: int, payload: bytes = b""):
+        nonlocal seq
+        consumer.note_sent(cmd, seq)
+        host.write(build_frame(cmd, seq, payload))
+        seq = (seq + 1) & 0xFFFF
+
+    readmem_payload = b"".join(struct.pack("<IH", v.address, 4) for v in sim.vars[:8])
+    probe_payload = readmem_payload if sc.probe_cmd == CMD_READ_MEM_BATCH else b""
+
+    flags = STREAM_FLAG_PACKED if args.packed else 0
+    send(CMD_SET_STREAM_CONFIG, struct.pack("<BBHH", sc.channels, 0, sc.stream_hz, flags))
+    send(CMD_STREAM_START)
+    time.sleep(args.warmup)
+    wto_start = sim.write_timeout_count
+    tx_start = sim.tx.snapshot()
+    consumer.begin_recording()
+    t_start = time.perf_counter()
+    t_end = t_start + args.duration
+    probe_period = 1.0 / sc.probe_hz
+    next_probe = t_start
+    while True:
+        now = time.perf_counter()
+        if now >= t_end:
+            break
+        if now >= next_probe:
+            send(sc.probe_cmd, probe_payload)
+            next_probe += probe_period
+            consumer.expire(args.rtt_timeout)
+        time.sleep(min(0.002, max(0.0, next_probe - now)))
+    consumer.end_recording()
+    elapsed = time.perf_counter() - t_start
+    tx_end = sim.tx.snapshot()
+    tx_drops = {k: tx_end[k] - tx_start[k] for k in TX_DROP_KEYS}
+    send(CMD_STREAM_STOP)
+    time.sleep(0.1)
+    consumer.expire(0.0)
+    consumer.stop()
+    sim.running = False
+    sim_thread.join(timeout=1.0)
+    host.close()
+
+    with consumer.lock:
+        span = (consumer.t_last - consumer.t_first) if consumer.t_first and consumer.t_last else elapsed
+        throughput_kbps = consumer.stream_payload_bytes / max(elapsed, 1e-9) / 1000.0
+        sample_kbps = consumer.stream_samples * 4 / max(elapsed, 1e-9) / 1000.0
+        offered_sample_kbps = sc.channels * sc.stream_hz * 4 / 1000.0
+        ticks_per_frame = consumer.stream_ticks / consumer.stream_frames if consumer.stream_frames else 1.0
+        # Nominal gap between frames; packed frames carry several ticks each.
+        period_ms = 1000.0 / sc.stream_hz * ticks_per_frame
+        rtt = consumer.rtt.summary(scale=1e3)
+        stream = consumer.stream.summary()
+        host_gap = stream["host_gap_ms"]
+        seq_lost = consumer.stream.seq.lost
+        tx_dropped = sum(tx_drops.values())
+        write_stalls = sim.write_timeout_count - wto_start
+        metrics = {
+            "elapsed_s": elapsed,
+            "stream_span_s": span,
+            "stream_frames": consumer.stream_frames,
+            "stream_ticks": consumer.stream_ticks,
+            "stream_samples": consumer.stream_samples,
+            "ticks_per_frame": ticks_per_frame,
+            "expected_ticks": int(sc.stream_hz * elapsed),
+            "achieved_hz": consumer.stream_ticks / max(elapsed, 1e-9),
+            "payload_kbps": throughput_kbps,
+            "sample_kbps": sample_kbps,
+            "offered_sample_kbps": offered_sample_kbps,
+            "rtt_ms": rtt,
+            "rtt_count": consumer.rtt.count,
+            "rtt_timeouts": consumer.timeouts,
+            "busy_replies": consumer.busy_replies,
+            "host_gap_ms": host_gap,
+            "mcu_gap_ms": stream["mcu_gap_ms"],
+            "host_jitter_ms": stream["host_jitter_ms"],
+            "dropped_frames": seq_lost + tx_dropped,
+            "seq_lost": seq_lost,
+            "tx_dropped": tx_dropped,
+            "tx_drops": tx_drops,
+            "stream_stats": stream,
+            "parser_crc_errors": consumer.parser.crc_errors,
+            "sim_write_stalls": write_stalls,
+            "sim_tx": tx_end,
+        }
+
+    if args.packed:
+        throughput = {
+            "value": sample_kbps,
+            "target": f">= {TARGET_PACKED_DELIVERY:.0%} of {offered_sample_kbps:.1f} KB/s offered samples",
+            "ok": sample_kbps >= TARGET_PACKED_DELIVERY * offered_sample_kbps,
+        }
+    else:
+        throughput = {
+            "value": throughput_kbps,
+            "target": f">= {TARGET_THROUGHPUT_KBPS} KB/s",
+            "ok": throughput_kbps >= TARGET_THROUGHPUT_KBPS,
+        }
+    checks = {
+        "throughput": throughput,
+        "rtt_p95": {
+            "value": rtt["p95"],
+            "target": f"< {TARGET_RTT_MS} ms",
+            "ok": rtt["p95"] is not None and rtt["p95"] < TARGET_RTT_MS and consumer.timeouts == 0,
+        },
+        "gap_p95": {
+            "value": host_gap["p95"],
+            "target": f"<= {TARGET_GAP_FACTOR}x {period_ms:.3f} ms",
+            "ok": host_gap["p95"] is not None and host_gap["p95"] <= TARGET_GAP_FACTOR * period_ms,
+        },
+        "loss": {
+            "value": seq_lost + tx_dropped + write_stalls,
+            "target": "0 dropped frames and write stalls",
+            "ok": seq_lost + tx_dropped + write_stalls == 0,
+        },
+    }
+    return {
+        "name": sc.name,
+        "channels": sc.channels,
+        "stream_hz": sc.stream_hz,
+        "probe": "READ_MEM_BATCH" if sc.probe_cmd == CMD_READ_MEM_BATCH else "PING",
+        "probe_hz": sc.probe_hz,
+        "metrics": metrics,
+        "checks": checks,
+        "ok": all(c["ok"] for c in checks.values()),
+    }
+
+
+# Metric paths compared against the baseline and whether larger is better.
+BASELINE_METRICS = (
+    (("payload_kbps",), True),
+    (("achieved_hz",), True),
+    (("rtt_ms", "p95"), False),
+    (("host_gap_ms", "p95"), False),
+    (("dropped_frames",), False),
+)
+
+
+def compare_baseline(report: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> Dict[str, object]:
+    base_by_name = {s["name"]: s for s in baseline.get("scenarios", [])}
+    out: Dict[str, object] = {"tolerance": tolerance, "scenarios": {}, "regressions": 0}
+    for sc in report["scenarios"]:
+        base = base_by_name.get(sc["name"])
+        if base is None:
+            continue
+        rows = {}
+        for path, higher_is_better in BASELINE_METRICS:
+            cur, old = sc["metrics"], base["metrics"]
+            for key in path:
+                cur = cur.get(key) if isinstance(cur, dict) else None
+                old = old.get(key) if isinstance(old, dict) else None
+            if cur is None or old is None:
+                continue
+            delta = (cur - old) / old if old else (0.0 if cur == old else float("inf"))
+            worse = -delta if higher_is_better else delta
+            regressed = worse > tolerance and abs(cur - old) > 1e-9
+            rows[".".join(path)] = {"current": cur, "baseline": old, "delta": delta, "regressed": regressed}
+            out["regressions"] += int(regressed)
+        out["scenarios"][sc["name"]] = rows
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="RenesasForge UART benchmark matrix")
+    ap.add_argument("--link", choices=["memory", "pty", "tcp"], default="memory", help="local link to the in-process simulator")
+    ap.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="scenario to run (repeatable, default all)")
+    ap.add_argument("--baud", type=int, default=2_000_000)
+    ap.add_argument("--duration", type=float, default=5.0, help="measurement window per scenario in seconds")
+    ap.add_argument("--warmup", type=float, default=0.5, help="seconds of streaming before measurement starts")
+    ap.add_argument("--rtt-timeout", type=float, default=0.5, help="seconds before an unanswered probe counts as timeout")
+    ap.add_argument("--packed", action="store_true", help="negotiate packed multi-sample STREAM_DATA frames")
+    ap.add_argument("--sim-args", default="", help="extra simulator options")
+    ap.add_argument("--out", default="build/bench_report.json")
+    ap.add_argument("--baseline", help="baseline report to compare against")
+    ap.add_argument("--save-baseline", help="write this run as a baseline report")
+    ap.add_argument("--regress-tol", type=float, default=0.10, help="relative change counted as regression")
+    args = ap.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    report: Dict[str, object] = {
+        "link": args.link,
+        "stream_mode": "packed" if args.packed else "per_tick",
+        "baud": args.baud,
+        "duration": args.duration,
+        "targets": {
+            "payload_kbps": TARGET_THROUGHPUT_KBPS,
+            "packed_delivery": TARGET_PACKED_DELIVERY,
+            "rtt_ms": TARGET_RTT_MS,
+            "gap_factor": TARGET_GAP_FACTOR,
+        },
+        "scenarios": [],
+    }
+    for name in names:
+        result = run_scenario(SCENARIOS[name], args)
+        report["scenarios"].append(result)
+        m = result["metrics"]
+        print(
+            f"[BENCH] {name:<14} {'PASS' if result['ok'] else 'FAIL'}  "
+            f"payload={m['payload_kbps']:8.1f} KB/s  samples={m['sample_kbps']:8.1f} KB/s  hz={m['achieved_hz']:8.1f}/{result['stream_hz']}  "
+            f"rtt_p95={m['rtt_ms']['p95'] or 0:6.2f} ms  gap_p95={m['host_gap_ms']['p95'] or 0:6.3f} ms  "
+            f"dropped={m['dropped_frames']} (seq={m['seq_lost']} tx={m['tx_dropped']})  stalls={m['sim_write_stalls']}  "
+            f"busy={m['busy_replies']}"
+        )
+    report["ok"] = all(s["ok"] for s in report["scenarios"])
+
+    if args.baseline and Path(args.baseline).exists():
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        report["baseline"] = compare_baseline(report, baseline, args.regress_tol)
+        print(f"[BENCH] baseline={args.baseline} regressions={report['baseline']['regressions']}")
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        base_path = Path(args.save_baseline)
+        base_path.parent.mkdir(parents=True, exist_ok=True)
+        base_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0 if report["ok"] else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
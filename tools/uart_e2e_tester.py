@@ -3,75 +3,213 @@ from __future__ import annotations
 
 import argparse
 import json
+import shlex
 import struct
+import threading
 import time
+from array import array
+from collections import deque
+from contextlib import nullcontext
 from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional, Sequence
 
-import serial
+from rforge_protocol import (
+    CRC16_INIT,
+    CRC_SIZE,
+    HEADER_SIZE,
+    MAX_PAYLOAD,
+    READMEM_FLAG_LAST,
+    PACKED_STREAM_HEAD,
+    READMEM_TRAILER,
+    STREAM_FLAG_PACKED,
+    VAR_TABLE_INFO,
+    VAR_TABLE_PAGE_HEAD,
+    VAR_TABLE_PAGE_REQ,
+    WATCH_CHANNEL_BASE,
+    FrameParser,
+    JustFloatParser,
+    crc16_update,
+    decode_packed_stream,
+    decode_sparse_stream,
+    encode_watch_list,
+    is_sparse_stream,
+)
+from rforge_capture import DEFAULT_BLOCK_SAMPLES, CaptureWriter
+from rforge_codec import CODECS, DataType, DtypeCodec, codec_for
+from rforge_stats import LinkHealth, LogHistogram, SeqGapCounter, StreamStats
+from rforge_transport import TRANSPORT_KINDS, Transport, TransportError, memory_pair, open_transport
 
 
-def crc16_ccitt(data: bytes, init: int = 0xFFFF) -> int:
-    crc = init
-    for b in data:
-        crc ^= b << 8
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
-            else:
-                crc = (crc << 1) & 0xFFFF
-    return crc
+# READ_MEM_BATCH request items that fit one frame ([addr:u32][size:u16] each).
+MAX_READ_ITEMS = 1024 // 6
 
 
 def build_frame(cmd: int, seq: int, payload: bytes) -> bytes:
-    hdr = b"\xAA\x55" + bytes([1, cmd]) + struct.pack("<H", seq) + struct.pack("<H", len(payload))
-    crc = crc16_ccitt(hdr[2:] + payload)
+    hdr = struct.pack("<2sBBHH", b"\xAA\x55", 1, cmd, seq, len(payload))
+    crc = crc16_update(crc16_update(CRC16_INIT, memoryview(hdr)[2:]), payload)
     return hdr + payload + struct.pack("<H", crc)
 
 
-def parse_frames(buf: bytearray):
-    out = []
-    while True:
-        if len(buf) < 10:
-            break
-        sof = buf.find(b"\xAA\x55")
-        if sof < 0:
-            buf.clear()
-            break
-        if sof > 0:
-            del buf[:sof]
-            if len(buf) < 10:
+class FrameDispatcher:
+    """Background reader that parses the link continuously and queues frames per command.
+
+    Waiters block on a condition instead of polling, frames for other commands stay queued
+    until asked for, and each frame carries its parse time so RTTs reflect the link.
+    Queued items are ``(cmd, seq, payload, t_rx)``; a command with a subscribed handler
+    (e.g. STREAM_DATA during capture) is delivered to the handler on the reader thread instead.
+    Every frame's seq feeds a link-wide loss counter, and ``seq_sink`` (when set) receives the
+    seq of every frame no handler took, so a handler's stream statistics see the replies
+    interleaved in the same sequence space. Each ``read`` records its size and the frames it
+    completed, and parser resyncs and goodput are tracked in ``health``. With ``raw_out``
+    every chunk read is also appended there verbatim, giving a raw capture the simulator can
+    ``--replay``.
+    """
+
+    def __init__(self, transport: Transport, max_queue: int = 4096, raw_out: Optional[BinaryIO] = None):
+        self.transport = transport
+        self.raw_out = raw_out
+        self.rx = FrameParser()
+        self.max_queue = max_queue
+        self.frames: Dict[int, int] = {}
+        self.overflow = 0
+        self.seq = SeqGapCounter()
+        self.read_bytes = LogHistogram(1.0, float(1 << 20), 4)
+        self.read_frames = LogHistogram(1.0, 1e5, 4)
+        self.health = LinkHealth()
+        self.seq_sink: Optional[Callable[[int], None]] = None
+        self.error: Optional[str] = None
+        self.running = False
+        self._queues: Dict[int, deque] = {}
+        self._handlers: Dict[int, Callable[[int, memoryview, float], None]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="e2e-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        with self._cond:
+            self._cond.notify_all()
+
+    def write(self, data: bytes):
+        self.transport.write(data)
+
+    def subscribe(self, cmd: int, handler: Optional[Callable[[int, memoryview, float], None]]):
+        with self._cond:
+            if handler is None:
+                self._handlers.pop(cmd, None)
+            else:
+                self._handlers[cmd] = handler
+
+    def _run(self):
+        while self.running:
+            try:
+                data = self.transport.read(4096)
+            except TransportError as ex:
+                self.error = str(ex)
                 break
-        n = struct.unpack_from("<H", buf, 6)[0]
-        if n > 1024:
-            del buf[0]
-            continue
-        total = 8 + n + 2
-        if len(buf) < total:
-            break
-        got = struct.unpack_from("<H", buf, 8 + n)[0]
-        exp = crc16_ccitt(bytes(buf[2 : 8 + n]))
-        if got != exp:
-            del buf[0]
-            continue
-        cmd = buf[3]
-        seq = struct.unpack_from("<H", buf, 4)[0]
-        payload = bytes(buf[8 : 8 + n])
-        del buf[:total]
-        out.append((cmd, seq, payload))
-    return out
+            if not data:
+                continue
+            now = time.perf_counter()
+            if self.raw_out is not None:
+                self.raw_out.write(data)
+            rx = self.rx
+            rx.feed(data)
+            self.read_bytes.record(len(data))
+            self.health.read(len(data))
+            queued = []
+            count = 0
+            for cmd, seq, payload in rx:
+                count += 1
+                self.health.frame(now, HEADER_SIZE + len(payload) + CRC_SIZE, rx.dropped_bytes)
+                self.seq.note(seq)
+                self.frames[cmd] = self.frames.get(cmd, 0) + 1
+                handler = self._handlers.get(cmd)
+                if handler is not None:
+                    handler(seq, payload, now)
+                else:
+                    queued.append((cmd, seq, bytes(payload), now))
+                    sink = self.seq_sink
+                    if sink is not None:
+                        sink(seq)
+            self.read_frames.record(count)
+            self.health.end_read(now, rx.dropped_bytes)
+            if queued:
+                with self._cond:
+                    for item in queued:
+                        q = self._queues.setdefault(item[0], deque())
+                        if len(q) >= self.max_queue:
+                            q.popleft()
+                            self.overflow += 1
+                        q.append(item)
+                    self._cond.notify_all()
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
 
+    def wait(self, cmd: int, timeout_s: float, match: Optional[Callable[[tuple], bool]] = None):
+        """Pop the oldest queued ``cmd`` frame ``match`` accepts; wait up to ``timeout_s``."""
+        deadline = time.perf_counter() + timeout_s
+        with self._cond:
+            while True:
+                q = self._queues.get(cmd)
+                if q:
+                    for i, item in enumerate(q):
+                        if match is None or match(item):
+                            del q[i]
+                            return item
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._cond.wait(remaining)
 
-def wait_frame(ser: serial.Serial, rx: bytearray, cmd: int, timeout_s: float):
-    deadline = time.time() + timeout_s
-    while time.time() < deadline:
-        data = ser.read(4096)
-        if data:
-            rx.extend(data)
-            for c, s, p in parse_frames(rx):
-                if c == cmd:
-                    return c, s, p
-        time.sleep(0.005)
-    return None
+    def clear(self, cmd: int):
+        with self._cond:
+            self._queues.pop(cmd, None)
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = {f"0x{c:02X}": len(q) for c, q in self._queues.items() if q}
+        return {
+            "frames": {f"0x{c:02X}": n for c, n in sorted(self.frames.items())},
+            "queued": queued,
+            "overflow": self.overflow,
+            "seq_lost": self.seq.lost,
+            "seq_reordered": self.seq.reordered,
+            "read_bytes": self.read_bytes.summary(),
+            "read_frames": self.read_frames.summary(),
+            "crc_errors": self.rx.crc_errors,
+            "length_errors": self.rx.length_errors,
+            "dropped_bytes": self.rx.dropped_bytes,
+            "link": self.health.summary(),
+            "error": self.error,
+        }
+
+
+def wait_frame(io: FrameDispatcher, cmd: int, timeout_s: float):
+    return io.wait(cmd, timeout_s)
+
+
+def wait_ack(io: FrameDispatcher, seq: int, timeout_s: float):
+    """The ACK answering ``seq``; zero-length legacy ACKs match any request."""
+
+    def match(item) -> bool:
+        ack = parse_ack(item[2])
+        return ack is None or ack["for_seq"] == seq
+
+    return io.wait(0x02, timeout_s, match)
 
 
 def parse_ack(payload: bytes):
@@ -115,16 +253,12 @@ def decode_var_table_text(payload: bytes):
     return items
 
 
-def decode_var_table_binary(payload: bytes):
-    if len(payload) < 2:
-        return []
-    idx = 0
-    count = struct.unpack_from("<H", payload, idx)[0]
-    idx += 2
+def decode_var_descs(payload: bytes, idx: int, count: int):
+    """``count`` binary VarDesc entries starting at ``idx``; None if the payload is short."""
     items = []
     for _ in range(count):
         if idx + 13 > len(payload):
-            return []
+            return None
         address = struct.unpack_from("<I", payload, idx)[0]
         idx += 4
         dtype = payload[idx]
@@ -138,7 +272,7 @@ def decode_var_table_binary(payload: bytes):
         name_len = payload[idx]
         idx += 1
         if idx + unit_len + name_len > len(payload):
-            return []
+            return None
         unit = payload[idx : idx + unit_len].decode("ascii", errors="ignore")
         idx += unit_len
         name = payload[idx : idx + name_len].decode("ascii", errors="ignore")
@@ -156,6 +290,24 @@ def decode_var_table_binary(payload: bytes):
     return items
 
 
+def decode_var_table_binary(payload: bytes):
+    if len(payload) < 2:
+        return []
+    count = struct.unpack_from("<H", payload, 0)[0]
+    return decode_var_descs(payload, 2, count) or []
+
+
+def decode_var_table_page(payload: bytes):
+    """``(table_hash, total, offset, items)`` of one GET_VAR_TABLE_PAGE frame, or None."""
+    if len(payload) < VAR_TABLE_PAGE_HEAD.size:
+        return None
+    table_hash, total, offset, count = VAR_TABLE_PAGE_HEAD.unpack_from(payload, 0)
+    items = decode_var_descs(payload, VAR_TABLE_PAGE_HEAD.size, count)
+    if items is None:
+        return None
+    return table_hash, total, offset, items
+
+
 def decode_var_table(payload: bytes):
     vars_binary = decode_var_table_binary(payload)
     if vars_binary:
@@ -166,25 +318,96 @@ def decode_var_table(payload: bytes):
     return [], "unknown"
 
 
-def decode_readmem_binary(payload: bytes):
+def sync_var_table(io: FrameDispatcher, seq: int, cache_path: Optional[Path]):
+    """Fetch the table hash, then reuse the cached table or download every page in one request.
+
+    Returns ``(step, vars, next_seq)``.
+    """
+    t0 = time.perf_counter()
+    step = {"name": "VAR_TABLE_SYNC", "ok": False}
+    io.write(build_frame(0x13, seq, b""))
+    seq += 1
+    f = wait_frame(io, 0x13, 2.0)
+    if f is None or len(f[2]) < VAR_TABLE_INFO.size:
+        step["reason"] = "no table info"
+        return step, [], seq
+    fmt, _reserved, total, table_hash = VAR_TABLE_INFO.unpack_from(f[2], 0)
+    step.update({"hash": f"{table_hash:016x}", "total": total, "format": fmt})
+
+    if cache_path is not None and cache_path.exists():
+        try:
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            cached = {}
+        if cached.get("hash") == step["hash"] and cached.get("format") == fmt:
+            vars_ = cached.get("vars", [])
+            step.update(
+                {"ok": len(vars_) == total, "source": "cache", "frames": 1, "elapsed_ms": (time.perf_counter() - t0) * 1000.0}
+            )
+            return step, vars_, seq
+
+    vars_ = []
+    frames = 1
+    while len(vars_) < total:
+        io.write(build_frame(0x14, seq, VAR_TABLE_PAGE_REQ.pack(len(vars_), 0xFFFF)))
+        seq += 1
+        want = min(total, len(vars_) + 0xFFFF)
+        while len(vars_) < want:
+            f = wait_frame(io, 0x14, 2.0)
+            page = decode_var_table_page(f[2]) if f else None
+            if page is None or page[0] != table_hash or page[2] != len(vars_) or not page[3]:
+                step.update({"reason": "page missing or table changed", "count": len(vars_), "frames": frames})
+                return step, vars_, seq
+            vars_.extend(page[3])
+            frames += 1
+    step.update(
+        {
+            "ok": len(vars_) == total,
+            "source": "download",
+            "count": len(vars_),
+            "frames": frames,
+            "elapsed_ms": (time.perf_counter() - t0) * 1000.0,
+        }
+    )
+    if cache_path is not None and step["ok"]:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"hash": step["hash"], "format": fmt, "vars": vars_}), encoding="utf-8")
+    return step, vars_, seq
+
+
+def decode_readmem_binary_items(payload: bytes):
+    """Ordered ``(addr, raw)`` items of one binary READ_MEM_BATCH frame, and its trailer."""
     if len(payload) < 2:
-        return {}
+        return [], None
     idx = 0
     count = struct.unpack_from("<H", payload, idx)[0]
     idx += 2
-    values = {}
+    items = []
     for _ in range(count):
         if idx + 6 > len(payload):
-            return {}
+            return [], None
         address = struct.unpack_from("<I", payload, idx)[0]
         idx += 4
         size = struct.unpack_from("<H", payload, idx)[0]
         idx += 2
         if idx + size > len(payload):
-            return {}
-        values[address] = bytes(payload[idx : idx + size])
+            return [], None
+        items.append((address, bytes(payload[idx : idx + size])))
         idx += size
-    return values
+    trailer = None
+    if len(payload) - idx == READMEM_TRAILER.size:
+        trailer = READMEM_TRAILER.unpack_from(payload, idx)
+    return items, trailer
+
+
+def decode_readmem_binary_part(payload: bytes):
+    """Items of one binary READ_MEM_BATCH frame plus its ``(part, flags)`` trailer, if any."""
+    items, trailer = decode_readmem_binary_items(payload)
+    return dict(items), trailer
+
+
+def decode_readmem_binary(payload: bytes):
+    return decode_readmem_binary_part(payload)[0]
 
 
 def decode_readmem_text(payload: bytes):
@@ -209,127 +432,451 @@ def decode_readmem_text(payload: bytes):
     return values
 
 
-def decode_readmem(payload: bytes):
-    binary = decode_readmem_binary(payload)
-    if binary:
-        return binary, "binary"
-    text = decode_readmem_text(payload)
-    if text:
-        return text, "text"
-    return {}, "unknown"
-
-
-def decode_numeric(raw: bytes):
-    if len(raw) >= 8:
-        return struct.unpack_from("<d", raw, 0)[0]
-    if len(raw) >= 4:
-        return struct.unpack_from("<f", raw, 0)[0]
-    if len(raw) >= 2:
-        return float(struct.unpack_from("<h", raw, 0)[0])
-    if len(raw) >= 1:
-        return float(struct.unpack_from("<b", raw, 0)[0])
-    return None
+def readmem_part_is_last(payload: bytes) -> bool:
+    values, trailer = decode_readmem_binary_part(payload)
+    if values:
+        return trailer is None or bool(trailer[1] & READMEM_FLAG_LAST)
+    # Text replies continue while a part ends with a separator.
+    return not payload.rstrip().endswith(b",")
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--port", default="COM8")
-    ap.add_argument("--baud", type=int, default=921600)
-    ap.add_argument("--duration", type=float, default=6.0, help="stream capture duration seconds")
-    ap.add_argument("--out", default="build/e2e_report.json")
-    args = ap.parse_args()
+def decode_readmem(payloads, requests: Optional[Sequence[tuple[int, int]]] = None):
+    """Reassemble one READ_MEM_BATCH reply; returns ``(values, format, frame_count)``.
 
-    out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
+    An item larger than a frame arrives as consecutive ``(addr + offset, chunk)`` items; they
+    are joined back under the base address. With ``requests`` (the ``(addr, size)`` pairs
+    sent) a chunk is joined while its base item is still short of the requested size, so
+    abutting variables stay separate; without it (or for ``size=0``) only the first item of
+    a part that follows a full frame counts as a continuation.
+    """
+    if isinstance(payloads, (bytes, bytearray)):
+        payloads = [payloads]
+    wanted = dict(requests) if requests else {}
+    values = {}
+    fmt = "unknown"
+    base = None
+    prev_full = False
+    for payload in payloads:
+        items, _trailer = decode_readmem_binary_items(payload)
+        if items:
+            fmt = "binary"
+            for i, (addr, raw) in enumerate(items):
+                if base is not None and base + len(values[base]) == addr:
+                    size = wanted.get(base, 0)
+                    if (len(values[base]) < size) if size else (i == 0 and prev_full):
+                        values[base] += raw
+                        continue
+                values[addr] = raw
+                base = addr
+            prev_full = len(payload) >= MAX_PAYLOAD
+            continue
+        text = decode_readmem_text(payload)
+        if text:
+            values.update(text)
+            fmt = "text"
+    return values, fmt, len(payloads)
 
-    seq = 1
-    rx = bytearray()
-    report = {
-        "port": args.port,
-        "baud": args.baud,
-        "steps": [],
-        "stream_frames": 0,
-        "stream_channels_last": 0,
-        "var_table_format": "unknown",
-        "readmem_format": "unknown",
-        "ok": False,
+
+def wait_readmem(io: FrameDispatcher, timeout_s: float):
+    """Collect the frames of one READ_MEM_BATCH reply until its last part (or timeout)."""
+    parts = []
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        f = wait_frame(io, 0x11, max(0.0, deadline - time.time()))
+        if f is None:
+            break
+        parts.append(f[2])
+        if readmem_part_is_last(f[2]):
+            return parts, True
+    return parts, False
+
+
+def run_pipeline(
+    io: FrameDispatcher,
+    requests: Sequence[tuple[int, bytes]],
+    window: int,
+    timeout_s: float,
+    retries: int,
+    seq: int,
+):
+    """Send ACK-answered ``(cmd, payload)`` requests keeping up to ``window`` in flight.
+
+    Replies are matched to requests by the ACK ``for_seq``. A request that times out or gets
+    ``BUSY`` is resent under a new seq until ``retries`` is used up. Returns ``(result, next_seq)``.
+    """
+    window = max(1, window)
+    todo = deque((i, 0) for i in range(len(requests)))
+    inflight: Dict[int, tuple[int, int, float]] = {}
+    rtt = LogHistogram()
+    completed = failed = resent = busy = 0
+    t0 = time.perf_counter()
+    while todo or inflight:
+        if todo and len(inflight) < window:
+            # Top up the window with one coalesced write.
+            batch = bytearray()
+            now = time.perf_counter()
+            while todo and len(inflight) < window:
+                idx, attempt = todo.popleft()
+                cmd, payload = requests[idx]
+                batch += build_frame(cmd, seq, payload)
+                inflight[seq] = (idx, attempt, now)
+                seq = (seq + 1) & 0xFFFF
+            io.write(bytes(batch))
+
+        # Block until the next ACK or the oldest request's deadline, whichever comes first.
+        oldest = min(sent for _idx, _attempt, sent in inflight.values())
+        item = io.wait(0x02, max(0.0, oldest + timeout_s - time.perf_counter()))
+        now = time.perf_counter()
+        if item is None and not io.running:
+            # Link gone: everything still outstanding fails.
+            failed += len(inflight) + len(todo)
+            break
+        ack = parse_ack(item[2]) if item is not None else None
+        if ack is not None and ack["for_seq"] in inflight:
+            idx, attempt, sent = inflight.pop(ack["for_seq"])
+            if ack["status"] == 0:
+                completed += 1
+                rtt.record(item[3] - sent)
+            elif ack["status"] == 3 and attempt < retries:
+                busy += 1
+                resent += 1
+                todo.append((idx, attempt + 1))
+            else:
+                busy += ack["status"] == 3
+                failed += 1
+
+        for s_, (idx, attempt, sent) in list(inflight.items()):
+            if now - sent < timeout_s:
+                continue
+            del inflight[s_]
+            if attempt < retries:
+                resent += 1
+                todo.append((idx, attempt + 1))
+            else:
+                failed += 1
+
+    elapsed = time.perf_counter() - t0
+    result = {
+        "window": window,
+        "requests": len(requests),
+        "completed": completed,
+        "failed": failed,
+        "retries": resent,
+        "busy": busy,
+        "elapsed_s": elapsed,
+        "cmds_per_s": completed / elapsed if elapsed > 0 else 0.0,
+        "rtt_ms": rtt.summary(scale=1e3),
     }
+    return result, seq
+
+
+def var_codec(var: dict) -> DtypeCodec:
+    """Codec for a fetched var table entry; unknown types read as float32."""
+    try:
+        return codec_for(var.get("type", ""))
+    except (KeyError, ValueError):
+        return CODECS[DataType.Float32]
+
+
+def var_read_size(var: dict) -> int:
+    return var_codec(var).size * max(1, int(var.get("array_size", 1)))
+
+
+def decode_var(var: dict, raw: bytes, read_format: str):
+    """All elements of ``var`` in ``raw`` as a typed sequence (one cast, not one call per element)."""
+    # Text replies carry one float per address whatever the variable type.
+    codec = CODECS[DataType.Float32] if read_format == "text" else var_codec(var)
+    return codec.unpack_array(raw)
+
+
+def open_link(args: argparse.Namespace):
+    """Open the host end of the link; ``memory`` also starts an in-process simulator."""
+    if args.transport != "memory":
+        port = args.port or ("COM8" if args.transport == "serial" else None)
+        return open_transport(args.transport, port, args.baud, device=False, timeout=0.02, write_timeout=None), None, None
+
+    import uart_mcu_sim
+
+    host, device = memory_pair(timeout=0.02, write_timeout=None)
+    base = ["--transport", "memory", "--baud", str(args.baud)]
+    if args.protocol == "justfloat":
+        # JustFloat has no commands: the simulator must stream on its own at the requested shape.
+        base += ["--protocol", "justfloat", "--auto-stream"]
+        base += ["--channels", str(args.stream_channels), "--stream-hz", str(args.stream_hz)]
+    sim_args = uart_mcu_sim.parse_args([*base, *shlex.split(args.sim_args)])
+    sim = uart_mcu_sim.UartMcuSim(sim_args, transport=device)
+    runner = threading.Thread(target=sim.run, daemon=True)
+    runner.start()
+    return host, sim, runner
+
+
+def decode_stream(payload, packed: bool):
+    """Return ``(ticks, channels)`` carried by one STREAM_DATA payload, or None if malformed."""
+    if packed:
+        decoded = decode_packed_stream(payload)
+        if decoded is None:
+            return None
+        _ts_us, _period_us, channels, ticks, _values = decoded
+        return ticks, len(channels)
+    if len(payload) >= 8 and (len(payload) - 8) % 6 == 0:
+        return 1, (len(payload) - 8) // 6
+    return None
+
+
+_TICK_STRUCTS: Dict[int, struct.Struct] = {}
+
+
+def decode_stream_samples(payload, packed: bool):
+    """Return ``(ts_us, period_us, channels, ticks, values)`` with tick-major float32 values, or None."""
+    if packed:
+        return decode_packed_stream(payload)
+    if len(payload) < 8 or (len(payload) - 8) % 6:
+        return None
+    nch = (len(payload) - 8) // 6
+    unpacker = _TICK_STRUCTS.get(nch)
+    if unpacker is None:
+        unpacker = _TICK_STRUCTS.setdefault(nch, struct.Struct("<Q" + "Hf" * nch))
+    items = unpacker.unpack(payload)
+    return items[0], 0, list(items[1::2]), 1, array("f", items[2::2])
+
+
+def check_justfloat(link: Transport, args: argparse.Namespace, report: dict):
+    """Receive a VOFA+ JustFloat stream for ``--duration`` and check its framing."""
+    parser = JustFloatParser(channels=0)
+    host_gap = LogHistogram(1e-7, 10.0)
+    writer: Optional[CaptureWriter] = None
+    rx_bytes = 0
+    last_t = None
+    t0 = time.perf_counter()
+    deadline = t0 + args.duration
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                data = link.read(4096)
+            except TransportError as ex:
+                report["steps"].append({"name": "JUSTFLOAT_STREAM", "ok": False, "reason": str(ex)})
+                return
+            if not data:
+                continue
+            now = time.perf_counter()
+            rx_bytes += len(data)
+            parser.feed(data)
+            for payload in parser:
+                if last_t is not None:
+                    host_gap.record(now - last_t)
+                last_t = now
+                if args.capture:
+                    if writer is None:
+                        writer = CaptureWriter(Path(args.capture), range(parser.channels), block_samples=args.capture_block)
+                    # JustFloat carries no timestamp; stamp samples with host arrival time.
+                    values = array("f", payload.cast("f"))
+                    writer.append(int(time.time() * 1_000_000), 0, writer.channels, 1, values)
+    finally:
+        # Close on every exit so the capture keeps its index and stays readable.
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - t0
+    if writer is not None:
+        report["capture"] = writer.stats()
+    report["stream_frames"] = parser.frames
+    report["stream_ticks"] = parser.frames
+    report["stream_channels_last"] = parser.channels
+    expected_channels = args.stream_channels if args.transport == "memory" else parser.channels
+    report["steps"].append(
+        {
+            "name": "JUSTFLOAT_STREAM",
+            "ok": parser.frames > 20 and parser.misaligned == 0 and parser.channels == expected_channels,
+            "frames": parser.frames,
+            "channels": parser.channels,
+            "misaligned": parser.misaligned,
+            "dropped_bytes": parser.dropped_bytes,
+            "rx_bytes": rx_bytes,
+            "frames_per_s": parser.frames / elapsed if elapsed > 0 else 0.0,
+            "samples_per_s": parser.frames * parser.channels / elapsed if elapsed > 0 else 0.0,
+            "host_gap_ms": host_gap.summary(scale=1e3),
+        }
+    )
+    print(
+        f"[E2E] justfloat frames={parser.frames} ch={parser.channels} misaligned={parser.misaligned} "
+        f"dropped={parser.dropped_bytes} B  {rx_bytes / max(elapsed, 1e-9) / 1024:.1f} KB/s"
+    )
+
+
+def check_watch_list(io: FrameDispatcher, vars_, args: argparse.Namespace, report: dict, seq: int) -> int:
+    """Subscribe up to three variables while streaming and check their push rates.
+
+    Entry 0 is sent every tick and entry 1 every 4th; entry 2 (when there is one) has a deadband
+    no value can cross, so after its first sample it must stay silent.
+    """
+    addrs = [int(v["address"], 16) for v in vars_[:3]]
+    items = [(addrs[0], 1, 0.0)]
+    if len(addrs) > 1:
+        items.append((addrs[1], 4, 0.0))
+    if len(addrs) > 2:
+        items.append((addrs[2], 1, 1e30))
+    counts = [0] * len(items)
+    last = [None] * len(items)
+    frames = 0
+
+    def on_watch(_seq_rx: int, payload: memoryview, _t_rx: float):
+        nonlocal frames
+        decoded = decode_sparse_stream(payload)
+        if decoded is None:
+            return
+        frames += 1
+        for ch, value in decoded[1]:
+            idx = ch - WATCH_CHANNEL_BASE
+            if 0 <= idx < len(counts):
+                counts[idx] += 1
+                last[idx] = value
+
+    io.subscribe(0x20, on_watch)
+    io.write(build_frame(0x15, seq, encode_watch_list(items)))
+    watch_seq = seq
+    seq += 1
+    ok, detail = ack_ok(wait_ack(io, watch_seq, 1.5), 0x15)
+    t0 = time.perf_counter()
+    time.sleep(args.watch_duration)
+    elapsed = time.perf_counter() - t0
+    # An empty list unsubscribes everything.
+    io.write(build_frame(0x15, seq, encode_watch_list([])))
+    clear_seq = seq
+    seq += 1
+    clear_ok, _clear = ack_ok(wait_ack(io, clear_seq, 1.5), 0x15)
+    io.subscribe(0x20, None)
+
+    rates_ok = counts[0] > 0
+    if len(counts) > 1:
+        # Divisor 4 against divisor 1, with slack for the window edges.
+        rates_ok = rates_ok and counts[1] > 0 and 2.5 <= counts[0] / counts[1] <= 6.0
+    if len(counts) > 2:
+        rates_ok = rates_ok and counts[2] == 1
+    report["steps"].append(
+        {
+            "name": "WATCH_LIST",
+            "ok": ok and clear_ok and rates_ok,
+            "detail": detail,
+            "entries": [
+                {"address": f"0x{a:08X}", "divisor": d, "deadband": b, "samples": n, "last": v, "rate_hz": round(n / elapsed, 1)}
+                for (a, d, b), n, v in zip(items, counts, last)
+            ],
+            "frames": frames,
+        }
+    )
+    print(
+        "[E2E] watch "
+        + "  ".join(f"0x{a:08X}/{d}: {n / elapsed:.0f} Hz" for (a, d, _b), n in zip(items, counts))
+        + f"  frames={frames}"
+    )
+    return seq
+
 
-    with serial.Serial(args.port, args.baud, timeout=0.02) as ser:
+def run_rforge_checks(link: Transport, args: argparse.Namespace, report: dict):
+    """RForge command/stream checks; every step appends its result to ``report["steps"]``."""
+    seq = 1
+    # The raw capture closes with the link however the checks end, after the reader has stopped.
+    raw_file = open(args.raw_capture, "wb") if args.raw_capture else nullcontext()
+    with link, raw_file as raw_out, FrameDispatcher(link, raw_out=raw_out) as io:
         # 1) Connectivity handshake.
-        ser.write(build_frame(0x01, seq, b""))
+        io.write(build_frame(0x01, seq, b""))
         ping_seq = seq
         seq += 1
-        f = wait_frame(ser, rx, 0x02, 1.5)
+        f = wait_ack(io, ping_seq, 1.5)
         ok, detail = ack_ok(f, 0x01)
         detail["tx_seq"] = ping_seq
         report["steps"].append({"name": "PING->ACK", "ok": ok, "detail": detail})
 
         # 2) Stream configuration.
-        set_stream_payload = struct.pack("<BBHH", 8, 0, 220, 0)
-        ser.write(build_frame(0x05, seq, set_stream_payload))
+        stream_flags = STREAM_FLAG_PACKED if args.packed else 0
+        set_stream_payload = struct.pack("<BBHH", args.stream_channels, 0, args.stream_hz, stream_flags)
+        io.write(build_frame(0x05, seq, set_stream_payload))
         cfg_seq = seq
         seq += 1
-        f = wait_frame(ser, rx, 0x02, 1.5)
+        f = wait_ack(io, cfg_seq, 1.5)
         ok, detail = ack_ok(f, 0x05)
         detail["tx_seq"] = cfg_seq
         report["steps"].append({"name": "SET_STREAM_CONFIG->ACK", "ok": ok, "detail": detail})
 
         # 3) Variable table fetch.
-        ser.write(build_frame(0x10, seq, b""))
+        io.write(build_frame(0x10, seq, b""))
         seq += 1
-        f = wait_frame(ser, rx, 0x10, 2.0)
+        f = wait_frame(io, 0x10, 2.0)
         vars_, var_format = decode_var_table(f[2]) if f else ([], "unknown")
         report["var_table_format"] = var_format
         report["steps"].append({"name": "GET_VAR_TABLE", "ok": f is not None and len(vars_) > 0, "count": len(vars_), "format": var_format})
 
-        # 4) Read first mapped variable.
-        first_addr = None
+        # 3b) Full table via hash query + paged download (or the local cache on a hash match).
+        sync_step, full_vars, seq = sync_var_table(io, seq, Path(args.var_cache) if args.var_cache else None)
+        report["steps"].append(sync_step)
+        if len(full_vars) > len(vars_):
+            vars_ = full_vars
+
+        # 4) Read every listed variable in one request (reply may span several frames).
+        first_var = vars_[0] if vars_ else None
         if vars_:
-            first_addr = int(vars_[0]["address"], 16)
-            payload = struct.pack("<IH", first_addr, 4)
-            ser.write(build_frame(0x11, seq, payload))
+            listed = vars_[:MAX_READ_ITEMS]
+            addrs = [int(v["address"], 16) for v in listed]
+            payload = b"".join(struct.pack("<IH", addr, var_read_size(v)) for addr, v in zip(addrs, listed))
+            io.write(build_frame(0x11, seq, payload))
             seq += 1
-            f = wait_frame(ser, rx, 0x11, 2.0)
-            values, read_format = decode_readmem(f[2]) if f else ({}, "unknown")
+            parts, complete = wait_readmem(io, 2.0)
+            sizes = [var_read_size(v) for v in listed]
+            values, read_format, frames = decode_readmem(parts, list(zip(addrs, sizes)))
             report["readmem_format"] = read_format
+            decoded = {addr: decode_var(v, values[addr], read_format) for addr, v in zip(addrs, listed) if addr in values}
+            # Text replies carry one value per address whatever the size asked for.
+            short = 0 if read_format == "text" else sum(len(values.get(a, b"")) != n for a, n in zip(addrs, sizes))
             report["steps"].append(
                 {
                     "name": "READ_MEM_BATCH",
-                    "ok": f is not None and first_addr in values,
+                    "ok": complete and len(decoded) == len(addrs) and short == 0,
                     "format": read_format,
+                    "requested": len(addrs),
                     "count": len(values),
+                    "size_mismatch": short,
+                    "elements": sum(len(d) for d in decoded.values()),
+                    "frames": frames,
                 }
             )
         else:
             report["steps"].append({"name": "READ_MEM_BATCH", "ok": False, "reason": "no vars"})
 
-        # 5) Write and verify first mapped variable.
-        if first_addr is not None:
-            target = 42.5
-            write_payload = struct.pack("<IHf", first_addr, 4, target)
-            ser.write(build_frame(0x12, seq, write_payload))
+        # 5) Write and verify first mapped variable, encoded as its own type. Array variables get a
+        # distinct value per element so the read-back shows each one landed where it should.
+        if first_var is not None:
+            first_addr = int(first_var["address"], 16)
+            codec = var_codec(first_var)
+            target = 42.5 if codec.is_float else 42.0
+            targets = [target + k % 64 for k in range(max(1, int(first_var.get("array_size", 1))))]
+            write_size = var_read_size(first_var)
+            write_payload = struct.pack("<IH", first_addr, write_size) + codec.pack_array(targets)
+            io.write(build_frame(0x12, seq, write_payload))
             write_seq = seq
             seq += 1
-            f = wait_frame(ser, rx, 0x02, 1.5)
+            f = wait_ack(io, write_seq, 1.5)
             ok, detail = ack_ok(f, 0x12)
             detail["tx_seq"] = write_seq
             report["steps"].append({"name": "WRITE_MEM->ACK", "ok": ok, "detail": detail})
 
-            verify_payload = struct.pack("<IH", first_addr, 4)
-            ser.write(build_frame(0x11, seq, verify_payload))
+            verify_payload = struct.pack("<IH", first_addr, write_size)
+            io.write(build_frame(0x11, seq, verify_payload))
             seq += 1
-            f = wait_frame(ser, rx, 0x11, 2.0)
-            values, read_format = decode_readmem(f[2]) if f else ({}, "unknown")
+            parts, _complete = wait_readmem(io, 2.0)
+            values, read_format, _frames = decode_readmem(parts, [(first_addr, write_size)])
             raw = values.get(first_addr, b"")
-            numeric = decode_numeric(raw) if raw else None
-            verify_ok = numeric is not None and abs(numeric - target) < 0.6
+            decoded = decode_var(first_var, raw, read_format)
+            numeric = decoded[0] if len(decoded) else None
+            # Text replies carry only the first element.
+            complete = read_format == "text" or len(decoded) == len(targets)
+            verify_ok = numeric is not None and complete and all(abs(got - want) < 0.6 for got, want in zip(decoded, targets))
             report["steps"].append(
                 {
                     "name": "WRITE_VERIFY",
                     "ok": verify_ok,
                     "value": numeric,
                     "target": target,
+                    "elements": len(decoded),
+                    "type": codec.dtype.name.lower(),
                     "format": read_format,
                 }
             )
@@ -337,41 +884,193 @@ def main():
             report["steps"].append({"name": "WRITE_MEM->ACK", "ok": False, "reason": "no vars"})
             report["steps"].append({"name": "WRITE_VERIFY", "ok": False, "reason": "no vars"})
 
-        # 6) Start streaming.
-        ser.write(build_frame(0x03, seq, b""))
-        stream_start_seq = seq
-        seq += 1
-        ack = wait_frame(ser, rx, 0x02, 1.5)
-        ok, detail = ack_ok(ack, 0x03)
-        detail["tx_seq"] = stream_start_seq
-        report["steps"].append({"name": "STREAM_START->ACK", "ok": ok, "detail": detail})
-
-        # 7) Capture stream frames for a fixed window.
-        t_end = time.time() + args.duration
-        stream_frames = 0
-        last_channels = 0
-        while time.time() < t_end:
-            data = ser.read(4096)
-            if data:
-                rx.extend(data)
-                for c, _s, p in parse_frames(rx):
-                    if c == 0x20 and len(p) >= 8 and (len(p) - 8) % 6 == 0:
-                        stream_frames += 1
-                        last_channels = (len(p) - 8) // 6
-            time.sleep(0.002)
+        # 5b) Pipelined PING/WRITE_MEM throughput at each window size.
+        if args.pipeline_count > 0:
+            requests = [(0x01, b"")]
+            if first_var is not None:
+                codec = var_codec(first_var)
+                requests.append((0x12, struct.pack("<IH", int(first_var["address"], 16), codec.size) + codec.pack(42.5)))
+            requests = [requests[i % len(requests)] for i in range(args.pipeline_count)]
+            runs = []
+            for window in args.pipeline_windows:
+                result, seq = run_pipeline(io, requests, window, args.pipeline_timeout, args.pipeline_retries, seq)
+                runs.append(result)
+                print(
+                    f"[E2E] pipeline window={window:3d}  {result['cmds_per_s']:8.0f} cmd/s  "
+                    f"rtt_p50={result['rtt_ms']['p50'] or 0:.3f} ms  p95={result['rtt_ms']['p95'] or 0:.3f} ms  "
+                    f"retries={result['retries']}  failed={result['failed']}"
+                )
+            report["pipeline"] = runs
+            report["steps"].append(
+                {"name": "PIPELINE", "ok": all(r["failed"] == 0 and r["completed"] == r["requests"] for r in runs)}
+            )
+
+        # 6) Start streaming; the reader thread counts and decodes frames from the first one.
+        capture = {"frames": 0, "ticks": 0, "channels": 0}
+        writer: Optional[CaptureWriter] = None
+        stream_stats = StreamStats()
+        # Unpacked frames carry one tick and no period; use the requested rate.
+        tick_us = 1e6 / args.stream_hz if args.stream_hz > 0 else 0.0
+
+        def on_stream(seq_rx: int, payload: memoryview, t_rx: float):
+            nonlocal writer
+            if is_sparse_stream(payload):
+                # Watch-list frame: keep seq continuity, but it is not a stream tick.
+                stream_stats.skip(seq_rx)
+                return
+            if not args.capture:
+                decoded = decode_stream(payload, args.packed)
+                if decoded is None:
+                    stream_stats.skip(seq_rx)
+                    return
+                ticks, nch = decoded
+                if args.packed:
+                    ts_us, period_us = PACKED_STREAM_HEAD.unpack_from(payload, 0)[:2]
+                else:
+                    ts_us, period_us = struct.unpack_from("<Q", payload, 0)[0], 0
+            else:
+                samples = decode_stream_samples(payload, args.packed)
+                if samples is None:
+                    stream_stats.skip(seq_rx)
+                    return
+                ts_us, period_us, channels, ticks, values = samples
+                nch = len(channels)
+                if writer is None:
+                    # Columns follow the first frame's channel set.
+                    writer = CaptureWriter(Path(args.capture), channels, block_samples=args.capture_block)
+                writer.append(ts_us, period_us, channels, ticks, values)
+            stream_stats.record(seq_rx, t_rx, ts_us, ticks * period_us if period_us else tick_us)
+            capture["frames"] += 1
+            capture["ticks"] += ticks
+            capture["channels"] = nch
+
+        # ACKs take seqs from the same counter as stream frames; without them every reply would
+        # show up as a lost stream frame.
+        io.seq_sink = stream_stats.skip
+        io.subscribe(0x20, on_stream)
+        try:
+            io.write(build_frame(0x03, seq, b""))
+            stream_start_seq = seq
+            seq += 1
+            ack = wait_ack(io, stream_start_seq, 1.5)
+            ok, detail = ack_ok(ack, 0x03)
+            detail["tx_seq"] = stream_start_seq
+            report["steps"].append({"name": "STREAM_START->ACK", "ok": ok, "detail": detail})
+
+            # 7) Capture stream frames for a fixed window.
+            time.sleep(args.duration)
+        finally:
+            io.subscribe(0x20, None)
+            io.seq_sink = None
+            # Close on every exit so the capture keeps its index and stays readable.
+            if writer is not None:
+                writer.close()
+        if writer is not None:
+            report["capture"] = writer.stats()
+        stream_frames = capture["frames"]
+        stream_ticks = capture["ticks"]
+        last_channels = capture["channels"]
         report["stream_frames"] = stream_frames
+        report["stream_ticks"] = stream_ticks
         report["stream_channels_last"] = last_channels
-        report["steps"].append({"name": "STREAM_DATA", "ok": stream_frames > 20, "frames": stream_frames, "channels": last_channels})
+        report["stream_stats"] = stream_stats.summary()
+        report["steps"].append(
+            {
+                "name": "STREAM_DATA",
+                "ok": stream_ticks > 20,
+                "frames": stream_frames,
+                "ticks": stream_ticks,
+                "channels": last_channels,
+                "lost": stream_stats.seq.lost,
+            }
+        )
+        gap = report["stream_stats"]["host_gap_ms"]
+        jitter = report["stream_stats"]["host_jitter_ms"]
+        print(
+            f"[E2E] stream frames={stream_frames} lost={stream_stats.seq.lost} "
+            f"gap_p95={gap['p95'] or 0:.3f} ms  jitter_p50/p95/p99={jitter['p50'] or 0:.3f}/"
+            f"{jitter['p95'] or 0:.3f}/{jitter['p99'] or 0:.3f} ms"
+        )
+
+        # 7b) Watch list: variables pushed at per-entry divisors instead of polled.
+        if vars_ and args.watch_duration > 0:
+            seq = check_watch_list(io, vars_, args, report, seq)
 
         # 8) Stop stream and ensure control channel is still responsive.
-        ser.write(build_frame(0x04, seq, b""))
+        io.write(build_frame(0x04, seq, b""))
         stream_stop_seq = seq
         seq += 1
-        ack = wait_frame(ser, rx, 0x02, 1.5)
+        ack = wait_ack(io, stream_stop_seq, 1.5)
         ok, detail = ack_ok(ack, 0x04)
         detail["tx_seq"] = stream_stop_seq
         report["steps"].append({"name": "STREAM_STOP->ACK", "ok": ok, "detail": detail})
+        report["dispatch"] = io.stats()
+    if raw_out is not None:
+        report["raw_capture"] = {"path": args.raw_capture, "bytes": Path(args.raw_capture).stat().st_size}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--transport", choices=TRANSPORT_KINDS, default="serial", help="memory runs the simulator in-process")
+    ap.add_argument("--port", help="serial port (default COM8), pty peer path, or tcp host:port")
+    ap.add_argument("--baud", type=int, default=921600)
+    ap.add_argument("--sim-args", default="", help="extra simulator options for --transport memory")
+    ap.add_argument(
+        "--protocol",
+        choices=["rforge", "justfloat"],
+        default="rforge",
+        help="rforge runs the command/stream checks; justfloat only receives and checks a VOFA+ JustFloat stream",
+    )
+    ap.add_argument("--duration", type=float, default=6.0, help="stream capture duration seconds")
+    ap.add_argument("--var-cache", default="", help="var table cache file; skips the download when the table hash matches")
+    ap.add_argument("--pipeline-count", type=int, default=400, help="requests per pipelined run (0 disables)")
+    ap.add_argument(
+        "--pipeline-windows",
+        type=lambda x: [int(v) for v in x.split(",") if v.strip()],
+        default=[1, 4, 16, 64],
+        help="comma list of in-flight window sizes",
+    )
+    ap.add_argument("--pipeline-timeout", type=float, default=0.5, help="per-request reply timeout seconds")
+    ap.add_argument("--pipeline-retries", type=int, default=2, help="resends per request after timeout/BUSY")
+    ap.add_argument("--packed", action="store_true", help="request packed multi-sample STREAM_DATA frames")
+    ap.add_argument("--stream-channels", type=int, default=8, help="channels requested via SET_STREAM_CONFIG (or simulated for justfloat)")
+    ap.add_argument("--stream-hz", type=int, default=220, help="stream rate requested via SET_STREAM_CONFIG (or simulated for justfloat)")
+    ap.add_argument("--watch-duration", type=float, default=0.5, help="seconds of watch-list streaming to check (0 disables)")
+    ap.add_argument("--capture", default="", help="write decoded stream samples to this columnar capture file")
+    ap.add_argument("--raw-capture", default="", help="append every byte read from the link to this file (replayable with uart_mcu_sim.py --replay)")
+    ap.add_argument("--capture-block", type=int, default=DEFAULT_BLOCK_SAMPLES, help="ticks per capture block")
+    ap.add_argument("--out", default="build/e2e_report.json")
+    args = ap.parse_args()
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    report = {
+        "transport": args.transport,
+        "port": args.port,
+        "baud": args.baud,
+        "steps": [],
+        "stream_mode": "packed" if args.packed else "per_tick",
+        "stream_frames": 0,
+        "stream_ticks": 0,
+        "stream_channels_last": 0,
+        "var_table_format": "unknown",
+        "readmem_format": "unknown",
+        "ok": False,
+    }
+
+    link, sim, sim_thread = open_link(args)
+    if args.protocol == "justfloat":
+        report["stream_mode"] = "justfloat"
+        with link:
+            check_justfloat(link, args, report)
+    else:
+        run_rforge_checks(link, args, report)
 
+    if sim is not None:
+        sim.running = False
+        # Let the simulator run its shutdown (TX drain, --mem-dump) before the process exits.
+        sim_thread.join(timeout=2.0)
     report["ok"] = all(step.get("ok", False) for step in report["steps"])
     out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
     print(json.dumps(report, indent=2))
@@ -4,26 +4,89 @@ RenesasForge UART MCU simulator.
 
 Features:
 - RForge binary protocol command handling
-- VOFA-style CSV streaming
-- Configurable baud, stream rate, channel count, CRC/drop error injection
-- Optional variable table bootstrap from Renesas .map files
+- VOFA-style CSV streaming and binary VOFA+ JustFloat streaming
+- Packed multi-sample STREAM_DATA frames (SET_STREAM_CONFIG flags bit1)
+- Block waveform engine with per-channel kinds (sine, square, chirp, noise, step)
+- Absolute-time stream scheduler: batched emission of due ticks with scheduled timestamps,
+  optional sleep/spin hybrid, catch-up or drop policy, achieved vs requested rate
+- Dedicated coalescing TX writer thread with configurable backpressure policy
+- TX priority lanes (control replies ahead of stream data) and ACK BUSY under backlog
+- Configurable baud, stream rate, channel count
+- Seeded fault-profile engine on the TX path: burst drops, bit flips, byte insert/delete,
+  SOF-lookalike garbage, truncation, line stalls, scheduled outages, per-command targeting
+- Sparse byte-addressable memory model (pages + optional mmap'd RAM image) behind
+  READ_MEM_BATCH / WRITE_MEM
+- Paged GET_VAR_TABLE with a table hash query for skip-on-connect
+- Watch-list subscriptions (SET_WATCH_LIST): variables pushed in sparse STREAM_DATA frames
+  at per-entry rate divisors, optionally only when they move beyond a deadband
+- Optional variable table bootstrap from Renesas .map files (cached symbol index,
+  READ_MEM_BATCH resolves addresses inside a symbol)
+- Pluggable transport: serial port, POSIX pty pair, local TCP, in-process memory pipe
+- Optional UART line-rate pacing with an emulated TX FIFO (stalls and overflows) for
+  links that would otherwise run at memory speed
+- Per-stage hot-path timing (gen, pack, crc, write, rx_parse, command) as JSON stats lines
+  on stdout, a file or a UDP socket
+- Replay of a recorded raw byte capture or decoded sample capture (memory-mapped, looped
+  without re-reading) at original timing, a speed multiplier, or as fast as the link allows
 """
 
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import math
-import random
-import re
+import socket
 import struct
 import threading
 import time
 from dataclasses import dataclass
 from enum import IntEnum
 from pathlib import Path
-from typing import Dict, List, Sequence
-
-import serial
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rforge_mapfile import SymbolIndex, load_symbol_index
+from rforge_memory import Buffer, SparseMemory
+from rforge_protocol import (
+    CRC16_INIT,
+    CRC_SIZE,
+    HEADER_SIZE,
+    JUSTFLOAT_TAIL,
+    MAX_PAYLOAD,
+    PACKED_STREAM_HEAD,
+    READMEM_FLAG_LAST,
+    READMEM_TRAILER,
+    STREAM_FLAG_PACKED,
+    VAR_TABLE_FORMAT,
+    VAR_TABLE_INFO,
+    VAR_TABLE_PAGE_HEAD,
+    VAR_TABLE_PAGE_REQ,
+    WATCH_CHANNEL_BASE,
+    FrameParser,
+    channel_mask,
+    crc16_update,
+    decode_watch_list,
+    encode_sparse_stream,
+    packed_stream_max_ticks,
+)
+from rforge_codec import CODECS, DataType, DtypeCodec
+from rforge_faults import FaultEngine, FaultRule, parse_fault_profile
+from rforge_replay import RawReplay, open_replay
+from rforge_signal import SignalEngine, parse_waveforms
+from rforge_stats import LogHistogram, StageTimer
+from rforge_transport import (
+    LANE_CONTROL,
+    LANE_STREAM,
+    TRANSPORT_KINDS,
+    TX_POLICIES,
+    PacedTransport,
+    Transport,
+    TransportError,
+    TxWriter,
+    line_bytes,
+    open_transport,
+    serial_write_budget,
+)
 
 
 class CommandId(IntEnum):
@@ -35,18 +98,23 @@ class CommandId(IntEnum):
     GetVarTable = 0x10
     ReadMemBatch = 0x11
     WriteMem = 0x12
+    GetVarTableInfo = 0x13
+    GetVarTablePage = 0x14
+    SetWatchList = 0x15
     StreamData = 0x20
 
 
-class DataType(IntEnum):
-    Int8 = 0
-    UInt8 = 1
-    Int16 = 2
-    UInt16 = 3
-    Int32 = 4
-    UInt32 = 5
-    Float32 = 6
-    Float64 = 7
+# Commands answered with ACK status=BUSY while the stream TX backlog exceeds --busy-threshold.
+BUSY_GATED_COMMANDS = (
+    CommandId.GetVarTable,
+    CommandId.ReadMemBatch,
+    CommandId.WriteMem,
+    CommandId.GetVarTableInfo,
+    CommandId.GetVarTablePage,
+)
+
+# Upper bound on frames in one READ_MEM_BATCH reply; items past it are dropped.
+READMEM_MAX_FRAMES = 64
 
 
 @dataclass
@@ -57,65 +125,36 @@ class Variable:
     scale: float = 1.0
     unit: str = ""
     value: float = 0.0
+    size: int = 0
 
+    @property
+    def array_size(self) -> int:
+        """Elements when the symbol spans a whole number of ``dtype`` values, else 1."""
+        elem = dtype_size(self.dtype)
+        return self.size // elem if self.size > elem and self.size % elem == 0 else 1
 
-def crc16_ccitt(data: bytes, init: int = 0xFFFF) -> int:
-    crc = init
-    for b in data:
-        crc ^= b << 8
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
-            else:
-                crc = (crc << 1) & 0xFFFF
-    return crc
+
+@dataclass
+class WatchEntry:
+    address: int
+    codec: DtypeCodec
+    divisor: int
+    deadband: float
+    last: Optional[float] = None
 
 
-def build_rforge_frame(cmd: int, seq: int, payload: bytes, crc_error_rate: float = 0.0) -> bytes:
+def build_rforge_frame(cmd: int, seq: int, payload: bytes) -> bytes:
     if len(payload) > 1024:
         payload = payload[:1024]
-    header = b"\xAA\x55" + bytes([1, cmd]) + struct.pack("<H", seq) + struct.pack("<H", len(payload))
-    core = header[2:] + payload
-    crc = crc16_ccitt(core)
-    frame = bytearray(header + payload + struct.pack("<H", crc))
-    if crc_error_rate > 0 and random.random() < crc_error_rate and len(frame) > 10:
-        idx = random.randint(8, len(frame) - 3)
-        frame[idx] ^= 0x01
+    n = len(payload)
+    frame = bytearray(8 + n + 2)
+    struct.pack_into("<2sBBHH", frame, 0, b"\xAA\x55", 1, cmd, seq, n)
+    frame[8 : 8 + n] = payload
+    crc = crc16_update(CRC16_INIT, memoryview(frame)[2 : 8 + n])
+    struct.pack_into("<H", frame, 8 + n, crc)
     return bytes(frame)
 
 
-def iter_rforge_frames(buffer: bytearray):
-    while True:
-        if len(buffer) < 10:
-            return
-        # Resync on SOF to tolerate line noise / framing errors.
-        sof = buffer.find(b"\xAA\x55")
-        if sof < 0:
-            buffer.clear()
-            return
-        if sof > 0:
-            del buffer[:sof]
-            if len(buffer) < 10:
-                return
-        payload_len = struct.unpack_from("<H", buffer, 6)[0]
-        if payload_len > 1024:
-            del buffer[0]
-            continue
-        total = 8 + payload_len + 2
-        if len(buffer) < total:
-            return
-        expected = struct.unpack_from("<H", buffer, 8 + payload_len)[0]
-        actual = crc16_ccitt(bytes(buffer[2 : 8 + payload_len]))
-        if expected != actual:
-            del buffer[0]
-            continue
-        cmd = buffer[3]
-        seq = struct.unpack_from("<H", buffer, 4)[0]
-        payload = bytes(buffer[8 : 8 + payload_len])
-        del buffer[:total]
-        yield cmd, seq, payload
-
-
 def infer_dtype(name: str) -> DataType:
     lname = name.lower()
     if "_u1_" in lname or lname.startswith("u1_"):
@@ -135,42 +174,31 @@ def infer_dtype(name: str) -> DataType:
     return DataType.Float32
 
 
-def load_vars_from_map(map_path: Path, prefixes: Sequence[str], max_vars: int, min_addr: int) -> List[Variable]:
-    text = map_path.read_text(encoding="cp932", errors="ignore")
-    lines = text.splitlines()
-    vars_: List[Variable] = []
-    symbol_re = re.compile(r"^\s+(_[A-Za-z0-9_$.@]+)\s*$")
-    addr_re = re.compile(r"^\s+([0-9A-Fa-f]{8})\s+([0-9A-Fa-f]+)\s+data\s*,g")
-    current_symbol: str | None = None
+_SIZE_DTYPES = {1: DataType.UInt8, 2: DataType.UInt16, 8: DataType.Float64}
 
-    prefix_list = [p.lower() for p in prefixes]
-    for line in lines:
-        m1 = symbol_re.match(line)
-        if m1:
-            current_symbol = m1.group(1)
-            continue
 
-        if current_symbol is None:
-            continue
+def dtype_for_symbol(name: str, size: int) -> DataType:
+    dtype = infer_dtype(name)
+    if dtype == DataType.Float32 and size in _SIZE_DTYPES:
+        # No type hint in the name: the map's symbol size is the better guess.
+        return _SIZE_DTYPES[size]
+    return dtype
 
-        m2 = addr_re.match(line)
-        if not m2:
-            continue
 
-        symbol = current_symbol.lstrip("_")
-        current_symbol = None
-        lower_symbol = symbol.lower()
+def vars_from_symbols(index: SymbolIndex, prefixes: Sequence[str], max_vars: int, min_addr: int) -> List[Variable]:
+    vars_: List[Variable] = []
+    prefix_list = [p.lower() for p in prefixes]
+    for sym in index.symbols:
+        if sym.kind != "data" or sym.scope != "g":
+            continue
+        lower_symbol = sym.name.lower()
         if prefix_list and not any(lower_symbol.startswith(p) for p in prefix_list):
             continue
-
-        addr = int(m2.group(1), 16)
-        if addr < min_addr:
+        if sym.address < min_addr:
             continue
-
         if "table" in lower_symbol or "vect" in lower_symbol:
             continue
 
-        dtype = infer_dtype(symbol)
         unit = "raw"
         if "speed" in lower_symbol:
             unit = "rpm"
@@ -180,19 +208,28 @@ def load_vars_from_map(map_path: Path, prefixes: Sequence[str], max_vars: int, m
             unit = "V"
         elif "curr" in lower_symbol:
             unit = "A"
-        vars_.append(Variable(name=symbol, address=addr, dtype=dtype, unit=unit, value=0.0))
-        if len(vars_) >= max_vars:
+        dtype = dtype_for_symbol(sym.name, sym.size)
+        vars_.append(Variable(name=sym.name, address=sym.address, dtype=dtype, unit=unit, value=0.0, size=sym.size))
+        if max_vars > 0 and len(vars_) >= max_vars:
             break
 
     return vars_
 
 
+def load_vars_from_map(
+    map_path: Path, prefixes: Sequence[str], max_vars: int, min_addr: int, cache_dir: Optional[Path] = None
+) -> List[Variable]:
+    index, _hit = load_symbol_index(map_path, cache_dir)
+    return vars_from_symbols(index, prefixes, max_vars, min_addr)
+
+
 def default_vars() -> List[Variable]:
     return [
-        Variable("g_motor_speed", 0x20001000, DataType.Float32, 1.0, "rpm", 1200.0),
-        Variable("g_bus_voltage", 0x20001004, DataType.Float32, 1.0, "V", 24.2),
-        Variable("g_temp", 0x20001008, DataType.Float32, 1.0, "C", 36.5),
-        Variable("g_iq_ref", 0x2000100C, DataType.Float32, 1.0, "A", 1.2),
+        Variable("g_motor_speed", 0x20001000, DataType.Float32, 1.0, "rpm", 1200.0, 4),
+        Variable("g_bus_voltage", 0x20001004, DataType.Float32, 1.0, "V", 24.2, 4),
+        Variable("g_temp", 0x20001008, DataType.Float32, 1.0, "C", 36.5, 4),
+        Variable("g_iq_ref", 0x2000100C, DataType.Float32, 1.0, "A", 1.2, 4),
+        Variable("g_u2_adc_buf", 0x20001010, DataType.UInt16, 1.0, "raw", 2048.0, 512),
     ]
 
 
@@ -202,65 +239,182 @@ def encode_var_table_text(vars_: Sequence[Variable]) -> bytes:
     return text.encode("ascii", errors="ignore")[:1024]
 
 
+_VAR_DESC_HEAD = struct.Struct("<IBHfBB")
+
+
+def encode_var_desc(v: Variable) -> bytes:
+    name = v.name.encode("ascii", errors="ignore")[:64]
+    unit = v.unit.encode("ascii", errors="ignore")[:16]
+    return _VAR_DESC_HEAD.pack(v.address, int(v.dtype), v.array_size, float(v.scale), len(unit), len(name)) + unit + name
+
+
+def var_table_hash(entries: Sequence[bytes]) -> int:
+    """64-bit digest of the encoded table; hosts compare it to skip re-downloading."""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(struct.pack("<BI", VAR_TABLE_FORMAT, len(entries)))
+    for entry in entries:
+        h.update(entry)
+    return int.from_bytes(h.digest(), "little")
+
+
 def encode_var_table_binary(vars_: Sequence[Variable]) -> bytes:
-    out = bytearray()
-    out.extend(struct.pack("<H", len(vars_)))
+    """Legacy single-frame table: as many entries as fit in one payload."""
+    out = bytearray(2)
+    count = 0
     for v in vars_:
-        name = v.name.encode("ascii", errors="ignore")[:64]
-        unit = v.unit.encode("ascii", errors="ignore")[:16]
-        item = bytearray()
-        item.extend(struct.pack("<I", v.address))
-        item.append(int(v.dtype))
-        item.extend(struct.pack("<H", 1))
-        item.extend(struct.pack("<f", float(v.scale)))
-        item.append(len(unit))
-        item.append(len(name))
-        item.extend(unit)
-        item.extend(name)
-        if len(out) + len(item) > 1024:
+        item = encode_var_desc(v)
+        if len(out) + len(item) > MAX_PAYLOAD:
             break
         out.extend(item)
-    # patch count based on actual encoded entries
-    encoded_count = 0
-    idx = 2
-    while idx < len(out):
-        if idx + 4 + 1 + 2 + 4 + 1 + 1 > len(out):
-            break
-        unit_len = out[idx + 11]
-        name_len = out[idx + 12]
-        step = 13 + unit_len + name_len
-        if idx + step > len(out):
-            break
-        encoded_count += 1
-        idx += step
-    struct.pack_into("<H", out, 0, encoded_count)
+        count += 1
+    struct.pack_into("<H", out, 0, count)
     return bytes(out)
 
 
-def encode_readmem_text(values: Sequence[Variable]) -> bytes:
-    text = ",".join(f"0x{v.address:08X}={v.value:.6f}" for v in values)
-    return text.encode("ascii", errors="ignore")[:1024]
-
-
-def encode_readmem_binary(values: Sequence[Variable]) -> bytes:
-    out = bytearray()
-    out.extend(struct.pack("<H", len(values)))
-    for v in values:
-        if v.dtype in (DataType.UInt8, DataType.Int8):
-            raw = struct.pack("<B", int(v.value) & 0xFF)
-        elif v.dtype in (DataType.UInt16, DataType.Int16):
-            raw = struct.pack("<H", int(v.value) & 0xFFFF)
-        elif v.dtype in (DataType.UInt32, DataType.Int32):
-            raw = struct.pack("<I", int(v.value) & 0xFFFFFFFF)
-        elif v.dtype == DataType.Float64:
-            raw = struct.pack("<d", float(v.value))
-        else:
-            raw = struct.pack("<f", float(v.value))
-        item = struct.pack("<IH", v.address, len(raw)) + raw
-        if len(out) + len(item) > 1024:
+def encode_var_table_pages(entries: Sequence[bytes], table_hash: int, offset: int, max_count: int) -> List[bytes]:
+    """``GET_VAR_TABLE_PAGE`` reply: entries ``[offset, offset+max_count)`` packed into as many frames as needed."""
+    total = len(entries)
+    end = min(total, offset + max_count)
+    pages: List[bytes] = []
+    i = min(offset, total)
+    while True:
+        out = bytearray(VAR_TABLE_PAGE_HEAD.size)
+        start = i
+        while i < end and len(out) + len(entries[i]) <= MAX_PAYLOAD:
+            out.extend(entries[i])
+            i += 1
+        VAR_TABLE_PAGE_HEAD.pack_into(out, 0, table_hash, total, start, i - start)
+        pages.append(bytes(out))
+        if i >= end:
+            return pages
+
+
+def encode_readmem_text(items: Sequence[tuple[int, float]], max_frames: int = READMEM_MAX_FRAMES) -> List[bytes]:
+    """Split ``addr=value`` pairs over frames; every part but the last ends with ``,``."""
+    parts: List[bytes] = []
+    cur = bytearray()
+    for addr, value in items:
+        seg = f"0x{addr:08X}={value:.6f}".encode("ascii")
+        if cur and len(cur) + 1 + len(seg) > MAX_PAYLOAD - 1:
+            if len(parts) + 1 >= max_frames:
+                break
+            cur.extend(b",")
+            parts.append(bytes(cur))
+            cur = bytearray()
+        if cur:
+            cur.extend(b",")
+        cur.extend(seg)
+    parts.append(bytes(cur))
+    return parts
+
+
+def dtype_size(dtype: DataType) -> int:
+    return CODECS[dtype].size
+
+
+def pack_value(dtype: DataType, value: float) -> bytes:
+    return CODECS[dtype].pack(value)
+
+
+def unpack_value(dtype: DataType, raw) -> float:
+    return CODECS[dtype].unpack(raw)
+
+
+def compile_var_source(v: Variable, idx: int, step: float) -> Callable[[float], bytes]:
+    """Bytes of ``v`` at time ``t``, with the waveform and codec looked up once.
+
+    An array variable holds the last ``array_size`` samples of its waveform, ``step`` seconds
+    apart and oldest first (like a DMA'd ADC buffer), packed with one ``pack_array`` call.
+    """
+    gen = compile_generator(v.name, idx)
+    codec = CODECS[v.dtype]
+    count = v.array_size
+    if count <= 1:
+        pack = codec.packer()
+        return lambda t: pack(gen(t))
+    pack_array = codec.pack_array
+    offsets = [(k - count + 1) * step for k in range(count)]
+    return lambda t: pack_array([gen(t + d) for d in offsets])
+
+
+def compile_generator(name: str, idx: int) -> Callable[[float], float]:
+    """Classify a variable by name once and return its value-over-time function."""
+    lname = name.lower()
+    two_pi = 2 * math.pi
+    if "speed" in lname:
+        base, amp, omega, phase = 1500.0, 220.0, two_pi * 0.4, 0.0
+    elif "temp" in lname:
+        base, amp, omega, phase = 35.0, 4.0, two_pi * 0.02, float(idx)
+    elif "volt" in lname:
+        base, amp, omega, phase = 24.0, 0.6, two_pi * 0.7, 0.0
+    elif "curr" in lname or "iq" in lname:
+        base, amp, omega, phase = 1.2, 0.25, two_pi * 1.2, float(idx)
+    elif "adc" in lname:
+        base, amp, omega, phase = 2048.0, 1200.0, two_pi * 5.0, float(idx)
+    else:
+        base, amp, omega, phase = 0.0, 0.5, two_pi * 0.5, float(idx)
+    sin = math.sin
+    return lambda t: base + amp * sin(omega * t + phase)
+
+
+def encode_readmem_binary(items: Sequence[tuple[int, Buffer]], max_frames: int = READMEM_MAX_FRAMES) -> List[bytes]:
+    """Encode read items over as many frames as needed.
+
+    Items never straddle frames unless one alone is larger than a frame, in which case it is
+    sent as consecutive ``(addr + offset, chunk)`` items. Multi-frame replies get the
+    ``READMEM_TRAILER`` on every part; a reply that fits in one frame keeps the legacy layout.
+    """
+    room = MAX_PAYLOAD - READMEM_TRAILER.size
+    parts: List[bytearray] = []
+    out = bytearray(2)
+    count = 0
+    full = False
+    for addr, raw in items:
+        view = memoryview(raw)
+        size = len(view)
+        off = 0
+        while True:
+            rest = size - off
+            free = room - len(out) - 6
+            if rest > free and (free < 1 or (count and 8 + rest <= room)):
+                # Start a new frame rather than split an item that fits in one.
+                if len(parts) + 1 >= max_frames:
+                    full = True
+                    break
+                struct.pack_into("<H", out, 0, count)
+                parts.append(out)
+                out = bytearray(2)
+                count = 0
+                continue
+            n = min(rest, free)
+            out.extend(struct.pack("<IH", addr + off, n))
+            out.extend(view[off : off + n])
+            count += 1
+            off += n
+            if off >= size:
+                break
+        if full:
             break
-        out.extend(item)
-    return bytes(out)
+    struct.pack_into("<H", out, 0, count)
+    parts.append(out)
+    if len(parts) > 1:
+        last = len(parts) - 1
+        for i, part in enumerate(parts):
+            part.extend(READMEM_TRAILER.pack(i & 0xFF, READMEM_FLAG_LAST if i == last else 0))
+    return [bytes(p) for p in parts]
+
+
+def coalesce_reads(reqs: Sequence[tuple[int, int]]) -> List[tuple[int, int, List[tuple[int, int]]]]:
+    """Group consecutive requests whose ranges abut into ``(start, size, items)`` range reads."""
+    groups: List[tuple[int, int, List[tuple[int, int]]]] = []
+    for addr, size in reqs:
+        if size and groups and groups[-1][1] and groups[-1][0] + groups[-1][1] == addr:
+            start, total, items = groups[-1]
+            items.append((addr, size))
+            groups[-1] = (start, total + size, items)
+        else:
+            groups.append((addr, size, [(addr, size)]))
+    return groups
 
 
 def parse_readmem_req(payload: bytes) -> List[tuple[int, int]]:
@@ -302,45 +456,293 @@ def parse_writemem(payload: bytes) -> List[tuple[int, bytes]]:
     return wrs
 
 
+SCHED_POLICIES = ("catchup", "drop")
+
+
+def wait_until(deadline: float, spin_s: float = 0.0):
+    """Sleep until ``deadline`` (perf_counter); busy-wait the last ``spin_s`` for precision."""
+    remaining = deadline - time.perf_counter()
+    if remaining > spin_s:
+        time.sleep(remaining - spin_s)
+    if spin_s > 0:
+        while time.perf_counter() < deadline:
+            pass
+
+
+class StatsSink:
+    """Destination for JSON stats lines: a file (appended) or ``udp://host:port`` datagrams."""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        self._file = None
+        self._sock: Optional[socket.socket] = None
+        self._addr: Optional[Tuple[str, int]] = None
+        if spec.startswith("udp://"):
+            host, _, port = spec[len("udp://") :].rpartition(":")
+            self._addr = (host or "127.0.0.1", int(port))
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+        else:
+            path = Path(spec)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, line: str):
+        if self._sock is not None:
+            try:
+                self._sock.sendto(line.encode("utf-8"), self._addr)
+            except OSError:
+                # Nobody listening or the socket buffer is full: stats are best effort.
+                pass
+        else:
+            self._file.write(line + "\n")
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+        if self._file is not None:
+            self._file.close()
+
+
 class UartMcuSim:
-    def __init__(self, args: argparse.Namespace):
+    def __init__(self, args: argparse.Namespace, transport: Optional[Transport] = None):
         self.args = args
-        self.port = serial.Serial(args.port, args.baud, timeout=0.01, write_timeout=0.05)
-        self.rx_buf = bytearray()
+        max_batch = args.tx_batch_bytes
+        if transport is None:
+            if args.transport == "serial":
+                # A batch must leave the UART before the write timeout fires: cap it to the line
+                # time the timeout allows and stretch the timeout when one frame needs longer.
+                max_batch, write_timeout = serial_write_budget(
+                    args.baud, args.tx_batch_bytes, HEADER_SIZE + MAX_PAYLOAD + CRC_SIZE, args.uart_bits
+                )
+                transport = open_transport(
+                    args.transport, args.port, args.baud, device=True, write_timeout=write_timeout
+                )
+            else:
+                transport = open_transport(args.transport, args.port, args.baud, device=True)
+        self.line: Optional[PacedTransport] = None
+        if args.pace_line:
+            # Model the UART wire and TX FIFO on links that would otherwise run at memory speed.
+            self.line = PacedTransport(
+                transport,
+                args.baud,
+                fifo_bytes=args.tx_fifo_bytes,
+                bits_per_byte=args.uart_bits,
+                write_timeout=args.tx_fifo_timeout_ms / 1000.0 if args.tx_fifo_timeout_ms > 0 else None,
+            )
+            transport = self.line
+        self.port = transport
+        self.rx_parser = FrameParser()
         self.tx_seq = 1
         self.stream_enabled = args.auto_stream
         self.running = True
-        self.stats_tx_frames = 0
         self.stats_rx_frames = 0
         self.stats_crc_err = 0
         self.last_stat_print = time.perf_counter()
         self.start_time = time.perf_counter()
+        # Maps scheduler (perf_counter) time to the wall-clock ts_us carried in stream frames.
+        self.epoch_us = time.time() * 1_000_000 - self.start_time * 1_000_000
+        self.sched_policy = args.sched_policy
+        self.sched_wake = max(0.0, args.sched_wake_ms) / 1000.0
+        self.sched_spin = max(0.0, args.sched_spin_us) / 1_000_000.0
+        self.sched_max_late = max(0.0, args.sched_max_late_ms) / 1000.0
+        self.sched_max_burst = max(1, args.sched_max_burst)
+        self.sched_ticks = 0
+        self.sched_skipped = 0
+        self.sched_wakes = 0
+        self.sched_late = LogHistogram(1e-7, 100.0)
+        self._last_sched_ticks = 0
         self.channel_count = max(1, args.channels)
         self.stream_hz = max(1.0, args.stream_hz)
-        self.drop_rate = max(0.0, min(1.0, args.drop_rate))
-        self.crc_error_rate = max(0.0, min(1.0, args.crc_error_rate))
+        self.stream_flags = STREAM_FLAG_PACKED if args.packed_stream else 0
+        self.pack_latency = max(0.0, args.pack_latency_ms) / 1000.0
+        self.pack_buf = bytearray(MAX_PAYLOAD)
+        self.pack_mask = b""
+        self.pack_max_ticks = 1
+        self.pack_channels = 0
+        self.pack_ticks = 0
+        self.pack_tick0 = 0
+        self.pack_ts_us = 0
+        self.pack_period_us = 0
+        self.pack_started = 0.0
+        self.signal = SignalEngine(args.waveform)
+        self.replay = None
+        self.replay_loops = 0
+        self.replay_events = 0
+        if args.replay:
+            self.replay = open_replay(Path(args.replay), args.baud)
+            if not isinstance(self.replay, RawReplay):
+                # Decoded capture: recorded samples go through the normal stream encoders.
+                self.signal = self.replay
+                self.channel_count = self.replay.channel_count
+                self.stream_hz = self.replay.nominal_hz() * (args.replay_speed if args.replay_speed > 0 else 1.0)
+        self._tick_struct_cache = None
+        self._vofa_fmt_cache = None
+        self.jf_buf = bytearray()
+        self.faults = FaultEngine(self._fault_rules(), args.fault_seed, self.start_time)
         self.var_table_format = args.var_table_format
         self.readmem_format = args.readmem_format
+        self.stats_sink = StatsSink(args.stats_out) if args.stats_out else None
+        # Stage timing costs two clock reads per stage; only pay it when someone reads the JSON.
+        self.stages = StageTimer() if args.stats_format == "json" or self.stats_sink else None
+        self.symbols = SymbolIndex([])
         self.vars = self._build_vars()
         self.var_by_addr: Dict[int, Variable] = {v.address: v for v in self.vars}
-        self.write_timeout_count = 0
+        # The table is fixed after load: encode every descriptor once and hash the result.
+        self.var_descs = [encode_var_desc(v) for v in self.vars]
+        self.var_table_hash = var_table_hash(self.var_descs)
+        self.mem = SparseMemory()
+        self._init_memory()
+        # Per-variable time-to-bytes sources, compiled once. Values are produced lazily when a read
+        # touches them; a host write removes the entry so the written bytes stick.
+        self.var_resolution = max(1e-6, args.var_update_ms / 1000.0)
+        self.var_gens: Dict[int, Callable[[float], bytes]] = {
+            v.address: compile_var_source(v, idx, self.var_resolution) for idx, v in enumerate(self.vars)
+        }
+        self._var_memo: Dict[int, int] = {}
+        # Held while a generator's bytes are computed and stored and while a host write pops the
+        # generator: the stream thread (watch) and the RX thread (WRITE_MEM) both get here.
+        self.var_lock = threading.Lock()
+        # On a line-rate link a write holds the line for its whole length, and a reply queued
+        # meanwhile waits for it: keep stream batches to a few ms of line time.
+        stream_batch = None
+        if args.pace_line or args.transport == "serial":
+            stream_batch = max(1, line_bytes(args.baud, args.tx_stream_batch_ms / 1000.0, args.uart_bits))
+        self.tx = TxWriter(
+            self.port,
+            max_items=args.tx_queue,
+            max_batch=max_batch,
+            policy=args.tx_policy,
+            block_timeout=args.tx_block_timeout,
+            finalize=self._finalize_tx,
+            control_items=args.tx_control_queue,
+            stages=self.stages,
+            stream_batch=stream_batch,
+        )
+        self.watch: List[WatchEntry] = []
+        self.watch_sent = 0
+        self.watch_suppressed = 0
+        self.busy_threshold = max(0, args.busy_threshold)
+        self.busy_replies = 0
+        self._last_tx_frames = 0
+
+    def _fault_rules(self) -> List[FaultRule]:
+        rules = []
+        # The legacy rate options are shorthands for the matching profile rules.
+        drop_rate = max(0.0, min(1.0, self.args.drop_rate))
+        crc_error_rate = max(0.0, min(1.0, self.args.crc_error_rate))
+        if drop_rate > 0:
+            rules.append(FaultRule("drop", p=drop_rate))
+        if crc_error_rate > 0:
+            rules.append(FaultRule("flip", p=crc_error_rate, region="payload"))
+        rules.extend(self.args.fault_profile or [])
+        return rules
 
     def _build_vars(self) -> List[Variable]:
         if self.args.map_file:
             try:
-                vars_ = load_vars_from_map(
-                    Path(self.args.map_file),
+                map_path = Path(self.args.map_file)
+                cache_dir = Path(self.args.map_cache_dir) if self.args.map_cache_dir else None
+                t0 = time.perf_counter()
+                index, hit = load_symbol_index(map_path, cache_dir)
+                dt_ms = (time.perf_counter() - t0) * 1000.0
+                print(
+                    f"[SIM] map index: {len(index)} symbols in {dt_ms:.1f} ms "
+                    f"({'cache hit' if hit else 'parsed'})"
+                )
+                vars_ = vars_from_symbols(
+                    index,
                     [p.strip() for p in self.args.map_prefix.split(",") if p.strip()],
                     self.args.map_max_vars,
                     self.args.map_min_addr,
                 )
                 if vars_:
                     print(f"[SIM] loaded {len(vars_)} vars from map: {self.args.map_file}")
+                    self.symbols = index
                     return vars_
                 print("[SIM] map parsed but no matching vars found, fallback to defaults")
             except Exception as ex:
                 print(f"[SIM] map parse failed: {ex}, fallback to defaults")
-        return default_vars()
+        vars_ = default_vars()
+        self.symbols = SymbolIndex.from_variables(vars_)
+        return vars_
+
+    def _init_memory(self):
+        image_addrs = set()
+        if self.args.mem_image:
+            path, base = self.args.mem_image
+            size = self.mem.map_image(Path(path), base)
+            print(f"[SIM] mapped memory image {path}: {size} bytes @0x{base:08X}")
+            image_addrs = {v.address for v in self.vars if self.mem.is_mapped(v.address)}
+        for v in self.vars:
+            # Image contents win over the built-in initial values.
+            if v.address not in image_addrs:
+                self.mem.write(v.address, pack_value(v.dtype, v.value) * v.array_size)
+
+    def var_value(self, v: Variable) -> float:
+        return unpack_value(v.dtype, self.mem.read(v.address, dtype_size(v.dtype)))
+
+    def refresh_vars(self, addr: int, size: int):
+        """Evaluate the generators of variables overlapping ``[addr, addr+size)`` for the current time step."""
+        gens = self.var_gens
+        if not gens:
+            return
+        stamp = int((time.perf_counter() - self.start_time) / self.var_resolution)
+        t = stamp * self.var_resolution
+        memo = self._var_memo
+        with self.var_lock:
+            for sym in self.symbols.overlapping(addr, size):
+                a = sym.address
+                gen = gens.get(a)
+                if gen is None or memo.get(a) == stamp:
+                    continue
+                memo[a] = stamp
+                self.mem.write(a, gen(t))
+
+    def refresh_all_vars(self):
+        for v in self.vars:
+            self.refresh_vars(v.address, 1)
+
+    def is_backed(self, addr: int) -> bool:
+        """Whether a symbol, page or image backs ``addr``; unbacked items are left out of replies."""
+        return self.symbols.lookup(addr) is not None or self.mem.is_mapped(addr)
+
+    def read_mem(self, addr: int, size: int) -> Optional[Buffer]:
+        """Bytes for one READ_MEM_BATCH item, or None for an address nothing backs."""
+        if size == 0:
+            # Size 0 means "the rest of the containing symbol".
+            hit = self.symbols.lookup(addr)
+            if hit is None:
+                return None
+            size = hit[0].end - addr
+        elif not self.is_backed(addr):
+            return None
+        self.refresh_vars(addr, size)
+        return self.mem.read(addr, size)
+
+    def read_items(self, reqs: Sequence[tuple[int, int]]) -> List[tuple[int, Buffer]]:
+        """``(addr, bytes)`` per backed READ_MEM_BATCH request, in request order."""
+        items = []
+        for start, total, group in coalesce_reads(reqs):
+            # One range read per run of abutting requests, sliced back per request.
+            buf = self.read_mem(start, total) if len(group) > 1 else None
+            if buf is None:
+                for addr, size in group:
+                    raw = self.read_mem(addr, size)
+                    if raw is not None:
+                        items.append((addr, raw))
+                continue
+            for addr, size in group:
+                # Same rule as the per-item path, so coalescing never changes the reply.
+                if addr == start or self.is_backed(addr):
+                    items.append((addr, buf[addr - start : addr - start + size]))
+        return items
+
+    def write_mem(self, addr: int, raw: bytes):
+        with self.var_lock:
+            for sym in self.symbols.overlapping(addr, len(raw)):
+                self.var_gens.pop(sym.address, None)
+            self.mem.write(addr, raw)
 
     def next_seq(self) -> int:
         v = self.tx_seq
@@ -351,84 +753,313 @@ class UartMcuSim:
     def build_ack_payload(status: int, for_cmd: int, for_seq: int) -> bytes:
         return struct.pack("<BBH", status & 0xFF, for_cmd & 0xFF, for_seq & 0xFFFF)
 
+    @property
+    def write_timeout_count(self) -> int:
+        return self.tx.write_errors
+
+    def _finalize_tx(self, item) -> Optional[bytes]:
+        # Runs on the TX writer thread: seq is assigned in wire order.
+        if isinstance(item, tuple):
+            cmd, payload = item
+            seq = self.next_seq()
+            if self.stages is None:
+                frame = build_rforge_frame(cmd, seq, payload)
+            else:
+                t0 = time.perf_counter()
+                frame = build_rforge_frame(cmd, seq, payload)
+                self.stages.record("crc", time.perf_counter() - t0)
+            # A dropped frame still consumes its seq, as a frame lost on the wire would.
+            return self.faults.apply(frame, cmd) if self.faults else frame
+        return self.faults.apply(item) if self.faults else item
+
     def send_rforge(self, cmd: CommandId, payload: bytes):
-        if self.drop_rate > 0 and random.random() < self.drop_rate:
+        lane = LANE_STREAM if cmd == CommandId.StreamData else LANE_CONTROL
+        # Copy: payload may be a view into a reused buffer, and the frame is built later.
+        self.tx.submit((int(cmd), bytes(payload)), len(payload) + 10, lane)
+
+    def _tick_struct(self, nch: int) -> struct.Struct:
+        if self._tick_struct_cache is None or self._tick_struct_cache[0] != nch:
+            self._tick_struct_cache = (nch, struct.Struct("<Q" + "Hf" * nch), [0] * (2 * nch))
+            self._tick_struct_cache[2][0::2] = range(nch)
+        return self._tick_struct_cache[1]
+
+    def ts_us(self, t_sched: float) -> int:
+        return int(self.epoch_us + t_sched * 1_000_000)
+
+    def send_stream_frame(self, tick: int, t_sched: float):
+        nch = self.channel_count
+        self.signal.configure(nch, self.stream_hz)
+        packer = self._tick_struct(nch)
+        items = self._tick_struct_cache[2]
+        stages = self.stages
+        t0 = time.perf_counter() if stages is not None else 0.0
+        items[1::2] = self.signal.tick_values(tick)
+        if stages is not None:
+            t1 = time.perf_counter()
+            stages.record("gen", t1 - t0)
+        payload = packer.pack(self.ts_us(t_sched), *items)
+        if stages is not None:
+            stages.record("pack", time.perf_counter() - t1)
+        self.send_rforge(CommandId.StreamData, payload)
+
+    def send_stream_packed(self, tick: int, t_sched: float):
+        """Add one tick to the pending packed frame and flush it when full or stale."""
+        nch = self.channel_count
+        period_us = int(round(1_000_000 / self.stream_hz))
+        if self.pack_ticks and (nch != self.pack_channels or period_us != self.pack_period_us):
+            self.flush_stream_packed()
+        if self.pack_ticks == 0:
+            self.pack_channels = nch
+            self.pack_period_us = period_us
+            self.pack_mask = channel_mask(range(nch))
+            self.pack_max_ticks = packed_stream_max_ticks(nch, len(self.pack_mask))
+            self.pack_tick0 = tick
+            self.pack_ts_us = self.ts_us(t_sched)
+            self.pack_started = t_sched
+        self.pack_ticks += 1
+        if self.pack_ticks >= self.pack_max_ticks or t_sched - self.pack_started >= self.pack_latency:
+            self.flush_stream_packed()
+
+    def flush_stream_packed(self):
+        ticks = self.pack_ticks
+        if ticks == 0:
             return
-        pkt = build_rforge_frame(int(cmd), self.next_seq(), payload, self.crc_error_rate)
-        try:
-            self.port.write(pkt)
-            self.stats_tx_frames += 1
-        except serial.SerialTimeoutException:
-            # Backpressure is expected at high stream rates; keep simulator alive.
-            self.write_timeout_count += 1
-        except serial.SerialException:
-            self.write_timeout_count += 1
-
-    def send_stream_frame(self):
-        t = time.perf_counter() - self.start_time
-        ts_us = int(time.time() * 1_000_000)
-        payload = bytearray(struct.pack("<Q", ts_us))
-        for ch in range(self.channel_count):
-            base = math.sin(2 * math.pi * (0.8 + ch * 0.11) * t)
-            mod = 0.35 * math.sin(2 * math.pi * 0.07 * t + ch * 0.2)
-            value = 0.7 * base + mod + ch * 0.03
-            payload.extend(struct.pack("<Hf", ch, value))
-        self.send_rforge(CommandId.StreamData, bytes(payload))
-
-    def send_stream_vofa(self):
-        t = time.perf_counter() - self.start_time
-        vals = []
-        for ch in range(self.channel_count):
-            base = math.sin(2 * math.pi * (0.8 + ch * 0.11) * t)
-            mod = 0.35 * math.sin(2 * math.pi * 0.07 * t + ch * 0.2)
-            vals.append(f"{0.7 * base + mod + ch * 0.03:.6f}")
-        line = ",".join(vals) + "\n"
-        if self.drop_rate == 0.0 or random.random() >= self.drop_rate:
-            try:
-                self.port.write(line.encode("ascii"))
-                self.stats_tx_frames += 1
-            except serial.SerialTimeoutException:
-                self.write_timeout_count += 1
-            except serial.SerialException:
-                self.write_timeout_count += 1
+        self.pack_ticks = 0
+        nch = self.pack_channels
+        mask = self.pack_mask
+        head = PACKED_STREAM_HEAD.size + len(mask)
+        size = head + 4 * ticks * nch
+        buf = self.pack_buf
+        stages = self.stages
+        t0 = time.perf_counter() if stages is not None else 0.0
+        PACKED_STREAM_HEAD.pack_into(buf, 0, self.pack_ts_us, self.pack_period_us, ticks, len(mask))
+        buf[PACKED_STREAM_HEAD.size : head] = mask
+        self.signal.configure(nch, 1_000_000 / self.pack_period_us)
+        with memoryview(buf) as view:
+            if stages is not None:
+                t1 = time.perf_counter()
+                stages.record("pack", t1 - t0)
+            # Render the whole block of ticks x channels straight into the payload buffer.
+            with view[head:size].cast("f") as values:
+                self.signal.render(self.pack_tick0, ticks, values)
+            if stages is not None:
+                stages.record("gen", time.perf_counter() - t1)
+            self.send_rforge(CommandId.StreamData, view[:size])
+
+    def send_stream_vofa(self, tick: int):
+        nch = self.channel_count
+        self.signal.configure(nch, self.stream_hz)
+        if self._vofa_fmt_cache is None or self._vofa_fmt_cache[0] != nch:
+            self._vofa_fmt_cache = (nch, ",".join(["%.6f"] * nch) + "\n")
+        stages = self.stages
+        t0 = time.perf_counter() if stages is not None else 0.0
+        values = tuple(self.signal.tick_values(tick))
+        if stages is not None:
+            t1 = time.perf_counter()
+            stages.record("gen", t1 - t0)
+        data = (self._vofa_fmt_cache[1] % values).encode("ascii")
+        if stages is not None:
+            stages.record("pack", time.perf_counter() - t1)
+        self.tx.submit(data, len(data), LANE_STREAM)
+
+    def send_stream_justfloat(self, tick: int):
+        """One VOFA+ JustFloat frame: float32 per channel rendered in place, then the tail."""
+        nch = self.channel_count
+        self.signal.configure(nch, self.stream_hz)
+        size = 4 * nch + len(JUSTFLOAT_TAIL)
+        if len(self.jf_buf) != size:
+            self.jf_buf = bytearray(size)
+            self.jf_buf[4 * nch :] = JUSTFLOAT_TAIL
+        stages = self.stages
+        t0 = time.perf_counter() if stages is not None else 0.0
+        with memoryview(self.jf_buf) as view, view[: 4 * nch].cast("f") as values:
+            self.signal.render(tick, 1, values)
+        if stages is not None:
+            stages.record("gen", time.perf_counter() - t0)
+        # Copy: the buffer is reused for the next tick while this one waits in the queue.
+        self.tx.submit(bytes(self.jf_buf), size, LANE_STREAM)
+
+    def emit_tick(self, tick: int, t_sched: float):
+        if self.args.protocol == "justfloat":
+            self.send_stream_justfloat(tick)
+        elif self.args.protocol != "rforge":
+            self.send_stream_vofa(tick)
+        elif self.stream_flags & STREAM_FLAG_PACKED:
+            self.send_stream_packed(tick, t_sched)
+        else:
+            self.flush_stream_packed()
+            self.send_stream_frame(tick, t_sched)
+        if self.watch and self.args.protocol == "rforge":
+            self.send_watch(tick, t_sched)
+
+    def build_watch(self, payload: bytes) -> Optional[List[WatchEntry]]:
+        """Resolve a SET_WATCH_LIST payload against the var table; None if any entry is invalid."""
+        items = decode_watch_list(payload)
+        if items is None:
+            return None
+        entries = []
+        for addr, divisor, deadband in items:
+            hit = self.symbols.lookup(addr)
+            v = self.var_by_addr.get(hit[0].address) if hit is not None else None
+            if v is None or divisor == 0 or hit[1] + CODECS[v.dtype].size > hit[0].end - hit[0].address:
+                return None
+            # An address inside an array variable watches that element.
+            entries.append(WatchEntry(addr, CODECS[v.dtype], divisor, max(0.0, deadband)))
+        return entries
+
+    def send_watch(self, tick: int, t_sched: float):
+        """Push the watch entries due on ``tick`` as one sparse STREAM_DATA frame."""
+        pairs = []
+        for i, w in enumerate(self.watch):
+            if tick % w.divisor:
+                continue
+            size = w.codec.size
+            self.refresh_vars(w.address, size)
+            value = w.codec.unpack(self.mem.read(w.address, size))
+            if w.deadband > 0 and w.last is not None and abs(value - w.last) <= w.deadband:
+                self.watch_suppressed += 1
+                continue
+            w.last = value
+            pairs.append((WATCH_CHANNEL_BASE + i, value))
+        if pairs:
+            self.watch_sent += len(pairs)
+            self.send_rforge(CommandId.StreamData, encode_sparse_stream(self.ts_us(t_sched), pairs))
 
     def stream_worker(self):
-        period = 1.0 / self.stream_hz
-        next_deadline = time.perf_counter()
+        """Emit ticks on an absolute schedule, waking at most every ``--sched-wake-ms``.
+
+        Each wake emits every tick that has come due, stamped with its scheduled time, so
+        rates above the sleep granularity keep their nominal spacing. When the worker falls
+        behind, ``catchup`` emits the debt (at most ``--sched-max-burst`` ticks per wake) and
+        ``drop`` skips ticks later than ``--sched-max-late-ms``; both are counted.
+        """
+        tick = 0
+        # Schedule anchor: tick ``base_tick`` is due at ``base_t``; re-anchored on rate changes.
+        base_t = 0.0
+        base_tick = 0
+        base_hz = 0.0
         while self.running:
-            if self.stream_enabled:
-                if self.args.protocol == "rforge":
-                    self.send_stream_frame()
+            now = time.perf_counter()
+            if not self.stream_enabled:
+                self.flush_stream_packed()
+                base_hz = 0.0
+                wait_until(now + max(self.sched_wake, 0.001))
+                continue
+            # Re-read every wake so SET_STREAM_CONFIG rate changes take effect immediately.
+            hz = self.stream_hz
+            if hz != base_hz:
+                base_t, base_tick, base_hz = now, tick, hz
+            period = 1.0 / hz
+            due = base_tick + int((now - base_t) * hz) + 1
+            if self.sched_policy == "drop" and due - tick > 1:
+                oldest = base_tick + math.ceil((now - self.sched_max_late - base_t) * hz)
+                if oldest > tick:
+                    self.sched_skipped += oldest - tick
+                    tick = oldest
+            stop = min(due, tick + self.sched_max_burst)
+            self.sched_wakes += 1
+            self.sched_ticks += max(0, stop - tick)
+            while tick < stop:
+                t_sched = base_t + (tick - base_tick) * period
+                self.emit_tick(tick, t_sched)
+                self.sched_late.record(now - t_sched)
+                tick += 1
+            if self.pack_ticks and now - self.pack_started >= self.pack_latency:
+                self.flush_stream_packed()
+            if tick < due:
+                # Catch-up debt left after a capped burst: go again without sleeping.
+                continue
+            next_wake = max(base_t + (tick - base_tick) * period, now + self.sched_wake)
+            if self.pack_ticks:
+                next_wake = min(next_wake, self.pack_started + self.pack_latency)
+            wait_until(next_wake, self.sched_spin)
+
+    def replay_worker(self):
+        """Stream ``--replay`` events on their recorded timeline, scaled by ``--replay-speed``.
+
+        Raw captures are resent byte for byte, one event per recorded frame; decoded captures
+        emit one tick per recorded sample through the active stream encoder. The timeline
+        loops ``--replay-loops`` times (0 = forever), each loop one mean event spacing after
+        the last, and pauses with the stream. Speed 0 sends as fast as the TX queue drains.
+        """
+        src = self.replay
+        raw = isinstance(src, RawReplay)
+        speed = self.args.replay_speed
+        count = src.count
+        if count == 0:
+            print("[SIM] replay: capture holds no events")
+            return
+        loop_us = src.span_us + (src.span_us / (count - 1) if count > 1 else 1000.0)
+        scale = 1.0 / (1e6 * speed) if speed > 0 else 0.0
+        i = 0
+        loop = 0
+        base_t = None
+        while self.running:
+            now = time.perf_counter()
+            if not self.stream_enabled:
+                self.flush_stream_packed()
+                base_t = None
+                wait_until(now + max(self.sched_wake, 0.001))
+                continue
+            if base_t is None:
+                # (Re)anchor so the next event is due now.
+                base_t = now - (loop * loop_us + src.t_us(i)) * scale
+            self.sched_wakes += 1
+            n = 0
+            while n < self.sched_max_burst:
+                # Full speed has no timeline: every event is stamped when it is sent.
+                t_sched = base_t + (loop * loop_us + src.t_us(i)) * scale if scale else now
+                if t_sched > now:
+                    break
+                if scale == 0.0 and self.tx.lane_depth(LANE_STREAM) >= self.tx.max_items:
+                    # Full speed: wait for room rather than let the queue policy drop events.
+                    break
+                if raw:
+                    data = src.event(i)
+                    self.tx.submit(bytes(data), len(data), LANE_STREAM)
                 else:
-                    self.send_stream_vofa()
-            next_deadline += period
-            delay = next_deadline - time.perf_counter()
-            if delay > 0:
-                time.sleep(delay)
-            else:
-                # If producer falls behind, drop schedule debt and continue.
-                next_deadline = time.perf_counter()
-
-    def tick_vars(self):
-        t = time.perf_counter() - self.start_time
-        for idx, v in enumerate(self.vars):
-            if "speed" in v.name.lower():
-                v.value = 1500 + 220 * math.sin(2 * math.pi * 0.4 * t)
-            elif "temp" in v.name.lower():
-                v.value = 35 + 4 * math.sin(2 * math.pi * 0.02 * t + idx)
-            elif "volt" in v.name.lower():
-                v.value = 24 + 0.6 * math.sin(2 * math.pi * 0.7 * t)
-            elif "curr" in v.name.lower() or "iq" in v.name.lower():
-                v.value = 1.2 + 0.25 * math.sin(2 * math.pi * 1.2 * t + idx)
+                    self.emit_tick(loop * count + i, t_sched)
+                self.sched_late.record(now - t_sched)
+                n += 1
+                i += 1
+                if i == count:
+                    i = 0
+                    loop += 1
+                    self.replay_loops = loop
+                    if self.args.replay_loops and loop >= self.args.replay_loops:
+                        break
+            self.sched_ticks += n
+            self.replay_events += n
+            if self.args.replay_loops and loop >= self.args.replay_loops:
+                self.flush_stream_packed()
+                print(f"[SIM] replay finished: {loop} loop(s), {self.replay_events} events")
+                return
+            if self.pack_ticks and now - self.pack_started >= self.pack_latency:
+                self.flush_stream_packed()
+            if n == self.sched_max_burst:
+                continue
+            if scale == 0.0:
+                next_wake = now + 0.0005
             else:
-                v.value = 0.5 * math.sin(2 * math.pi * 0.5 * t + idx)
+                next_wake = max(base_t + (loop * loop_us + src.t_us(i)) * scale, now + self.sched_wake)
+            if self.pack_ticks:
+                next_wake = min(next_wake, self.pack_started + self.pack_latency)
+            wait_until(next_wake, self.sched_spin)
 
     def on_frame(self, cmd: int, seq: int, payload: bytes):
         self.stats_rx_frames += 1
         if self.args.echo_rx:
             print(f"[RX] cmd=0x{cmd:02X} seq={seq} len={len(payload)}")
 
-        if cmd == CommandId.Ping:
+        if (
+            self.busy_threshold
+            and cmd in BUSY_GATED_COMMANDS
+            and self.tx.lane_depth(LANE_STREAM) > self.busy_threshold
+        ):
+            # Stream backlog is over the limit: tell the host to retry instead of queueing more.
+            self.busy_replies += 1
+            self.send_rforge(CommandId.Ack, self.build_ack_payload(3, cmd, seq))
+        elif cmd == CommandId.Ping:
             self.send_rforge(CommandId.Ack, self.build_ack_payload(0, cmd, seq))
         elif cmd == CommandId.StreamStart:
             self.stream_enabled = True
@@ -442,118 +1073,347 @@ class UartMcuSim:
             else:
                 payload_out = encode_var_table_text(self.vars)
             self.send_rforge(CommandId.GetVarTable, payload_out)
+        elif cmd == CommandId.GetVarTableInfo:
+            info = VAR_TABLE_INFO.pack(VAR_TABLE_FORMAT, 0, len(self.var_descs), self.var_table_hash)
+            self.send_rforge(CommandId.GetVarTableInfo, info)
+        elif cmd == CommandId.GetVarTablePage:
+            # One request streams the whole requested range back as consecutive page frames.
+            if len(payload) >= VAR_TABLE_PAGE_REQ.size:
+                offset, max_count = VAR_TABLE_PAGE_REQ.unpack_from(payload, 0)
+                for page in encode_var_table_pages(self.var_descs, self.var_table_hash, offset, max_count):
+                    self.send_rforge(CommandId.GetVarTablePage, page)
+            else:
+                self.send_rforge(CommandId.Ack, self.build_ack_payload(2, cmd, seq))
         elif cmd == CommandId.ReadMemBatch:
             reqs = parse_readmem_req(payload)
-            vals = []
-            for addr, _size in reqs:
-                if addr in self.var_by_addr:
-                    vals.append(self.var_by_addr[addr])
             if self.readmem_format == "binary":
-                payload_out = encode_readmem_binary(vals)
+                parts = encode_readmem_binary(self.read_items(reqs))
             else:
-                payload_out = encode_readmem_text(vals)
-            self.send_rforge(CommandId.ReadMemBatch, payload_out)
+                vals = []
+                for addr, _size in reqs:
+                    hit = self.symbols.lookup(addr)
+                    v = self.var_by_addr.get(hit[0].address) if hit is not None else None
+                    if v is not None:
+                        self.refresh_vars(v.address, 1)
+                        vals.append((v.address, self.var_value(v)))
+                parts = encode_readmem_text(vals)
+            for part in parts:
+                self.send_rforge(CommandId.ReadMemBatch, part)
         elif cmd == CommandId.WriteMem:
             for addr, raw in parse_writemem(payload):
-                if addr not in self.var_by_addr:
-                    continue
-
-                v = self.var_by_addr[addr]
-                try:
-                    if v.dtype == DataType.Int8 and len(raw) >= 1:
-                        v.value = float(struct.unpack_from("<b", raw, 0)[0])
-                    elif v.dtype == DataType.UInt8 and len(raw) >= 1:
-                        v.value = float(struct.unpack_from("<B", raw, 0)[0])
-                    elif v.dtype == DataType.Int16 and len(raw) >= 2:
-                        v.value = float(struct.unpack_from("<h", raw, 0)[0])
-                    elif v.dtype == DataType.UInt16 and len(raw) >= 2:
-                        v.value = float(struct.unpack_from("<H", raw, 0)[0])
-                    elif v.dtype == DataType.Int32 and len(raw) >= 4:
-                        v.value = float(struct.unpack_from("<i", raw, 0)[0])
-                    elif v.dtype == DataType.UInt32 and len(raw) >= 4:
-                        v.value = float(struct.unpack_from("<I", raw, 0)[0])
-                    elif v.dtype == DataType.Float64 and len(raw) >= 8:
-                        v.value = float(struct.unpack_from("<d", raw, 0)[0])
-                    elif len(raw) >= 4:
-                        v.value = float(struct.unpack_from("<f", raw, 0)[0])
-                except struct.error:
-                    pass
+                self.write_mem(addr, raw)
             self.send_rforge(CommandId.Ack, self.build_ack_payload(0, cmd, seq))
+        elif cmd == CommandId.SetWatchList:
+            entries = self.build_watch(payload)
+            if entries is None:
+                self.send_rforge(CommandId.Ack, self.build_ack_payload(2, cmd, seq))
+            else:
+                # Swapped whole, so the stream thread never sees a half-built list.
+                self.watch = entries
+                self.send_rforge(CommandId.Ack, self.build_ack_payload(0, cmd, seq))
         elif cmd == CommandId.SetStreamConfig:
             # v1 format: [channel_count:u8][reserved:u8][stream_hz:u16][flags:u16].
             if len(payload) >= 6:
                 self.channel_count = max(1, payload[0])
-                self.stream_hz = max(1.0, float(struct.unpack_from("<H", payload, 2)[0]))
+                if self.replay is None:
+                    # A replay keeps the recorded timing whatever rate the host asks for.
+                    self.stream_hz = max(1.0, float(struct.unpack_from("<H", payload, 2)[0]))
+                self.stream_flags = struct.unpack_from("<H", payload, 4)[0]
                 self.send_rforge(CommandId.Ack, self.build_ack_payload(0, cmd, seq))
             elif len(payload) >= 2:
                 # Legacy fallback for early tools.
                 self.channel_count = max(1, payload[0])
-                self.stream_hz = max(1.0, float(payload[1]))
+                if self.replay is None:
+                    self.stream_hz = max(1.0, float(payload[1]))
                 self.send_rforge(CommandId.Ack, self.build_ack_payload(0, cmd, seq))
             else:
                 self.send_rforge(CommandId.Ack, self.build_ack_payload(2, cmd, seq))
         else:
             self.send_rforge(CommandId.Ack, self.build_ack_payload(1, cmd, seq))
 
+    def handle_rx(self, data: bytes):
+        stages = self.stages
+        if stages is None:
+            self.rx_parser.feed(data)
+            for cmd, seq, payload in self.rx_parser:
+                self.on_frame(cmd, seq, payload)
+            return
+        # Parse time is the chunk's total minus the time spent inside command handlers.
+        t_prev = time.perf_counter()
+        self.rx_parser.feed(data)
+        parse = 0.0
+        for cmd, seq, payload in self.rx_parser:
+            t1 = time.perf_counter()
+            parse += t1 - t_prev
+            self.on_frame(cmd, seq, payload)
+            t_prev = time.perf_counter()
+            stages.record("command", t_prev - t1)
+        stages.record("rx_parse", parse + time.perf_counter() - t_prev)
+
+    def stats_record(self, now: float, elapsed: float, tx_rate: float, rx_rate: float, tick_rate: float) -> dict:
+        return {
+            "t": round(now - self.start_time, 3),
+            "interval_s": round(elapsed, 3),
+            "tx_fps": round(tx_rate, 1),
+            "rx_fps": round(rx_rate, 1),
+            "stream": self.stream_enabled,
+            "stream_hz": self.stream_hz,
+            "channels": self.channel_count,
+            "busy": self.busy_replies,
+            "vars": len(self.vars),
+            "sched": {
+                "policy": self.sched_policy,
+                "requested_hz": self.stream_hz,
+                "achieved_hz": round(tick_rate, 1),
+                "ticks": self.sched_ticks,
+                "skipped": self.sched_skipped,
+                "wakes": self.sched_wakes,
+                "late_ms": self.sched_late.summary(scale=1e3),
+            },
+            "tx": self.tx.snapshot(),
+            "line": self.line.snapshot() if self.line is not None else None,
+            "replay": (
+                {"events": self.replay_events, "loops": self.replay_loops, "speed": self.args.replay_speed}
+                if self.replay is not None
+                else None
+            ),
+            "faults": self.faults.snapshot() if self.faults else None,
+            "watch": {"entries": len(self.watch), "sent": self.watch_sent, "suppressed": self.watch_suppressed},
+            "stages_us": self.stages.snapshot(elapsed) if self.stages is not None else {},
+        }
+
     def print_stats(self):
         now = time.perf_counter()
-        if now - self.last_stat_print < 1.0:
+        if now - self.last_stat_print < self.args.stats_interval:
             return
         elapsed = now - self.last_stat_print
-        tx_rate = self.stats_tx_frames / elapsed
+        tx_frames = self.tx.frames_out
+        tx_rate = (tx_frames - self._last_tx_frames) / elapsed
         rx_rate = self.stats_rx_frames / elapsed
+        sched_ticks = self.sched_ticks
+        tick_rate = (sched_ticks - self._last_sched_ticks) / elapsed
+        self._last_sched_ticks = sched_ticks
+        self._last_tx_frames = tx_frames
+        self.stats_rx_frames = 0
+        self.last_stat_print = now
+        fmt = self.args.stats_format
+        if self.stats_sink is not None or fmt == "json":
+            line = json.dumps(self.stats_record(now, elapsed, tx_rate, rx_rate, tick_rate), separators=(",", ":"))
+            if self.stats_sink is not None:
+                self.stats_sink.write(line)
+            if fmt == "json" and not self.args.quiet:
+                print(line)
+        if self.args.quiet or fmt != "text":
+            return
         print(
             f"[SIM] tx={tx_rate:7.1f} fps  rx={rx_rate:6.1f} fps  "
             f"stream={'on' if self.stream_enabled else 'off'}  "
+            f"hz={tick_rate:.0f}/{self.stream_hz:.0f}  "
+            f"skip={self.sched_skipped}  "
             f"wto={self.write_timeout_count}  "
+            f"q={self.tx.depth}/{self.tx.max_items}  "
+            f"coal={self.tx.frames_out / max(1, self.tx.writes):4.1f}  "
+            f"drop={self.tx.dropped_oldest + self.tx.dropped_newest + self.tx.block_timeouts + self.tx.control_drops}  "
+            f"ctl_p95={self.tx.lane_latency[LANE_CONTROL].summary(scale=1e3)['p95'] or 0:.2f}ms  "
+            f"busy={self.busy_replies}  "
             f"vars={len(self.vars)}"
+            + (
+                f"  line={self.line.busy_s / max(1e-9, now - self.line.started) * 100:3.0f}%  "
+                f"fifo={self.line.fill}/{self.line.fifo_bytes}  ovf={self.line.overflows}"
+                if self.line is not None
+                else ""
+            )
+            + (f"  faults={self.faults.frames_hit}/{self.faults.frames}" if self.faults else "")
         )
-        self.stats_tx_frames = 0
-        self.stats_rx_frames = 0
-        self.last_stat_print = now
 
     def run(self):
+        if self.replay is not None:
+            kind = "raw" if isinstance(self.replay, RawReplay) else "decoded"
+            print(
+                f"[SIM] replay {self.args.replay}: {kind}, {self.replay.count} events over "
+                f"{self.replay.span_us / 1e6:.3f}s, speed={self.args.replay_speed:g} loops={self.args.replay_loops or 'inf'}"
+            )
         print(
-            f"[SIM] open={self.args.port} baud={self.args.baud} protocol={self.args.protocol} "
+            f"[SIM] open={self.port.name} transport={self.args.transport} baud={self.args.baud} protocol={self.args.protocol} "
             f"hz={self.stream_hz} ch={self.channel_count}"
         )
-        streamer = threading.Thread(target=self.stream_worker, daemon=True)
+        self.tx.start()
+        worker = self.replay_worker if self.replay is not None else self.stream_worker
+        streamer = threading.Thread(target=worker, daemon=True)
         streamer.start()
         try:
             while self.running:
-                self.tick_vars()
-                data = self.port.read(4096)
+                try:
+                    data = self.port.read(4096)
+                except TransportError as ex:
+                    print(f"[SIM] transport read failed: {ex}")
+                    break
                 if data and self.args.protocol == "rforge":
-                    self.rx_buf.extend(data)
-                    for cmd, seq, payload in iter_rforge_frames(self.rx_buf):
-                        self.on_frame(cmd, seq, payload)
+                    self.handle_rx(data)
                 self.print_stats()
         except KeyboardInterrupt:
             print("[SIM] stopping...")
         finally:
             self.running = False
             time.sleep(0.05)
+            self.tx.stop()
             self.port.close()
+            if self.args.mem_dump:
+                self.refresh_all_vars()
+                base, size = self.mem.dump(Path(self.args.mem_dump))
+                print(f"[SIM] dumped memory {self.args.mem_dump}: {size} bytes @0x{base:08X}")
+            self.mem.close()
+            if self.replay is not None:
+                self.replay.close()
+            if self.stats_sink is not None:
+                self.stats_sink.close()
+
+
+def parse_mem_image(text: str) -> tuple[str, int]:
+    path, sep, base = text.rpartition("@")
+    if not sep:
+        return text, 0
+    return path, int(base, 0)
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="RenesasForge UART MCU simulator")
-    parser.add_argument("--port", required=True, help="serial port, e.g. COM8")
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORT_KINDS,
+        default="serial",
+        help="link backend: serial port, POSIX pty pair (prints peer path), local tcp listener, "
+        "or memory (in-process only, e.g. uart_e2e_tester.py --transport memory)",
+    )
+    parser.add_argument(
+        "--port",
+        help="serial port (e.g. COM8), optional symlink path for the pty peer, or tcp host:port (default 127.0.0.1:5760)",
+    )
     parser.add_argument("--baud", type=int, default=921600, help="baud rate")
-    parser.add_argument("--protocol", choices=["rforge", "vofa"], default="rforge")
+    parser.add_argument(
+        "--protocol",
+        choices=["rforge", "vofa", "justfloat"],
+        default="rforge",
+        help="rforge frames, vofa CSV text lines, or justfloat (VOFA+ binary float32 + tail)",
+    )
     parser.add_argument("--channels", type=int, default=4, help="stream channel count")
     parser.add_argument("--stream-hz", type=float, default=200.0, help="stream frames per second")
     parser.add_argument("--auto-stream", action="store_true", help="enable stream immediately")
-    parser.add_argument("--drop-rate", type=float, default=0.0, help="tx drop rate [0..1]")
-    parser.add_argument("--crc-error-rate", type=float, default=0.0, help="rforge crc error inject [0..1]")
+    parser.add_argument(
+        "--waveform",
+        type=parse_waveforms,
+        default="mix",
+        help="per-channel waveforms kind[:freq[:amp[:offset]]], comma list cycled over channels "
+        "(kinds: mix, sine, square, chirp, noise, step)",
+    )
+    parser.add_argument("--packed-stream", action="store_true", help="start in packed STREAM_DATA mode (host may change via flags)")
+    parser.add_argument(
+        "--sched-policy",
+        choices=SCHED_POLICIES,
+        default="catchup",
+        help="when the stream falls behind: emit the missed ticks (catchup) or skip late ones (drop)",
+    )
+    parser.add_argument("--sched-wake-ms", type=float, default=0.0, help="stream scheduler wake cadence; due ticks are emitted in one batch")
+    parser.add_argument("--sched-spin-us", type=float, default=0.0, help="busy-wait the last N us before each wake for lower jitter (0=sleep only)")
+    parser.add_argument("--sched-max-late-ms", type=float, default=20.0, help="--sched-policy drop: skip ticks later than this")
+    parser.add_argument("--sched-max-burst", type=int, default=512, help="max ticks emitted per wake while catching up")
+    parser.add_argument(
+        "--replay",
+        help="stream a recorded capture instead of generated signals: raw link bytes, or a decoded "
+        "uart_e2e_tester.py --capture file (recognised by its header)",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="--replay time scale: 1 = original timing, 10 = ten times faster, 0 = as fast as the link allows",
+    )
+    parser.add_argument("--replay-loops", type=int, default=0, help="--replay passes over the capture (0 = loop forever)")
+    parser.add_argument("--pack-latency-ms", type=float, default=10.0, help="max age of a pending packed frame before flush")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="tx drop rate [0..1] (shorthand for --fault-profile drop:p=X)")
+    parser.add_argument(
+        "--crc-error-rate",
+        type=float,
+        default=0.0,
+        help="payload bit-flip rate [0..1] (shorthand for --fault-profile flip:p=X:region=payload)",
+    )
+    parser.add_argument(
+        "--fault-profile",
+        type=parse_fault_profile,
+        help="TX fault rules kind[:key=value...], comma list or @file.json "
+        "(kinds: drop, flip, insert, delete, garbage, truncate, stall, outage; see tools/rforge_faults.py)",
+    )
+    parser.add_argument("--fault-seed", type=int, default=1, help="fault engine RNG seed; same seed + profile = same faults")
     parser.add_argument("--var-table-format", choices=["text", "binary"], default="text")
     parser.add_argument("--readmem-format", choices=["text", "binary"], default="text")
     parser.add_argument("--map-file", help="optional Renesas .map file path")
     parser.add_argument("--map-prefix", default="g_,com_,gui_", help="comma prefixes for map symbols")
-    parser.add_argument("--map-max-vars", type=int, default=48, help="max vars imported from map")
+    parser.add_argument("--map-max-vars", type=int, default=48, help="max vars imported from map (0 = all)")
     parser.add_argument("--map-min-addr", type=lambda x: int(x, 0), default=0x1000, help="min address filter, e.g. 0x1000")
+    parser.add_argument(
+        "--map-cache-dir",
+        default="build/map_cache",
+        help="symbol index cache dir keyed by map path+mtime+size (empty string disables)",
+    )
+    parser.add_argument(
+        "--mem-image",
+        type=parse_mem_image,
+        help="raw RAM image mapped copy-on-write into simulated memory, PATH[@BASE] (default base 0)",
+    )
+    parser.add_argument(
+        "--var-update-ms",
+        type=float,
+        default=1.0,
+        help="time step of simulated variable values; reads within one step reuse the computed value",
+    )
+    parser.add_argument("--mem-dump", help="write the mapped memory span to this raw image file on exit")
+    parser.add_argument(
+        "--pace-line",
+        action="store_true",
+        help="emulate the UART wire: transmit at --baud line rate through a bounded TX FIFO (for pty/tcp/memory links)",
+    )
+    parser.add_argument("--tx-fifo-bytes", type=int, default=2048, help="--pace-line TX FIFO/DMA buffer depth in bytes")
+    parser.add_argument("--uart-bits", type=int, default=10, help="bits on the wire per byte for serial/--pace-line line-time math (8N1 = 10)")
+    parser.add_argument(
+        "--tx-fifo-timeout-ms",
+        type=float,
+        default=50.0,
+        help="--pace-line: a write waiting longer than this for FIFO room is dropped as an overflow (0 = wait forever)",
+    )
+    parser.add_argument("--tx-queue", type=int, default=256, help="tx writer queue depth in frames")
+    parser.add_argument("--tx-batch-bytes", type=int, default=16384, help="max bytes coalesced into one port write (serial: capped to fit the write timeout)")
+    parser.add_argument(
+        "--tx-stream-batch-ms",
+        type=float,
+        default=2.0,
+        help="on serial or --pace-line links, max line time of stream data per write (bounds reply wait)",
+    )
+    parser.add_argument("--tx-policy", choices=TX_POLICIES, default="block", help="behaviour when the tx queue is full")
+    parser.add_argument("--tx-control-queue", type=int, default=64, help="control-reply lane depth (drained before stream data)")
+    parser.add_argument(
+        "--busy-threshold",
+        type=int,
+        default=0,
+        help="reply ACK BUSY to var-table/read/write commands while more stream frames are queued (0=off)",
+    )
+    parser.add_argument("--tx-block-timeout", type=float, default=0.05, help="max seconds a producer blocks under --tx-policy block")
     parser.add_argument("--echo-rx", action="store_true", help="print each parsed rx frame")
-    return parser.parse_args()
+    parser.add_argument("--quiet", action="store_true", help="suppress periodic stats output")
+    parser.add_argument(
+        "--stats-format",
+        choices=["text", "json", "off"],
+        default="text",
+        help="periodic stats on stdout: one text line, one JSON line with per-stage timing, or nothing",
+    )
+    parser.add_argument(
+        "--stats-out",
+        help="also append JSON stats lines (with per-stage timing) to this file or udp://host:port",
+    )
+    parser.add_argument("--stats-interval", type=float, default=1.0, help="seconds between stats reports")
+    args = parser.parse_args(argv)
+    if args.transport == "serial" and not args.port:
+        parser.error("--port is required for --transport serial")
+    return args
 
 
 def main():